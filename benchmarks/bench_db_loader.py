@@ -0,0 +1,145 @@
+"""
+PostgreSQL load benchmark: row-by-row INSERT vs. COPY through a staging table
+vs. COPY with upsert and change history.
+
+Generates synthetic product rows and loads them into a fresh table with each
+method, reporting rows per second. Needs a reachable PostgreSQL, configured
+with the same DB_HOST / DB_PORT / DB_NAME / DB_USER / DB_PASSWORD variables
+as the loader, e.g. a local container:
+
+    docker run --rm -d -p 5432:5432 -e POSTGRES_PASSWORD=bench postgres:16
+
+Usage (from the project root):
+    python -m benchmarks.bench_db_loader [--sizes 10000 100000 1000000]
+        [--methods insert copy upsert] [--max_insert_rows 100000] [--json]
+"""
+
+import json
+import os
+import time
+from argparse import ArgumentParser
+from datetime import date
+from typing import Iterator, Tuple
+
+import psycopg2
+
+from load.db_loader import DataLoader
+
+TABLE = "bench_products"
+
+
+def synthetic_rows(count: int) -> Iterator[Tuple]:
+    today = date.today()
+    for i in range(count):
+        yield DataLoader.to_tuple(
+            DataLoader(
+                name=f"product {i} wet cat food, 85g (pack of 12)",
+                price=round(5 + (i % 500) * 0.37, 2),
+                currency="AED",
+                image_url=f"https://m.media-amazon.com/images/I/{i:010d}.jpg",
+                product_detail_url=f"https://www.amazon.ae/dp/B{i:09d}",
+                page_url="https://www.amazon.ae/s?k=pet+food+wet+food",
+                marketplace_name="amazonae",
+                date_collected=today,
+                category="pet food",
+                subcategory="wet food",
+                amazon_category="pet supplies",
+                review_score=round(1 + (i % 40) / 10, 1),
+                total_reviews=float(i % 5000),
+                brand=f"brand {i % 97}",
+                about="grain free\thigh protein\nmade with real chicken",
+                description=f"complete and balanced wet food for adult cats #{i}",
+            )
+        )
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        dbname=os.getenv("DB_NAME", "postgres"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD"),
+    )
+
+
+def bench_method(conn, method: str, size: int, batch_size: int) -> dict:
+    table = f"{TABLE}_{method}"
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {table}, {table}_history;")
+        conn.commit()
+
+        start = time.perf_counter()
+        if method == "insert":
+            DataLoader.create_table_and_insert(
+                table, conn, cur, list(synthetic_rows(size))
+            )
+        elif method == "upsert":
+            DataLoader.create_table_and_upsert(
+                table, conn, cur, synthetic_rows(size), batch_size=batch_size
+            )
+        else:
+            DataLoader.create_table_and_copy(
+                table, conn, cur, synthetic_rows(size), batch_size=batch_size
+            )
+        elapsed = time.perf_counter() - start
+
+        cur.execute(f"SELECT count(*) FROM {table};")
+        loaded = cur.fetchone()[0]
+        cur.execute(f"DROP TABLE IF EXISTS {table}, {table}_history;")
+        conn.commit()
+
+    return {
+        "method": method,
+        "rows": size,
+        "loaded": loaded,
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(size / elapsed, 1),
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark PostgreSQL load methods.")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        choices=["insert", "copy", "upsert"],
+        default=["insert", "copy", "upsert"],
+    )
+    parser.add_argument(
+        "--max_insert_rows",
+        type=int,
+        default=100_000,
+        help="Skip the row-by-row method above this size (it takes very long).",
+    )
+    parser.add_argument("--batch_size", type=int, default=50_000)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    conn = connect()
+    results = []
+    try:
+        for size in args.sizes:
+            for method in args.methods:
+                if method == "insert" and size > args.max_insert_rows:
+                    continue
+                results.append(bench_method(conn, method, size, args.batch_size))
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(results, indent=3))
+        return
+    print(f"{'method':<10}{'rows':>12}{'seconds':>12}{'rows/s':>14}")
+    for row in results:
+        print(
+            f"{row['method']:<10}{row['rows']:>12}{row['seconds']:>12}"
+            f"{row['rows_per_s']:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
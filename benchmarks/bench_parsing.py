@@ -0,0 +1,81 @@
+"""
+Parsing engine micro-benchmark over the saved HTML fixtures.
+
+Parses the listing fixture (product cards) and the detail fixture with every
+installed engine and reports cards/pages parsed per second.
+
+Usage (from the project root):
+    python -m benchmarks.bench_parsing [--repeat 50] [--json]
+"""
+
+import json
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from common.html_engine import available_engines, get_engine
+from extract.listing_parser import parse_listing_section
+from extract.timing import RESULTS_SELECTOR
+from transform.detail_parser import parse_product_details
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def load_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def bench_engine(name: str, listing_html: str, detail_html: str, repeat: int) -> dict:
+    engine = get_engine(name)
+    root = engine.parse(listing_html)
+    section = engine.inner_html(
+        engine.select_one(root, engine.compile(RESULTS_SELECTOR))
+    )
+
+    cards = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        cards += len(
+            parse_listing_section(
+                section, "bench", "https://example.com", "", "c", "s", "", engine
+            )
+        )
+    listing_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_product_details(detail_html, engine=engine)
+    detail_s = time.perf_counter() - start
+
+    return {
+        "engine": name,
+        "cards_per_s": round(cards / listing_s, 1),
+        "detail_pages_per_s": round(repeat / detail_s, 1),
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark HTML parsing engines.")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    listing_html = load_fixture("listing_page.html")
+    detail_html = load_fixture("detail_page.html")
+    results = [
+        bench_engine(name, listing_html, detail_html, args.repeat)
+        for name in available_engines()
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=3))
+        return
+    print(f"{'engine':<14}{'cards/s':>12}{'detail pages/s':>18}")
+    for row in results:
+        print(
+            f"{row['engine']:<14}{row['cards_per_s']:>12}{row['detail_pages_per_s']:>18}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Row conversion benchmark for the DB loader.
+
+Compares the per-row path (`iterrows` + `DataLoader.from_series` +
+`to_tuple`) with the column-wise `DataLoader.frame_to_rows` on a synthetic
+DataFrame shaped like the final CSV, with dates in every accepted format.
+The per-row path is timed on `--legacy_rows` rows (it is slow) and reported
+as rows per second, so both numbers are comparable at `--rows`.
+
+Usage (from the project root):
+    python -m benchmarks.bench_row_conversion [--rows 1000000]
+        [--legacy_rows 100000] [--json]
+"""
+
+import json
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+from load.db_loader import DataLoader
+
+
+def synthetic_frame(rows: int) -> pd.DataFrame:
+    ids = np.arange(rows)
+    dates = np.array(["2026-10-17", "17/10/2026", "2026/10/17", ""], dtype=object)
+    return pd.DataFrame(
+        {
+            "name": [f"product {i} wet cat food" for i in ids],
+            "price": 5 + (ids % 500) * 0.37,
+            "currency": "AED",
+            "image_url": [f"https://m.media-amazon.com/images/I/{i}.jpg" for i in ids],
+            "product_detail_url": [f"https://www.amazon.ae/dp/B{i:09d}" for i in ids],
+            "page_url": "https://www.amazon.ae/s?k=pet+food+wet+food",
+            "marketplace_name": "amazonae",
+            "date_collected": dates[ids % len(dates)],
+            "category": "pet food",
+            "subcategory": "wet food",
+            "review_score": np.where(ids % 7 == 0, np.nan, 1 + (ids % 40) / 10),
+            "total_reviews": (ids % 5000).astype(float),
+            "brand": [f"brand {i % 97}" for i in ids],
+            "about": "grain free",
+            "description": "complete and balanced wet food for adult cats",
+        }
+    )
+
+
+def legacy_rows(df: pd.DataFrame) -> list:
+    return [
+        DataLoader.to_tuple(DataLoader.from_series(row)) for _, row in df.iterrows()
+    ]
+
+
+def vectorized_rows(df: pd.DataFrame) -> list:
+    return list(DataLoader.frame_to_rows(df))
+
+
+def time_it(convert, df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    convert(df)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark DB loader row conversion.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy_rows", type=int, default=100_000)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows)
+    sample = df.head(min(args.legacy_rows, args.rows))
+
+    legacy_s = time_it(legacy_rows, sample)
+    vectorized_s = time_it(vectorized_rows, df)
+    legacy_rate = len(sample) / legacy_s
+    vectorized_rate = args.rows / vectorized_s
+
+    results = {
+        "rows": args.rows,
+        "legacy_rows_per_s": round(legacy_rate, 1),
+        "legacy_projected_s": round(args.rows / legacy_rate, 2),
+        "vectorized_rows_per_s": round(vectorized_rate, 1),
+        "vectorized_s": round(vectorized_s, 2),
+        "speedup": round(vectorized_rate / legacy_rate, 1),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=3))
+        return
+    for key, value in results.items():
+        print(f"{key:<24}{value:>14}")
+
+
+if __name__ == "__main__":
+    main()
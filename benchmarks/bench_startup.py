@@ -0,0 +1,96 @@
+"""
+Startup benchmark for the stage entry points.
+
+Times a fresh interpreter running each entry point with `--help` (argument
+parsing plus every import done at module load), and importing each load
+destination on its own, which is what a loader Job pays before its first
+row. Each command runs `--repeat` times from a scratch working directory and
+the median and minimum wall times are reported; `--imports` adds the slowest
+top-level imports of each command, taken from `-X importtime`.
+
+Usage (from the project root):
+    python -m benchmarks.bench_startup [--repeat 10] [--imports] [--json]
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from common.import_profile import parse_importtime
+
+ROOT = Path(__file__).resolve().parents[1]
+
+ENTRY_POINTS = {
+    "extract": [str(ROOT / "extract" / "extraction.py"), "--help"],
+    "transform": [str(ROOT / "transform" / "transform.py"), "--help"],
+    "load": [str(ROOT / "load" / "run_data_loader.py"), "--help"],
+    "load dir destination": ["-c", "import load.filesys_loader"],
+    "load db destination": ["-c", "import load.db_loader"],
+    "pipeline (in-process)": [str(ROOT / "pipeline_runner.py"), "--help"],
+}
+
+
+def run_once(args: list, cwd: str, importtime: bool = False) -> tuple:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + args
+    start = time.perf_counter()
+    result = subprocess.run(
+        command,
+        cwd=cwd,
+        env={"PYTHONPATH": str(ROOT)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr}")
+    return elapsed, result.stderr
+
+
+def top_imports(args: list, cwd: str, top: int) -> list:
+    _, stderr = run_once(args, cwd, importtime=True)
+    timings, _ = parse_importtime(stderr.splitlines())
+    roots = sorted((t for t in timings if t.depth == 0), key=lambda t: -t.cumulative_us)
+    return [[t.module, round(t.cumulative_us / 1000, 1)] for t in roots[:top]]
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark entry point startup time.")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--imports", action="store_true", help="Also list the slowest imports."
+    )
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, command in ENTRY_POINTS.items():
+            times = [run_once(command, cwd)[0] for _ in range(max(1, args.repeat))]
+            row = {
+                "entry_point": name,
+                "median_ms": round(statistics.median(times) * 1000, 1),
+                "min_ms": round(min(times) * 1000, 1),
+            }
+            if args.imports:
+                row["top_imports_ms"] = top_imports(command, cwd, args.top)
+            results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=3))
+        return
+    print(f"{'entry point':<24}{'median ms':>12}{'min ms':>10}")
+    for row in results:
+        print(f"{row['entry_point']:<24}{row['median_ms']:>12}{row['min_ms']:>10}")
+        for module, ms in row.get("top_imports_ms", []):
+            print(f"{'':<4}{module:<36}{ms:>8} ms")
+
+
+if __name__ == "__main__":
+    main()
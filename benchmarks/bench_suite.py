@@ -0,0 +1,502 @@
+"""
+Offline benchmark suite for every pipeline stage.
+
+Runs each stage on recorded HTML fixtures and synthetic records, with no
+network access, and reports throughput, latency percentiles and peak RSS as
+JSON, so a change to a parser, the validation or a loader can be compared
+with an earlier run and gated in CI:
+
+    extract         `parse_listing_section()` on the listing fixture, one page
+                    per 48 products
+    transform       `product_level_scraper()` on the detail fixture, served by
+                    an in-memory fetcher (up to --detail_pages products)
+    validate        `clean_chunks()` on synthetic records
+    load_dir        `export_chunks()` into a scratch Parquet dataset and CSV
+    load_db_<m>     `load_frame()` with load method <m>, against a scratch
+                    PostgreSQL cluster started with initdb/pg_ctl (--db temp),
+                    the server in the DB_* variables (--db postgres) or an
+                    in-process stand-in that discards every statement
+                    (--db stub)
+
+Every stage runs in a fresh process with its inputs built before timing
+starts; latencies are per page (extract), per product (transform) or per
+chunk (the rest). With --baseline, a stage whose throughput dropped, or
+whose peak RSS grew, by more than --tolerance fails the run.
+
+Against the stand-in, the load_db stages only time client-side formatting
+(building rows and COPY buffers): they say nothing about how the load methods
+compare on a server. Their results are marked as such and never gated.
+
+Usage (from the project root):
+    python -m benchmarks.bench_suite [--products 100000] [--stages extract validate]
+        [--db temp|postgres|stub] [--pg_bin /usr/lib/postgresql/16/bin]
+        [--output results.json] [--baseline baseline.json --tolerance 0.2] [--json]
+"""
+
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+CHUNK_SIZE = 5000
+LOAD_METHODS = ("copy", "insert", "upsert")
+STAGES = ["extract", "transform", "validate", "load_dir"] + [
+    f"load_db_{method}" for method in LOAD_METHODS
+]
+# What the load_db stages measure against the stand-in; never gated
+CLIENT_SIDE = "client-side formatting"
+
+
+def load_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+# Serves the recorded detail page for every URL, like a fetcher with a warm cache
+class FixtureFetcher:
+    name = "fixture"
+
+    def __init__(self, html: str):
+        self.html = html
+
+    def fetch(self, url: str, selector: str = None) -> str:
+        return self.html
+
+    def close(self) -> None:
+        pass
+
+
+class StubCursor:
+    def __init__(self):
+        self.rowcount = 0
+        self._copied = 0
+
+    def __enter__(self) -> "StubCursor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    # A merge after COPY reports every copied row as inserted
+    def execute(self, sql: str, params=None) -> None:
+        self.rowcount, self._copied = self._copied, 0
+
+    def executemany(self, sql: str, rows: List[tuple]) -> None:
+        self.rowcount = len(rows)
+
+    def copy_expert(self, sql: str, file) -> None:
+        self._copied = file.read().count("\n")
+
+    def fetchall(self) -> list:
+        return []
+
+    def fetchone(self) -> tuple:
+        return (0,)
+
+
+class StubConnection:
+    closed = 0
+
+    def cursor(self) -> StubCursor:
+        return StubCursor()
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+
+# Stand-in for `ConnectionManager`: runs the loader's statements against a
+# connection that accepts and discards them, so only the client side is timed
+class StubManager:
+    def run(self, work: Callable):
+        conn = StubConnection()
+        with conn.cursor() as cursor:
+            return work(conn, cursor)
+
+    def close(self) -> None:
+        pass
+
+
+def synthetic_batches(options: dict) -> List[List[dict]]:
+    from benchmarks.synthetic import synthetic_products
+    from common.jsonl import iter_batches
+
+    records = synthetic_products(options["products"], seed=options["seed"])
+    return list(iter_batches(records, CHUNK_SIZE))
+
+
+def cleaned_frames(options: dict) -> Tuple[list, list]:
+    from collections import Counter
+
+    from load.filesys_loader import clean_chunks, load_priority_fields
+
+    batches = synthetic_batches(options)
+    priority = load_priority_fields()
+    columns = priority + sorted(set(batches[0][0]).difference(priority))
+    return list(clean_chunks(batches, columns, priority, Counter())), columns
+
+
+# Each stage builds its inputs and returns a function running the measured
+# work, which returns (items processed, per-unit latencies in seconds)
+def prepare_extract(options: dict) -> Callable[[], Tuple[int, List[float]]]:
+    from common.html_engine import get_engine
+    from extract.listing_parser import parse_listing_section
+    from extract.timing import RESULTS_SELECTOR
+
+    engine = get_engine()
+    root = engine.parse(load_fixture("listing_page.html"))
+    section = engine.inner_html(
+        engine.select_one(root, engine.compile(RESULTS_SELECTOR))
+    )
+    cards = len(
+        parse_listing_section(
+            section, "bench", "https://www.amazon.ae", "", "c", "s", ""
+        )
+    )
+    pages = math.ceil(options["products"] / cards)
+
+    def run() -> Tuple[int, List[float]]:
+        items, latencies = 0, []
+        for page_num in range(1, pages + 1):
+            start = time.perf_counter()
+            items += len(
+                parse_listing_section(
+                    section,
+                    "amazonae",
+                    "https://www.amazon.ae",
+                    f"https://www.amazon.ae/s?k=pet+food&page={page_num}",
+                    "pet food",
+                    "wet food",
+                    "2026-01-01",
+                )
+            )
+            latencies.append(time.perf_counter() - start)
+        return items, latencies
+
+    return run
+
+
+def prepare_transform(options: dict) -> Callable[[], Tuple[int, List[float]]]:
+    from transform.transform import product_level_scraper
+
+    fetcher = FixtureFetcher(load_fixture("detail_page.html"))
+    count = min(options["products"], options["detail_pages"])
+    urls = [f"https://www.amazon.ae/dp/B{i:09d}" for i in range(count)]
+
+    def run() -> Tuple[int, List[float]]:
+        items, latencies = 0, []
+        for url in urls:
+            start = time.perf_counter()
+            items += product_level_scraper(url, fetcher=fetcher) is not None
+            latencies.append(time.perf_counter() - start)
+        return items, latencies
+
+    return run
+
+
+def prepare_validate(options: dict) -> Callable[[], Tuple[int, List[float]]]:
+    from collections import Counter
+
+    from load.filesys_loader import clean_chunks, load_priority_fields
+
+    batches = synthetic_batches(options)
+    priority = load_priority_fields()
+    columns = priority + sorted(set(batches[0][0]).difference(priority))
+
+    def run() -> Tuple[int, List[float]]:
+        latencies = []
+        chunks = clean_chunks(batches, columns, priority, Counter())
+        start = time.perf_counter()
+        for _ in chunks:
+            latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+        return sum(len(batch) for batch in batches), latencies
+
+    return run
+
+
+def prepare_load_dir(options: dict) -> Callable[[], Tuple[int, List[float]]]:
+    from common.manifest import RetentionPolicy
+    from load.filesys_loader import export_chunks
+
+    frames, columns = cleaned_frames(options)
+    output_dir = Path("output") / "bench"
+    output_dir.mkdir(parents=True)
+
+    def run() -> Tuple[int, List[float]]:
+        latencies, written = [], 0
+        chunks = export_chunks(
+            frames, output_dir, "bench", columns, RetentionPolicy(), False
+        )
+        start = time.perf_counter()
+        for written in chunks:
+            latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+        return written, latencies
+
+    return run
+
+
+def prepare_load_db(
+    options: dict, method: str
+) -> Callable[[], Tuple[int, List[float]]]:
+    from load.db_loader import ConnectionManager, load_frame
+
+    frames, _ = cleaned_frames(options)
+    table = "bench_suite_products"
+    if options["db"] in ("temp", "postgres"):
+        os.environ.update(options["db_env"])
+        manager = ConnectionManager.from_env()
+
+        def drop(conn, cursor) -> None:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}, {table}_history;")
+            conn.commit()
+
+        manager.run(drop)
+    else:
+        manager = StubManager()
+
+    def run() -> Tuple[int, List[float]]:
+        latencies = []
+        try:
+            for df in frames:
+                start = time.perf_counter()
+                load_frame(manager, table, df, method, options["db_batch_size"])
+                latencies.append(time.perf_counter() - start)
+        finally:
+            manager.close()
+        return sum(len(df) for df in frames), latencies
+
+    return run
+
+
+def prepare(stage: str, options: dict) -> Callable[[], Tuple[int, List[float]]]:
+    if stage.startswith("load_db_"):
+        return prepare_load_db(options, stage.rsplit("_", 1)[1])
+    preparers: Dict[str, Callable] = {
+        "extract": prepare_extract,
+        "transform": prepare_transform,
+        "validate": prepare_validate,
+        "load_dir": prepare_load_dir,
+    }
+    return preparers[stage](options)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+
+def latency_percentiles(latencies: List[float]) -> dict:
+    ms = sorted(s * 1000 for s in latencies) or [0.0]
+    cuts = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else []
+
+    def pick(q: int) -> float:
+        return round(cuts[q - 1] if cuts else ms[0], 3)
+
+    return {"p50": pick(50), "p90": pick(90), "p99": pick(99), "max": round(ms[-1], 3)}
+
+
+# Run one stage in this (fresh) process, in a scratch working directory
+def run_stage(stage: str, options: dict) -> dict:
+    sys.path.insert(0, str(ROOT))
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as cwd:
+        os.chdir(cwd)
+        with redirect_stdout(io.StringIO()):
+            run = prepare(stage, options)
+            input_rss = peak_rss_mb()
+            start = time.perf_counter()
+            items, latencies = run()
+            elapsed = time.perf_counter() - start
+    return {
+        "stage": stage,
+        "items": items,
+        "seconds": round(elapsed, 3),
+        "items_per_s": round(items / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": latency_percentiles(latencies),
+        "input_rss_mb": input_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# Start a scratch PostgreSQL cluster with `initdb` and `pg_ctl` from `pg_bin`
+# (or PATH), yield the DB_* variables to reach it and remove it afterwards
+@contextmanager
+def throwaway_postgres(pg_bin: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    initdb = shutil.which("initdb", path=pg_bin)
+    pg_ctl = shutil.which("pg_ctl", path=pg_bin)
+    if initdb is None or pg_ctl is None:
+        raise RuntimeError(
+            "initdb/pg_ctl not found; pass --pg_bin, or use --db postgres or stub."
+        )
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    with tempfile.TemporaryDirectory(prefix="bench_pg_") as scratch:
+        data = Path(scratch) / "data"
+        subprocess.run(
+            [initdb, "-D", str(data), "-U", "postgres", "-A", "trust", "-E", "UTF8"],
+            check=True,
+            capture_output=True,
+        )
+        server = [pg_ctl, "-D", str(data), "-l", str(Path(scratch) / "server.log")]
+        subprocess.run(
+            server
+            + ["-w", "-o", f"-p {port} -k {scratch} -c listen_addresses=127.0.0.1"]
+            + ["start"],
+            check=True,
+            capture_output=True,
+        )
+        try:
+            yield {
+                "DB_HOST": "127.0.0.1",
+                "DB_PORT": str(port),
+                "DB_NAME": "postgres",
+                "DB_USER": "postgres",
+                "DB_PASSWORD": "",
+            }
+        finally:
+            subprocess.run(server + ["-w", "-m", "fast", "stop"], capture_output=True)
+
+
+# Messages for stages slower, or using more memory, than the baseline allows;
+# client-side-only stages are skipped
+def regressions(results: List[dict], baseline: dict, tolerance: float) -> List[str]:
+    previous = {row["stage"]: row for row in baseline["stages"]}
+    found = []
+    for row in results:
+        base = previous.get(row["stage"])
+        if base is None or CLIENT_SIDE in (row.get("measures"), base.get("measures")):
+            continue
+        if row["items_per_s"] < base["items_per_s"] * (1 - tolerance):
+            found.append(
+                f"{row['stage']}: {row['items_per_s']} items/s, "
+                f"baseline {base['items_per_s']}"
+            )
+        if row["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            found.append(
+                f"{row['stage']}: peak RSS {row['peak_rss_mb']} MB, "
+                f"baseline {base['peak_rss_mb']} MB"
+            )
+    return found
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark every pipeline stage offline.")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument(
+        "--detail_pages",
+        type=int,
+        default=2000,
+        help="Products enriched by the transform stage (at most --products).",
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--db",
+        choices=["temp", "postgres", "stub"],
+        default="stub",
+        help=(
+            "Load into a scratch PostgreSQL cluster, the PostgreSQL in DB_*, or "
+            "the in-process stand-in (client-side formatting only, not gated)."
+        ),
+    )
+    parser.add_argument(
+        "--pg_bin", help="Directory of initdb and pg_ctl for --db temp (else PATH)."
+    )
+    parser.add_argument("--db_batch_size", type=int, default=50_000)
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Results file to compare against.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed throughput drop / peak RSS growth against the baseline.",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    options = {
+        "products": args.products,
+        "detail_pages": args.detail_pages,
+        "seed": args.seed,
+        "db": args.db,
+        "db_env": {},
+        "db_batch_size": args.db_batch_size,
+    }
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with ExitStack() as stack:
+        if args.db == "temp" and any(s.startswith("load_db_") for s in args.stages):
+            try:
+                options["db_env"] = stack.enter_context(throwaway_postgres(args.pg_bin))
+            except (RuntimeError, subprocess.CalledProcessError) as error:
+                parser.error(f"could not start a scratch PostgreSQL: {error}")
+        for stage in args.stages:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                row = executor.submit(run_stage, stage, options).result()
+            if stage.startswith("load_db_") and args.db == "stub":
+                row["measures"] = CLIENT_SIDE
+            results.append(row)
+
+    report = {
+        "products": args.products,
+        "db": args.db,
+        "python": platform.python_version(),
+        "stages": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=3)
+
+    if args.json:
+        print(json.dumps(report, indent=3))
+    else:
+        print(
+            f"{'stage':<16}{'items':>9}{'items/s':>12}{'p50 ms':>10}"
+            f"{'p99 ms':>10}{'peak MB':>10}"
+        )
+        for row in results:
+            print(
+                f"{row['stage']:<16}{row['items']:>9}{row['items_per_s']:>12}"
+                f"{row['latency_ms']['p50']:>10}{row['latency_ms']['p99']:>10}"
+                f"{row['peak_rss_mb']:>10}"
+                + ("  *" if row.get("measures") == CLIENT_SIDE else "")
+            )
+        if any(row.get("measures") == CLIENT_SIDE for row in results):
+            print(f"* {CLIENT_SIDE} only (--db stub), not gated against a baseline")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for message in found:
+            print(f"Regression: {message}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Offline check of the HTTP fetcher and its browser fallback.
+
+Serves the recorded detail page from a local HTTP server, next to a bot-check
+page without the detail section and a route that fails, and fetches each one
+through `FallbackFetcher(HttpFetcher(), <fixture browser>)`. The fallback
+backend is an in-memory fetcher serving the same fixture, so no browser is
+launched. Every response, and the hit/fallback/error counters per backend,
+are compared with what the fallback rules should produce; any mismatch exits
+with status 1.
+
+    /detail       detail page, served over HTTP       http hit
+    /bot-check    200 without the selector            http fallback, browser hit
+    /missing      404                                 http fallback, browser hit
+    /reset        connection closed without a reply   http error, browser hit
+
+Usage (from the project root):
+    python -m benchmarks.check_fetcher
+"""
+
+import logging
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.bench_suite import FixtureFetcher, load_fixture
+from common.fetcher import FallbackFetcher, FetchStats, HttpFetcher
+
+SELECTOR = "div#dp-container"
+BOT_CHECK_HTML = (
+    "<html><body><form action='/errors/validateCaptcha'></form></body></html>"
+)
+
+# Expected outcome per path: whether the detail section comes back, and the
+# counters each request adds per backend
+CASES = {
+    "/detail": (True, {"http": "hits"}),
+    "/bot-check": (True, {"http": "fallbacks", "fixture": "hits"}),
+    "/missing": (True, {"http": "fallbacks", "fixture": "hits"}),
+    "/reset": (True, {"http": "errors", "fixture": "hits"}),
+}
+
+
+def fixture_handler(detail_html: str) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path == "/reset":
+                # Drop the connection: the client sees a RequestException
+                self.close_connection = True
+                self.connection.close()
+                return
+            pages = {"/detail": detail_html, "/bot-check": BOT_CHECK_HTML}
+            body = pages.get(self.path, "Not found").encode("utf-8")
+            self.send_response(200 if self.path in pages else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return Handler
+
+
+def expected_counters() -> dict:
+    counters = {}
+    for _, outcome in CASES.values():
+        for backend, counter in outcome.items():
+            backend_counters = counters.setdefault(
+                backend, {"hits": 0, "fallbacks": 0, "errors": 0}
+            )
+            backend_counters[counter] += 1
+    return counters
+
+
+def run_checks() -> list:
+    detail_html = load_fixture("detail_page.html")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), fixture_handler(detail_html))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    stats = FetchStats()
+    fetcher = FallbackFetcher(
+        HttpFetcher(retries=0, timeout=5.0), FixtureFetcher(detail_html), stats
+    )
+    failures = []
+    try:
+        for path, (found, _) in CASES.items():
+            section = fetcher.fetch(base_url + path, SELECTOR)
+            if (section is not None) != found:
+                failures.append(f"{path}: section returned = {section is not None}")
+    finally:
+        fetcher.close()
+        server.shutdown()
+        server.server_close()
+
+    counters = stats.as_dict()
+    if counters != expected_counters():
+        failures.append(f"counters {counters} != {expected_counters()}")
+    return failures
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    failures = run_checks()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK {len(CASES)} fetch(es), counters {expected_counters()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Synthetic product records for the offline benchmarks.
+
+`synthetic_products()` yields records shaped like the transform output (listing
+fields plus enriched details), deterministic for a given seed, so runs are
+comparable. A small share of records is made invalid (missing name or price)
+or repeated, so validation and deduplication do real work at any scale.
+
+Usage:
+    from benchmarks.synthetic import synthetic_products
+    records = list(synthetic_products(100_000))
+"""
+
+import random
+from datetime import date
+from typing import Iterator
+
+BRANDS = ["purina", "whiskas", "royal canin", "pedigree", "sheba", "felix", "iams"]
+FOODS = ["wet cat food", "adult dog food", "puppy chunks in gravy", "kitten pate"]
+FLAVOURS = ["chicken", "salmon", "lamb & rice", "beef", "tuna", "turkey"]
+
+
+def synthetic_products(
+    count: int,
+    seed: int = 0,
+    invalid_share: float = 0.02,
+    duplicate_share: float = 0.01,
+) -> Iterator[dict]:
+    rng = random.Random(seed)
+    today = date.today().isoformat()
+    previous = None
+    for i in range(count):
+        if previous is not None and rng.random() < duplicate_share:
+            yield dict(previous)
+            continue
+        brand = rng.choice(BRANDS)
+        asin = f"B{rng.randrange(10**9):09d}"
+        record = {
+            "name": (
+                f"{brand} {rng.choice(FLAVOURS)} {rng.choice(FOODS)}, "
+                f"{rng.choice([85, 100, 400, 800])}g (pack of {rng.choice([4, 12, 24])})"
+            ),
+            "price": round(rng.uniform(5, 400), 2),
+            "currency": "AED",
+            "image_url": f"https://m.media-amazon.com/images/I/{asin}._AC_UL320_.jpg",
+            "product_detail_url": f"https://www.amazon.ae/dp/{asin}/ref=sr_1_{i}",
+            "page_url": "https://www.amazon.ae/s?k=pet+food+wet+food",
+            "marketplace": "amazonae",
+            "category": "pet food",
+            "subcategory": "wet food",
+            "date_collected": today,
+            "url": "https://www.amazon.ae",
+            "brand": brand,
+            "description": " ".join(
+                rng.choice(FLAVOURS) + " " + rng.choice(FOODS) for _ in range(12)
+            ),
+            "total_reviews": float(rng.randrange(5000)),
+            "review_score": round(rng.uniform(1, 5), 1),
+        }
+        if rng.random() < invalid_share:
+            record[rng.choice(["name", "price"])] = None
+        previous = record
+        yield record
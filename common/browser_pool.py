@@ -0,0 +1,154 @@
+"""
+Reusable Playwright browser/context pool.
+
+One Firefox process is launched per pool (i.e. per worker) and a single
+page, in its own browser context, is handed out and returned across URLs.
+Callers fetch one URL at a time (the sync API is not shared across threads),
+so one page is all a pool needs. The page is recycled (context closed and
+recreated) once it has served ``recycle_after`` navigations, and the browser
+is relaunched when it is found disconnected after a crash.
+
+Usage:
+    with BrowserPool(recycle_after=50) as pool:
+        with pool.page() as page:
+            page.goto(url)
+"""
+
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PooledPage:
+    context: object
+    page: object
+    uses: int = 0
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        recycle_after: int = 50,
+        headless: bool = True,
+        route_handler: Optional[Callable] = None,
+        max_restarts: int = 3,
+    ):
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self.route_handler = route_handler
+        self.max_restarts = max_restarts
+
+        self._playwright = None
+        self._browser = None
+        self._idle: Optional[PooledPage] = None
+        self._in_use = False
+        self.restarts = 0
+        self.pages_served = 0
+
+    def __enter__(self) -> "BrowserPool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        if self._playwright is None:
+            from playwright.sync_api import sync_playwright
+
+            self._playwright = sync_playwright().start()
+        self._launch()
+
+    def close(self) -> None:
+        from playwright.sync_api import Error as PlaywrightError
+
+        if self._idle is not None:
+            self._discard(self._idle)
+            self._idle = None
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except PlaywrightError:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+        logger.info(
+            "Browser pool closed: %d page(s) served, %d restart(s).",
+            self.pages_served,
+            self.restarts,
+        )
+
+    def _launch(self) -> None:
+        self._browser = self._playwright.firefox.launch(headless=self.headless)
+
+    # Relaunch the browser if it crashed; pooled pages died with it
+    def _ensure_browser(self) -> None:
+        if self._browser is not None and self._browser.is_connected():
+            return
+        if self.restarts >= self.max_restarts:
+            raise RuntimeError(
+                f"Browser crashed more than {self.max_restarts} time(s); giving up."
+            )
+        self.restarts += 1
+        logger.warning(
+            "Browser disconnected, relaunching (restart #%d).", self.restarts
+        )
+        self._idle = None
+        self._launch()
+
+    def _new_page(self) -> PooledPage:
+        context = self._browser.new_context()
+        page = context.new_page()
+        if self.route_handler is not None:
+            page.route("**/*", self.route_handler)
+        return PooledPage(context=context, page=page)
+
+    def _discard(self, pooled: PooledPage) -> None:
+        from playwright.sync_api import Error as PlaywrightError
+
+        try:
+            pooled.context.close()
+        except PlaywrightError:
+            pass
+
+    # Reuse the idle page, or open a new one after it was recycled
+    def _acquire(self) -> PooledPage:
+        if self._in_use:
+            raise RuntimeError("The pooled page is in use; release it first.")
+        self._ensure_browser()
+        pooled, self._idle = self._idle, None
+        if pooled is None:
+            pooled = self._new_page()
+        self._in_use = True
+        return pooled
+
+    def _release(self, pooled: PooledPage, failed: bool) -> None:
+        self._in_use = False
+        pooled.uses += 1
+        self.pages_served += 1
+        if failed and not self._browser.is_connected():
+            # Crash: the page is gone, the next acquire relaunches the browser
+            return
+        if failed or pooled.page.is_closed() or pooled.uses >= self.recycle_after:
+            self._discard(pooled)
+            return
+        self._idle = pooled
+
+    # Hand out a page for a single navigation and return it to the pool after
+    @contextmanager
+    def page(self) -> Iterator[object]:
+        pooled = self._acquire()
+        failed = False
+        try:
+            yield pooled.page
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(pooled, failed)
@@ -0,0 +1,137 @@
+"""
+Partitioned Parquet dataset of final product records.
+
+Records are written under a Hive-style layout
+
+    <root>/marketplace=<m>/category=<c>/subcategory=<s>/date_collected=<d>/part-<run>.parquet
+
+with string columns stored as Arrow dictionaries, so repeated values such as
+currency or brand are encoded once per row group. A run streams chunks into
+one file per partition (one row group per chunk) and replaces whatever an
+earlier run wrote to the same partition. Readers can select columns and push
+filters down to both the partition directories and the row groups.
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMNS = ["marketplace", "category", "subcategory", "date_collected"]
+NUMERIC_COLUMNS = {"price", "review_score", "total_reviews"}
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+PARTITIONING = ds.partitioning(
+    pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]), flavor="hive"
+)
+
+
+# Arrow schema of the stored (non-partition) columns, in `columns` order
+def build_schema(columns: Sequence[str]) -> pa.Schema:
+    return pa.schema(
+        [
+            (name, pa.float64() if name in NUMERIC_COLUMNS else DICTIONARY_STRING)
+            for name in columns
+            if name not in PARTITION_COLUMNS
+        ]
+    )
+
+
+class ParquetDatasetWriter:
+    def __init__(self, root: Path, columns: Sequence[str], run_id: str):
+        self.root = Path(root)
+        self.schema = build_schema(columns)
+        self.run_id = run_id
+        self.rows = 0
+        self._writers: Dict[tuple, pq.ParquetWriter] = {}
+
+    def __enter__(self) -> "ParquetDatasetWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _partition_dir(self, values: Sequence) -> Path:
+        parts = [
+            f"{name}={quote(str(value), safe=' ')}"
+            for name, value in zip(PARTITION_COLUMNS, values)
+        ]
+        return self.root.joinpath(*parts)
+
+    # First write to a partition in this run replaces files of earlier runs
+    def _writer_for(self, values: tuple) -> pq.ParquetWriter:
+        writer = self._writers.get(values)
+        if writer is None:
+            part_dir = self._partition_dir(values)
+            part_dir.mkdir(parents=True, exist_ok=True)
+            for stale in part_dir.glob("*.parquet"):
+                stale.unlink()
+            writer = pq.ParquetWriter(
+                part_dir / f"part-{self.run_id}.parquet",
+                self.schema,
+                compression="zstd",
+            )
+            self._writers[values] = writer
+        return writer
+
+    def write(self, df: pd.DataFrame) -> None:
+        frame = df.copy()
+        for name in self.schema.names:
+            if name not in frame:
+                frame[name] = None
+            elif name in NUMERIC_COLUMNS:
+                frame[name] = pd.to_numeric(frame[name], errors="coerce")
+            else:
+                values = frame[name].astype(object)
+                frame[name] = values.where(values.isna(), values.astype(str))
+        for name in PARTITION_COLUMNS:
+            frame[name] = frame[name].fillna("") if name in frame else ""
+
+        for values, part in frame.groupby(PARTITION_COLUMNS, sort=False):
+            table = pa.Table.from_pandas(
+                part[self.schema.names], schema=self.schema, preserve_index=False
+            )
+            self._writer_for(tuple(values)).write_table(table)
+            self.rows += len(part)
+
+    def close(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    # Partition values written by this run, in first-seen order
+    @property
+    def partitions(self) -> List[tuple]:
+        return list(self._writers)
+
+    # Filters (one conjunction per partition) selecting exactly this run's rows
+    @property
+    def filters(self) -> List[List[tuple]]:
+        return [
+            [(name, "=", value) for name, value in zip(PARTITION_COLUMNS, values)]
+            for values in self._writers
+        ]
+
+
+# Open the dataset with partition columns exposed as ordinary columns
+def open_dataset(root: Path) -> ds.Dataset:
+    return ds.dataset(Path(root), format="parquet", partitioning=PARTITIONING)
+
+
+# Read only `columns` of the rows matching `filters`, e.g.
+# read_products(root, ["name", "price"], [("category", "=", "pet food")])
+def read_products(
+    root: Path,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[tuple]] = None,
+) -> pd.DataFrame:
+    dataset = open_dataset(root)
+    expression = pq.filters_to_expression(filters) if filters else None
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
@@ -0,0 +1,176 @@
+"""
+Page fetchers with an HTTP fast path and a Playwright fallback.
+
+Most listing and detail pages already contain the HTML we parse in the
+server response, so they are first requested with a pooled keep-alive
+`requests.Session` (gzip/deflate enabled). When the required selector is
+missing from that response (bot check, client-side rendering, error page),
+`FallbackFetcher` loads the page again in a browser. `FetchStats` counts
+hits, fallbacks and errors per backend.
+
+Usage:
+    stats = FetchStats()
+    fetcher = FallbackFetcher(HttpFetcher(), PlaywrightFetcher(), stats)
+    html = fetcher.fetch(url, "div#dp-container")
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from common.browser_pool import BrowserPool
+from common.html_engine import get_engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+
+class FetchStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(lambda: {"hits": 0, "fallbacks": 0, "errors": 0})
+
+    def increment(self, backend: str, counter: str) -> None:
+        with self._lock:
+            self.counters[backend][counter] += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {backend: dict(c) for backend, c in self.counters.items()}
+
+    def log_summary(self) -> None:
+        for backend, counters in self.as_dict().items():
+            logger.info(
+                "Fetcher [%s]: %d hit(s), %d fallback(s), %d error(s).",
+                backend,
+                counters["hits"],
+                counters["fallbacks"],
+                counters["errors"],
+            )
+
+
+# Return the inner HTML of the first element matching `selector`, if any
+def extract_section(html: Optional[str], selector: str) -> Optional[str]:
+    if not html:
+        return None
+    engine = get_engine()
+    node = engine.select_one(engine.parse(html), engine.compile(selector))
+    return engine.inner_html(node) if node is not None else None
+
+
+# Fetch with a single backend; a failed request counts as an error and a
+# missing selector as a fallback
+def fetch_section(fetcher, url: str, selector: str, stats: FetchStats) -> Optional[str]:
+    from requests import RequestException
+
+    try:
+        html = fetcher.fetch(url, selector)
+    except RequestException as error:
+        logger.info("%s fetch failed for %s: %s", fetcher.name, url, error)
+        stats.increment(fetcher.name, "errors")
+        return None
+
+    section = extract_section(html, selector)
+    counter = "hits" if section is not None else "fallbacks"
+    stats.increment(fetcher.name, counter)
+    return section
+
+
+class HttpFetcher:
+    name = "http"
+
+    def __init__(self, pool_size: int = 10, timeout: float = 30.0, retries: int = 2):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, url: str, selector: Optional[str] = None) -> Optional[str]:
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code != 200:
+            logger.info("HTTP %s for %s", response.status_code, url)
+            return None
+        return response.text
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class PlaywrightFetcher:
+    name = "playwright"
+
+    # The browser pool is only launched the first time a page is needed
+    def __init__(self, pool=None, **pool_kwargs):
+        self._pool = pool
+        self._owns_pool = pool is None
+        self._pool_kwargs = pool_kwargs
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = BrowserPool(**self._pool_kwargs)
+            self._pool.start()
+        return self._pool
+
+    def fetch(self, url: str, selector: Optional[str] = None) -> Optional[str]:
+        with self.pool.page() as page:
+            page.goto(url, wait_until="domcontentloaded", timeout=100_000)
+            if not selector:
+                return page.content()
+            page.wait_for_selector(selector, timeout=60_000)
+            return page.inner_html(selector)
+
+    def close(self) -> None:
+        if self._owns_pool and self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+
+class FallbackFetcher:
+    def __init__(self, primary, fallback, stats: Optional[FetchStats] = None):
+        self.primary = primary
+        self.fallback = fallback
+        self.stats = stats if stats is not None else FetchStats()
+
+    # Fetch `url` and return the inner HTML of `selector`, falling back if missing
+    def fetch(self, url: str, selector: str) -> Optional[str]:
+        section = fetch_section(self.primary, url, selector, self.stats)
+        if section is not None:
+            return section
+
+        try:
+            section = self.fallback.fetch(url, selector)
+        except Exception:
+            self.stats.increment(self.fallback.name, "errors")
+            raise
+        counter = "hits" if section is not None else "errors"
+        self.stats.increment(self.fallback.name, counter)
+        return section
+
+    def close(self) -> None:
+        self.primary.close()
+        self.fallback.close()
@@ -0,0 +1,171 @@
+"""
+Pluggable HTML parsing engines and declarative selector specs.
+
+`get_engine()` picks the fastest parser that is installed:
+
+    selectolax (lexbor)  ->  BeautifulSoup + lxml  ->  BeautifulSoup + html.parser
+
+All engines expose the same small API (parse, select, select_one, text, attr,
+inner_html) so extraction code does not depend on the parser in use.
+A `SelectorSpec` maps output field names to CSS selectors. Its selectors are
+compiled once per engine and applied to each node (e.g. a product card), in
+place of hand-written find/select_one chains.
+
+Usage:
+    engine = get_engine()
+    spec = SelectorSpec({"name": Field("h2 span"), "link": Field("a", attr="href")})
+    for card in engine.select(engine.parse(html), engine.compile("div.card")):
+        record = spec.extract(card, engine)
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ENGINE_PREFERENCE = ("selectolax", "lxml", "html.parser")
+
+
+class SoupEngine:
+    def __init__(self, features: str = "html.parser"):
+        import soupsieve
+        from bs4 import BeautifulSoup
+
+        self.name = features
+        self.features = features
+        self._soup = BeautifulSoup
+        self._soupsieve = soupsieve
+
+    def parse(self, html: str):
+        return self._soup(html, self.features)
+
+    def compile(self, selector: str):
+        return self._soupsieve.compile(selector)
+
+    def select(self, node, compiled) -> list:
+        return compiled.select(node)
+
+    def select_one(self, node, compiled):
+        return compiled.select_one(node)
+
+    def text(self, node) -> str:
+        return node.get_text(strip=True)
+
+    def attr(self, node, name: str) -> Optional[str]:
+        return node.get(name)
+
+    def inner_html(self, node) -> str:
+        return node.decode_contents()
+
+
+class SelectolaxEngine:
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser = LexborHTMLParser
+
+    def parse(self, html: str):
+        return self._parser(html)
+
+    # Lexbor compiles selectors internally; the string is the compiled form
+    def compile(self, selector: str):
+        return selector
+
+    def select(self, node, compiled) -> list:
+        return node.css(compiled)
+
+    def select_one(self, node, compiled):
+        return node.css_first(compiled)
+
+    def text(self, node) -> str:
+        return node.text(strip=True)
+
+    def attr(self, node, name: str) -> Optional[str]:
+        return node.attributes.get(name)
+
+    def inner_html(self, node) -> str:
+        return node.inner_html or ""
+
+
+_engines: Dict[str, object] = {}
+
+
+def _build_engine(name: str):
+    if name == "selectolax":
+        return SelectolaxEngine()
+    if name == "lxml":
+        import lxml  # noqa: F401
+
+        return SoupEngine("lxml")
+    if name == "html.parser":
+        return SoupEngine("html.parser")
+    raise ValueError(f"Unknown parsing engine: {name}")
+
+
+# Return a cached engine by name; "auto" picks the first installed one
+def get_engine(name: str = "auto"):
+    if name in _engines:
+        return _engines[name]
+
+    candidates = ENGINE_PREFERENCE if name == "auto" else (name,)
+    for candidate in candidates:
+        try:
+            engine = _build_engine(candidate)
+        except ImportError:
+            logger.debug("Parsing engine %s is not installed.", candidate)
+            continue
+        _engines[name] = _engines[candidate] = engine
+        return engine
+    raise ImportError(f"Parsing engine {name} is not available.")
+
+
+def available_engines() -> List[str]:
+    names = []
+    for name in ENGINE_PREFERENCE:
+        try:
+            get_engine(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+@dataclass(frozen=True)
+class Field:
+    selector: str
+    attr: Optional[str] = None
+    many: bool = False
+
+
+class SelectorSpec:
+    def __init__(self, fields: Dict[str, Field]):
+        self.fields = fields
+        self._compiled: Dict[str, list] = {}
+
+    def _compile(self, engine) -> list:
+        compiled = self._compiled.get(engine.name)
+        if compiled is None:
+            compiled = [
+                (name, engine.compile(f.selector), f) for name, f in self.fields.items()
+            ]
+            self._compiled[engine.name] = compiled
+        return compiled
+
+    def _value(self, node, f: Field, engine):
+        return engine.attr(node, f.attr) if f.attr else engine.text(node)
+
+    # Apply every field selector to `node`; missing elements yield None (or [])
+    def extract(self, node, engine) -> dict:
+        record = {}
+        for name, selector, f in self._compile(engine):
+            if f.many:
+                record[name] = [
+                    self._value(el, f, engine) for el in engine.select(node, selector)
+                ]
+                continue
+            el = engine.select_one(node, selector)
+            record[name] = self._value(el, f, engine) if el is not None else None
+        return record
@@ -0,0 +1,113 @@
+"""
+Import-time profiling for the stage entry points.
+
+`--profile_imports` loads the current entry point in a child interpreter with
+`python -X importtime`, without running it: the script's module-level code
+runs under a name other than "__main__", then the modules the given options
+would import lazily (a load destination, Playwright, ...) are imported. No
+crawl, load or output file is started, and the child runs in a scratch
+directory. Once it exits, the packages that took longest to import
+(cumulative time of each top-level import) and the slowest individual modules
+(their own time) are printed. Everything else the child writes to stderr is
+passed through unchanged.
+
+Usage:
+    python load/run_data_loader.py -d dir --profile_imports
+"""
+
+import re
+import sys
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+PROFILE_FLAG = "--profile_imports"
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+# Loads a script like `python <script>` would, minus its `__main__` block
+PROFILE_CODE = """\
+import runpy, sys
+sys.path.insert(0, {directory!r})
+runpy.run_path({script!r}, run_name="__import_profile__")
+for module in {modules!r}:
+    __import__(module)
+"""
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def add_profile_argument(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        PROFILE_FLAG,
+        action="store_true",
+        help="Import the entry point under `-X importtime`, without running it, "
+        "and report the slowest imports.",
+    )
+
+
+# Split `-X importtime` output into timings and the child's own stderr lines
+def parse_importtime(lines: Iterable[str]) -> Tuple[List[ImportTiming], List[str]]:
+    timings, other = [], []
+    for line in lines:
+        match = IMPORTTIME_LINE.match(line.rstrip("\n"))
+        if match is None:
+            if not line.startswith("import time: self [us]"):
+                other.append(line)
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        timings.append(
+            ImportTiming(module, int(self_us), int(cumulative_us), len(indent) // 2)
+        )
+    return timings, other
+
+
+def format_report(timings: List[ImportTiming], top: int = 15) -> str:
+    total_ms = sum(t.cumulative_us for t in timings if t.depth == 0) / 1000
+    packages = sorted(
+        (t for t in timings if t.depth == 0), key=lambda t: -t.cumulative_us
+    )
+    modules = sorted(timings, key=lambda t: -t.self_us)
+    lines = [
+        f"Import time: {total_ms:.1f} ms over {len(timings)} module(s)",
+        "",
+        f"{'cumulative ms':>14}  top-level import",
+    ]
+    lines += [f"{t.cumulative_us / 1000:>14.1f}  {t.module}" for t in packages[:top]]
+    lines += ["", f"{'self ms':>14}  module"]
+    lines += [f"{t.self_us / 1000:>14.1f}  {t.module}" for t in modules[:top]]
+    return "\n".join(lines)
+
+
+# Import `script` (default: the running entry point) and then `modules` under
+# `-X importtime`; returns the child's exit code
+def profile_imports(
+    modules: Sequence[str] = (), script: Optional[str] = None, top: int = 15
+) -> int:
+    import subprocess
+    import tempfile
+
+    script_path = Path(script or sys.argv[0]).resolve()
+    code = PROFILE_CODE.format(
+        directory=str(script_path.parent),
+        script=str(script_path),
+        modules=list(modules),
+    )
+    with tempfile.TemporaryDirectory() as scratch:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=scratch,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    timings, other = parse_importtime(result.stderr.splitlines(keepends=True))
+    sys.stderr.writelines(other)
+    print(format_report(timings, top))
+    return result.returncode
@@ -0,0 +1,120 @@
+"""
+JSON Lines helpers shared by the pipeline stages.
+
+Records are appended one per line as they are produced and flushed to disk
+periodically, so memory stays flat however long a crawl runs and a crash
+still leaves every record written before the last flush readable. Readers
+stream the file back record by record and also accept the legacy
+single-array `.json` outputs.
+"""
+
+import json
+import logging
+import os
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JSONL_SUFFIX = ".jsonl"
+
+
+class JsonLinesWriter:
+    def __init__(
+        self,
+        path: Path,
+        mode: str = "w",
+        flush_every: int = 100,
+        fsync: bool = True,
+        count: int = 0,
+    ):
+        self.path = Path(path)
+        self.flush_every = max(1, flush_every)
+        self.fsync = fsync
+        self.count = count
+        self._unflushed = 0
+        self._file = open(self.path, mode, encoding="utf-8")
+
+    def __enter__(self) -> "JsonLinesWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def write_many(self, records: Iterable[dict]) -> None:
+        for record in records:
+            self.write(record)
+
+    # Push buffered lines to the OS, and to disk when `fsync` is set
+    def flush(self) -> None:
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._unflushed = 0
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+
+# Yield records from a `.jsonl` file, or from a legacy `.json` array
+def iter_records(path: Path) -> Iterator[dict]:
+    path = Path(path)
+    if path.suffix != JSONL_SUFFIX:
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+
+    with open(path, encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Only the last line can be torn by a crash mid-write
+                logger.warning("Skipping unreadable line %d in %s", line_num, path)
+
+
+# Cut a `.jsonl` file back to its first `count` complete lines; returns the
+# number of lines kept, which is lower than `count` if the file is shorter
+def truncate_records(path: Path, count: int) -> int:
+    kept = 0
+    offset = 0
+    with open(path, "r+b") as f:
+        for line in f:
+            if kept >= count or not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            kept += 1
+        f.truncate(offset)
+    return kept
+
+
+# Group a record stream into lists of at most `size` records
+def iter_batches(records: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    records = iter(records)
+    while True:
+        batch = list(islice(records, max(1, size)))
+        if not batch:
+            return
+        yield batch
+
+
+# Prefer `<stem>.jsonl`, falling back to a `<stem>.json` written by older runs
+def find_records_file(directory: Path, stem: str) -> Optional[Path]:
+    for suffix in (JSONL_SUFFIX, ".json"):
+        candidate = Path(directory) / f"{stem}{suffix}"
+        if candidate.is_file():
+            return candidate
+    return None
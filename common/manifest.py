@@ -0,0 +1,145 @@
+"""
+Per-directory manifest of pipeline artifacts.
+
+Every output directory (one marketplace/category/subcategory run group) keeps
+a small `manifest.json` listing the files each stage produced, newest first,
+with when it was written, its row count, size and SHA-256 checksum. Later
+stages look up the latest artifact of a stage directly instead of scanning and
+sorting file names, and each registration prunes older artifacts of the same
+stage according to a retention policy, deleting their files.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+
+@dataclass
+class RetentionPolicy:
+    keep: int = 7
+    max_age_days: Optional[float] = None
+
+    # Entries (newest first) beyond the policy; the newest is always kept
+    def expired(self, entries: List[dict], now: datetime) -> List[dict]:
+        keep = max(1, self.keep)
+        expired = entries[keep:]
+        if self.max_age_days is not None:
+            cutoff = now - timedelta(days=self.max_age_days)
+            expired += [
+                entry
+                for entry in entries[1:keep]
+                if datetime.fromisoformat(entry["created_at"]) < cutoff
+            ]
+        return expired
+
+
+# SHA-256 of a file, read in blocks
+def file_checksum(path: Path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path: Path, artifacts: Optional[Dict[str, List[dict]]] = None):
+        self.path = path
+        self.artifacts = artifacts or {}
+
+    @classmethod
+    def load(cls, directory: Path) -> "Manifest":
+        path = Path(directory) / MANIFEST_FILE
+        if not path.is_file():
+            return cls(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                artifacts = json.load(f)["artifacts"]
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Ignoring unreadable manifest %s: %s", path, exc)
+            return cls(path)
+        return cls(path, artifacts)
+
+    def _resolve(self, entry: dict) -> Path:
+        return self.path.parent / entry["file"]
+
+    # Latest artifact of `stage`, or None when it is missing or was changed
+    # since it was registered
+    def latest(self, stage: str) -> Optional[Path]:
+        entries = self.artifacts.get(stage)
+        if not entries:
+            return None
+        path = self._resolve(entries[0])
+        if not path.is_file() or path.stat().st_size != entries[0]["bytes"]:
+            logger.warning("Manifest entry %s no longer matches its file.", path)
+            return None
+        return path
+
+    # Add `path` as the newest artifact of `stage` and prune older ones
+    def register(
+        self,
+        stage: str,
+        path: Path,
+        rows: Optional[int] = None,
+        policy: Optional[RetentionPolicy] = None,
+        now: Optional[datetime] = None,
+    ) -> dict:
+        now = now or datetime.now()
+        path = Path(path)
+        try:
+            file_name = path.resolve().relative_to(self.path.parent.resolve())
+        except ValueError:
+            file_name = path.resolve()
+        entry = {
+            "file": file_name.as_posix(),
+            "stage": stage,
+            "created_at": now.isoformat(timespec="seconds"),
+            "rows": rows,
+            "bytes": path.stat().st_size,
+            "sha256": file_checksum(path),
+        }
+        # A stage that overwrites the same file keeps a single entry for it
+        entries = [
+            e for e in self.artifacts.get(stage, []) if e["file"] != entry["file"]
+        ]
+        entries.insert(0, entry)
+        expired = (policy or RetentionPolicy()).expired(entries, now)
+        self.artifacts[stage] = [e for e in entries if e not in expired]
+        for old in expired:
+            self._remove(old)
+        return entry
+
+    def _remove(self, entry: dict) -> None:
+        path = self._resolve(entry)
+        if path.is_file():
+            path.unlink()
+        logger.info("Pruned %s artifact %s.", entry["stage"], entry["file"])
+
+    # Write to a temporary file first so a crash never leaves a torn manifest
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"artifacts": self.artifacts}, f, indent=3)
+        os.replace(tmp_path, self.path)
+
+
+# Register one artifact in the manifest of the directory it was written to
+def register_artifact(
+    stage: str,
+    path: Path,
+    rows: Optional[int] = None,
+    policy: Optional[RetentionPolicy] = None,
+) -> dict:
+    manifest = Manifest.load(Path(path).parent)
+    entry = manifest.register(stage, path, rows, policy)
+    manifest.save()
+    return entry
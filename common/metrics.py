@@ -0,0 +1,307 @@
+"""
+Per-stage run metrics for the ETL pipeline.
+
+Every stage records into the process-wide `METRICS` registry:
+
+    counters   pages fetched, bytes received, records, rows, blocked requests,
+               errors, ...
+    timers     seconds spent loading, parsing, enriching, writing, ...
+
+each keyed by stage (extract, transform, load) and category (the
+"<category>/<subcategory>" being processed, or the target table for database
+loads). Calls without a category use `METRICS.category`, which a stage sets
+once it knows what it is working on.
+
+When a stage ends, `metrics_session` writes a JSON run report (totals, the
+per-category breakdown and derived rates such as records/s and rows/s) and,
+with `--prometheus`, the same values in the Prometheus text format next to it
+for a node-exporter textfile collector. `--metrics_port` serves the live
+values at `/metrics` while the Job pod runs, for a Prometheus scrape.
+
+Usage:
+    with metrics_session("transform", call_args):
+        METRICS.increment("transform", "records", len(batch))
+        with METRICS.timer("transform", "parse"):
+            ...
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = Path("logs") / "metrics"
+
+# Counters also reported per second of the category's `run` timer, the wall
+# time a stage spent on that category
+RATE_COUNTERS = ("pages", "bytes", "records", "rows")
+
+PROMETHEUS_PREFIX = "etl"
+
+
+class Metrics:
+    def __init__(self, category: str = ""):
+        self.category = category
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, str, str], float] = defaultdict(int)
+        # (stage, category, name) -> [count, total seconds, max seconds]
+        self.timers: Dict[Tuple[str, str, str], list] = {}
+
+    def _key(self, stage: str, name: str, category: Optional[str]) -> tuple:
+        return stage, self.category if category is None else category, name
+
+    def increment(
+        self, stage: str, name: str, value: float = 1, category: Optional[str] = None
+    ) -> None:
+        key = self._key(stage, name, category)
+        with self._lock:
+            self.counters[key] += value
+
+    def observe(
+        self, stage: str, name: str, seconds: float, category: Optional[str] = None
+    ) -> None:
+        key = self._key(stage, name, category)
+        with self._lock:
+            timer = self.timers.setdefault(key, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    # Time a block and record it under `name`, also when the block raises
+    @contextmanager
+    def timer(
+        self, stage: str, name: str, category: Optional[str] = None
+    ) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, name, time.perf_counter() - start, category)
+
+    # Picklable copy of the raw values, e.g. to return from a worker process
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [[*key, value] for key, value in self.counters.items()],
+                "timers": [[*key, *timer] for key, timer in self.timers.items()],
+            }
+
+    # Add the values of another registry's snapshot to this one
+    def merge(self, snapshot: dict) -> None:
+        with self._lock:
+            for stage, category, name, value in snapshot["counters"]:
+                self.counters[stage, category, name] += value
+            for stage, category, name, count, total, longest in snapshot["timers"]:
+                timer = self.timers.setdefault((stage, category, name), [0, 0.0, 0.0])
+                timer[0] += count
+                timer[1] += total
+                timer[2] = max(timer[2], longest)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+        self.started_at = time.time()
+
+    # Nested report: stage -> category -> counters, timers and rates
+    def report(self) -> dict:
+        snapshot = self.snapshot()
+        stages = defaultdict(
+            lambda: defaultdict(lambda: {"counters": {}, "timers": {}, "rates": {}})
+        )
+        for stage, category, name, value in snapshot["counters"]:
+            stages[stage][category]["counters"][name] = value
+        for stage, category, name, count, total, longest in snapshot["timers"]:
+            stages[stage][category]["timers"][name] = {
+                "count": count,
+                "total_s": round(total, 3),
+                "mean_s": round(total / count, 4) if count else 0.0,
+                "max_s": round(longest, 3),
+            }
+        for categories in stages.values():
+            for entry in categories.values():
+                run = entry["timers"].get("run", {}).get("total_s")
+                for name in RATE_COUNTERS:
+                    if run and name in entry["counters"]:
+                        entry["rates"][f"{name}_per_s"] = round(
+                            entry["counters"][name] / run, 2
+                        )
+
+        finished_at = time.time()
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(
+                timespec="seconds"
+            ),
+            "finished_at": datetime.fromtimestamp(finished_at).isoformat(
+                timespec="seconds"
+            ),
+            "elapsed_s": round(finished_at - self.started_at, 3),
+            "stages": {
+                stage: {
+                    "totals": stage_totals(categories),
+                    "categories": {c: dict(e) for c, e in categories.items()},
+                }
+                for stage, categories in stages.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        families = defaultdict(list)
+        for stage, category, name, value in snapshot["counters"]:
+            labels = prometheus_labels(stage, category)
+            families[f"{PROMETHEUS_PREFIX}_{name}_total", "counter"].append(
+                f"{PROMETHEUS_PREFIX}_{name}_total{labels} {value:g}"
+            )
+        for stage, category, name, count, total, _ in snapshot["timers"]:
+            labels = prometheus_labels(stage, category)
+            metric = f"{PROMETHEUS_PREFIX}_{name}_seconds"
+            families[metric, "summary"] += [
+                f"{metric}_sum{labels} {total:.6f}",
+                f"{metric}_count{labels} {count}",
+            ]
+        lines = []
+        for (metric, kind), samples in sorted(families.items()):
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path: Path) -> None:
+        write_text(path, json.dumps(self.report(), indent=3))
+        logger.info("Metrics report saved to: %s", path)
+
+    def write_prometheus(self, path: Path) -> None:
+        write_text(path, self.to_prometheus())
+
+
+# Process-wide registry every stage records into
+METRICS = Metrics()
+
+
+# Category label of a (category, subcategory) run, e.g. "pet food/wet food"
+def category_label(category: str, subcategory: str) -> str:
+    return f"{category}/{subcategory}"
+
+
+# Sum counters and timer totals over every category of a stage
+def stage_totals(categories: dict) -> dict:
+    counters = defaultdict(int)
+    seconds = defaultdict(float)
+    for entry in categories.values():
+        for name, value in entry["counters"].items():
+            counters[name] += value
+        for name, timer in entry["timers"].items():
+            seconds[name] += timer["total_s"]
+    return {
+        "counters": dict(counters),
+        "seconds": {name: round(value, 3) for name, value in seconds.items()},
+    }
+
+
+def prometheus_labels(stage: str, category: str) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+    return f'{{stage="{escape(stage)}",category="{escape(category)}"}}'
+
+
+# Write to a temporary file first so a scraper never reads a torn file
+def write_text(path: Path, text: str) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Serve `metrics` in the Prometheus text format at /metrics from a daemon thread
+def serve_prometheus(port: int, metrics: Metrics = METRICS):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving metrics on port %d at /metrics.", server.server_port)
+    return server
+
+
+def add_metrics_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--metrics_file",
+        default=None,
+        help=f"JSON run report path (default: {METRICS_DIR}/<stage>_<timestamp>.json).",
+    )
+    parser.add_argument(
+        "--prometheus",
+        action="store_true",
+        help="Also write the metrics in Prometheus text format (.prom) next to the report.",
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        default=None,
+        help="Serve the live metrics for Prometheus at :<port>/metrics during the run.",
+    )
+
+
+def default_report_path(stage: str) -> Path:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return METRICS_DIR / f"{stage}_{timestamp}_{os.getpid()}.json"
+
+
+# Serve the live metrics if asked to, and write the report (and the optional
+# Prometheus file) however the stage ends; an exception the stage did not
+# handle counts as one more error
+@contextmanager
+def metrics_session(
+    stage: str,
+    args: Optional[Namespace] = None,
+    category: Optional[str] = None,
+    metrics: Metrics = METRICS,
+) -> Iterator[Metrics]:
+    if category is not None:
+        metrics.category = category
+    port = getattr(args, "metrics_port", None)
+    server = serve_prometheus(port, metrics) if port is not None else None
+    report_path = Path(
+        getattr(args, "metrics_file", None) or default_report_path(stage)
+    )
+    try:
+        yield metrics
+    except Exception:
+        metrics.increment(stage, "errors")
+        raise
+    finally:
+        try:
+            metrics.write_report(report_path)
+            if getattr(args, "prometheus", False):
+                metrics.write_prometheus(report_path.with_suffix(".prom"))
+        except OSError as exc:
+            logger.warning("Could not write metrics report: %s", exc)
+        if server is not None:
+            server.shutdown()
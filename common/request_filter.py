@@ -0,0 +1,171 @@
+"""
+Shared request filter for Playwright pages.
+
+Every page the crawlers open routes its requests through one `RequestFilter`,
+which aborts what we never parse: resource types such as images, fonts,
+stylesheets and media, requests to ad and tracking domains, and video files.
+The rules are read once from `request_filter.toml` (in the working directory,
+or the copy shipped next to this module) into frozen sets, so a request costs
+one URL split and a few set lookups:
+
+    [block]
+    resource_types = ["image", "media", "font", "stylesheet"]
+    domains = ["doubleclick.net", ...]      # the domain and its subdomains
+    extensions = [".mp4", ...]              # matched against the URL path
+
+    [allow]
+    domains = []                            # never blocked, whatever the type
+
+The most specific matching domain wins, so `allow = ["cdn.example.com"]`
+lets that host through even when `example.com` is blocked.
+
+Handlers count allowed and blocked requests, by reason, in a `RequestCounts`
+(e.g. one per listing page) and in the run metrics.
+
+Usage:
+    request_filter = load_request_filter("extract")
+    counts = RequestCounts()
+    page.route("**/*", request_filter.handler(counts))
+"""
+
+import logging
+import tomllib
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+from urllib.parse import SplitResult, urlsplit
+
+from common.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = "request_filter.toml"
+
+# Host verdicts are cached; cleared when a crawl has seen this many hosts
+MAX_CACHED_HOSTS = 4096
+
+
+@dataclass
+class RequestCounts:
+    allowed: int = 0
+    blocked: int = 0
+    reasons: Counter = field(default_factory=Counter)
+
+    # Return the counts so far and start again from zero, e.g. between pages
+    def take(self) -> "RequestCounts":
+        taken = RequestCounts(self.allowed, self.blocked, self.reasons)
+        self.allowed, self.blocked, self.reasons = 0, 0, Counter()
+        return taken
+
+
+@dataclass(frozen=True)
+class FilterRules:
+    blocked_types: FrozenSet[str] = frozenset()
+    blocked_domains: FrozenSet[str] = frozenset()
+    blocked_extensions: Tuple[str, ...] = ()
+    allowed_domains: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "FilterRules":
+        block = config.get("block", {})
+        allow = config.get("allow", {})
+
+        def domains(values) -> FrozenSet[str]:
+            return frozenset(d.strip().lower().lstrip(".") for d in values)
+
+        return cls(
+            blocked_types=frozenset(block.get("resource_types", [])),
+            blocked_domains=domains(block.get("domains", [])),
+            blocked_extensions=tuple(e.lower() for e in block.get("extensions", [])),
+            allowed_domains=domains(allow.get("domains", [])),
+        )
+
+
+class RequestFilter:
+    def __init__(self, rules: FilterRules, stage: str = "extract"):
+        self.rules = rules
+        self.stage = stage
+        self._hosts: Dict[str, Optional[bool]] = {}
+
+    # True/False when the most specific listed suffix of the host is blocked/
+    # allowed, None when the host is not listed; cached per network location
+    def _host_verdict(self, parts: SplitResult) -> Optional[bool]:
+        if parts.netloc in self._hosts:
+            return self._hosts[parts.netloc]
+        verdict = None
+        labels = (parts.hostname or "").split(".")
+        for start in range(len(labels)):
+            suffix = ".".join(labels[start:])
+            if suffix in self.rules.allowed_domains:
+                verdict = False
+                break
+            if suffix in self.rules.blocked_domains:
+                verdict = True
+                break
+        if len(self._hosts) >= MAX_CACHED_HOSTS:
+            self._hosts.clear()
+        self._hosts[parts.netloc] = verdict
+        return verdict
+
+    # Why a request should be aborted ("domain", "type" or "extension"), or
+    # None to let it through
+    def block_reason(self, url: str, resource_type: str) -> Optional[str]:
+        parts = urlsplit(url)
+        verdict = self._host_verdict(parts)
+        if verdict is not None:
+            return "domain" if verdict else None
+        if resource_type in self.rules.blocked_types:
+            return "type"
+        if parts.path.lower().endswith(self.rules.blocked_extensions):
+            return "extension"
+        return None
+
+    def _count(self, reason: Optional[str], counts: Optional[RequestCounts]) -> None:
+        if reason is None:
+            METRICS.increment(self.stage, "allowed_requests")
+            if counts is not None:
+                counts.allowed += 1
+            return
+        METRICS.increment(self.stage, "blocked_requests")
+        if counts is not None:
+            counts.blocked += 1
+            counts.reasons[reason] += 1
+
+    # Route handler for the sync API, counting into `counts` if given
+    def handler(self, counts: Optional[RequestCounts] = None) -> Callable:
+        def handle(route, request) -> None:
+            reason = self.block_reason(request.url, request.resource_type)
+            self._count(reason, counts)
+            if reason is None:
+                route.continue_()
+            else:
+                route.abort()
+
+        return handle
+
+    # Route handler for the async API, counting into `counts` if given
+    def async_handler(self, counts: Optional[RequestCounts] = None) -> Callable:
+        async def handle(route, request) -> None:
+            reason = self.block_reason(request.url, request.resource_type)
+            self._count(reason, counts)
+            if reason is None:
+                await route.continue_()
+            else:
+                await route.abort()
+
+        return handle
+
+
+# Filter rules from `request_filter.toml` in the working directory, falling
+# back to the copy shipped next to this module
+def load_request_filter(
+    stage: str = "extract", path: Optional[Path] = None
+) -> RequestFilter:
+    config_path = Path(path or CONFIG_FILE)
+    if path is None and not config_path.is_file():
+        config_path = Path(__file__).resolve().parent / CONFIG_FILE
+    with open(config_path, "rb") as f:
+        rules = FilterRules.from_config(tomllib.load(f))
+    logger.debug("Request filter rules loaded from %s.", config_path)
+    return RequestFilter(rules, stage)
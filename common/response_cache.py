@@ -0,0 +1,270 @@
+"""
+On-disk HTML response cache shared by the extract and transform stages.
+
+Bodies are gzip-compressed and stored content-addressed under
+``<root>/objects/<sha256[:2]>/<sha256>.html.gz``, so identical pages are kept
+once. A small SQLite index maps each normalized URL to its body digest,
+fetch time and last access time. Entries older than ``ttl_seconds`` are
+treated as misses, and once the stored bodies exceed ``max_bytes`` the least
+recently used entries are evicted.
+
+Point ``root`` at the shared PVC (e.g. ``/app/data/.cache``) to reuse
+responses across jobs. With ``offline=True`` (replay mode) the TTL is ignored
+and callers must not fetch on a miss, so a crawl can be re-parsed from the
+cache alone.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+from urllib import parse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+@dataclass
+class CacheSettings:
+    cache_dir: Optional[str] = None
+    ttl_hours: float = DEFAULT_TTL_SECONDS / 3600
+    max_mb: float = DEFAULT_MAX_BYTES / (1024 * 1024)
+    replay: bool = False
+
+    # Open the configured cache, or return None when caching is disabled
+    def open(self) -> Optional["ResponseCache"]:
+        if not self.cache_dir:
+            if self.replay:
+                raise ValueError("Replay mode requires a cache directory.")
+            return None
+        return ResponseCache(
+            Path(self.cache_dir),
+            ttl_seconds=self.ttl_hours * 3600,
+            max_bytes=int(self.max_mb * 1024 * 1024),
+            offline=self.replay,
+        )
+
+
+# Shared CLI flags for the extract and transform stages
+def add_cache_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--cache_dir",
+        default=None,
+        help="Directory of the shared response cache (e.g. on the PVC). Off if unset.",
+    )
+    parser.add_argument(
+        "--cache_ttl",
+        type=float,
+        default=DEFAULT_TTL_SECONDS / 3600,
+        help="Hours a cached response stays fresh.",
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=float,
+        default=DEFAULT_MAX_BYTES / (1024 * 1024),
+        help="Maximum size of cached bodies before LRU eviction.",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Re-parse from the cache only, without fetching anything.",
+    )
+
+
+# Build cache settings from parsed `add_cache_arguments` flags
+def cache_settings_from_args(args) -> CacheSettings:
+    return CacheSettings(
+        cache_dir=args.cache_dir,
+        ttl_hours=args.cache_ttl,
+        max_mb=args.cache_max_mb,
+        replay=args.replay,
+    )
+
+
+# Lowercase scheme/host, drop default ports and fragments, sort query params
+def normalize_url(url: str) -> str:
+    parts = parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = parse.urlencode(
+        sorted(parse.parse_qsl(parts.query, keep_blank_values=True))
+    )
+    return parse.urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        root: Path,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        offline: bool = False,
+    ):
+        self.root = Path(root)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.root / "index.sqlite", timeout=30, check_same_thread=False
+        )
+        with self._db:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    url_key TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS objects (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+                """)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.html.gz"
+
+    def get(self, url: str) -> Optional[str]:
+        key = normalize_url(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest, fetched_at FROM entries WHERE url_key = ?", (key,)
+            ).fetchone()
+            if row is None or (
+                not self.offline and time.time() - row[1] > self.ttl_seconds
+            ):
+                self.misses += 1
+                return None
+            try:
+                body = gzip.decompress(self._object_path(row[0]).read_bytes())
+            except FileNotFoundError:
+                self._db.execute("DELETE FROM entries WHERE url_key = ?", (key,))
+                self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE entries SET accessed_at = ? WHERE url_key = ?",
+                (time.time(), key),
+            )
+            self._db.commit()
+            self.hits += 1
+        return body.decode("utf-8")
+
+    def put(self, url: str, body: str) -> None:
+        data = body.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        now = time.time()
+
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                compressed = gzip.compress(data)
+                tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+                tmp_path.write_bytes(compressed)
+                os.replace(tmp_path, path)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO objects (digest, size) VALUES (?, ?)",
+                    (digest, len(compressed)),
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (url_key, digest, fetched_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (normalize_url(url), digest, now, now),
+            )
+            self._db.commit()
+            self._evict()
+
+    # Drop least recently used entries (and orphaned bodies) above max_bytes
+    def _evict(self) -> None:
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM objects"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        rows = self._db.execute(
+            "SELECT url_key, digest FROM entries ORDER BY accessed_at"
+        ).fetchall()
+        for url_key, digest in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE url_key = ?", (url_key,))
+            evicted += 1
+            still_used = self._db.execute(
+                "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)
+            ).fetchone()
+            if still_used:
+                continue
+            size = self._db.execute(
+                "SELECT size FROM objects WHERE digest = ?", (digest,)
+            ).fetchone()
+            self._db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+            self._object_path(digest).unlink(missing_ok=True)
+            total -= size[0] if size else 0
+        self._db.commit()
+        logger.info("Response cache evicted %d entr(ies).", evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT (SELECT COUNT(*) FROM entries),"
+                " (SELECT COALESCE(SUM(size), 0) FROM objects)"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        logger.info("Response cache: %s", self.stats())
+        self._db.close()
+
+
+# Return the cached body for `url`, or fetch, store and return it on a miss
+def read_through(
+    cache: Optional[ResponseCache], url: str, fetch: Callable[[], Optional[str]]
+) -> Optional[str]:
+    if cache is None:
+        return fetch()
+    body = cache.get(url)
+    if body is not None or cache.offline:
+        return body
+    body = fetch()
+    if body is not None:
+        cache.put(url, body)
+    return body
+
+
+# Wrap any fetcher exposing `fetch(url, selector)` so it reads through a cache
+class CachingFetcher:
+    def __init__(self, fetcher, cache: ResponseCache):
+        self.fetcher = fetcher
+        self.cache = cache
+        self.name = getattr(fetcher, "name", "cache")
+
+    def fetch(self, url: str, selector: Optional[str] = None) -> Optional[str]:
+        return read_through(self.cache, url, lambda: self.fetcher.fetch(url, selector))
+
+    def close(self) -> None:
+        self.fetcher.close()
@@ -0,0 +1,332 @@
+"""
+Shared work queue with leases, for stages scaled out over identical pods.
+
+Work items of a run (e.g. one per subcategory or page range) are enqueued
+once; any number of workers then claim them one at a time. A claim is a
+lease: the worker renews it while it makes progress, and an item whose lease
+expires (the pod died or was evicted) is handed to the next worker that asks.
+An item is retried until it has been claimed `max_attempts` times, then
+marked failed.
+
+Two backends share one table layout:
+
+    sqlite:///app/data/work_queue.sqlite   a file on the shared volume (or a
+                                           plain path); claims take SQLite's
+                                           write lock, so it suits pods on
+                                           one node
+    postgres | postgresql://...            `FOR UPDATE SKIP LOCKED` claims, for
+                                           pods on any node; "postgres" alone
+                                           connects with the DB_* variables
+
+Usage:
+    queue = open_work_queue("data/work_queue.sqlite")
+    queue.enqueue(run_id, [(key, payload), ...])
+    while (item := queue.claim(run_id, worker_id())) is not None:
+        ...
+        queue.complete(item, worker_id(), {"records": 42})
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 900.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    run_id TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires_at DOUBLE PRECISION,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    last_error TEXT,
+    PRIMARY KEY (run_id, item_key)
+)
+"""
+
+COLUMNS = "run_id, item_key, payload, status, attempts, result, last_error"
+
+# Leases that ran out on their last attempt are not reclaimed but failed
+EXPIRE_SQL = (
+    "UPDATE work_items SET status = 'failed', last_error = 'lease expired'"
+    " WHERE run_id = %s AND status = 'leased' AND lease_expires_at < %s"
+    " AND attempts >= %s"
+)
+
+# Pending items, and leased items whose lease ran out, in key order
+CLAIMABLE_SQL = (
+    "SELECT item_key FROM work_items WHERE run_id = %s"
+    " AND (status = 'pending' OR (status = 'leased' AND lease_expires_at < %s))"
+    " AND attempts < %s ORDER BY item_key LIMIT 1"
+)
+
+LEASE_SQL = (
+    "UPDATE work_items SET status = 'leased', lease_owner = %s,"
+    " lease_expires_at = %s, attempts = attempts + 1"
+)
+
+
+# Raised by a worker's heartbeat once another worker took its item over
+class LeaseLost(Exception):
+    pass
+
+
+@dataclass
+class WorkItem:
+    run_id: str
+    item_key: str
+    payload: dict
+    status: str = "pending"
+    attempts: int = 0
+    result: Optional[dict] = None
+    last_error: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "WorkItem":
+        run_id, item_key, payload, status, attempts, result, last_error = row
+        return cls(
+            run_id,
+            item_key,
+            json.loads(payload),
+            status,
+            attempts,
+            json.loads(result) if result else None,
+            last_error,
+        )
+
+
+# Identifies this worker in leases: the pod name, plus the process id
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue(ABC):
+    # DB-API parameter marker of the backend; queries are written with %s
+    placeholder = "%s"
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+
+    # Context manager yielding a cursor, committed on exit
+    @abstractmethod
+    def _transaction(self):
+        pass
+
+    # Key of the next claimable item, locked until the transaction ends
+    @abstractmethod
+    def _claim_key(self, cursor, run_id: str, now: float) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+    def _sql(self, query: str) -> str:
+        return query.replace("%s", self.placeholder)
+
+    def _execute(self, cursor, query: str, params: tuple = ()) -> None:
+        cursor.execute(self._sql(query), params)
+
+    # Add items as (key, payload); keys already queued for the run are kept
+    # as they are, so every worker may seed the same run
+    def enqueue(self, run_id: str, items: Iterable[Tuple[str, dict]]) -> int:
+        added = 0
+        with self._transaction() as cursor:
+            for key, payload in items:
+                self._execute(
+                    cursor,
+                    "INSERT INTO work_items (run_id, item_key, payload)"
+                    " VALUES (%s, %s, %s)"
+                    " ON CONFLICT (run_id, item_key) DO NOTHING",
+                    (run_id, key, json.dumps(payload, sort_keys=True)),
+                )
+                added += max(cursor.rowcount, 0)
+        return added
+
+    # Lease the next claimable item for `lease_seconds`, or None if there is
+    # none right now
+    def claim(
+        self,
+        run_id: str,
+        worker: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    ) -> Optional[WorkItem]:
+        now = time.time()
+        with self._transaction() as cursor:
+            self._execute(cursor, EXPIRE_SQL, (run_id, now, self.max_attempts))
+            key = self._claim_key(cursor, run_id, now)
+            if key is None:
+                return None
+            self._execute(
+                cursor,
+                LEASE_SQL + " WHERE run_id = %s AND item_key = %s",
+                (worker, now + lease_seconds, run_id, key),
+            )
+            self._execute(
+                cursor,
+                f"SELECT {COLUMNS} FROM work_items WHERE run_id = %s AND item_key = %s",
+                (run_id, key),
+            )
+            return WorkItem.from_row(tuple(cursor.fetchone()))
+
+    # Extend a lease; False if the worker no longer holds it
+    def renew(
+        self,
+        item: WorkItem,
+        worker: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    ) -> bool:
+        return self._update_leased(
+            item, worker, "lease_expires_at = %s", time.time() + lease_seconds
+        )
+
+    def complete(self, item: WorkItem, worker: str, result: dict) -> bool:
+        return self._update_leased(
+            item,
+            worker,
+            "status = 'done', lease_owner = NULL, result = %s, last_error = NULL",
+            json.dumps(result, sort_keys=True),
+        )
+
+    # Put the item back for another attempt, or fail it after the last one
+    def fail(self, item: WorkItem, worker: str, error: str) -> bool:
+        status = "failed" if item.attempts >= self.max_attempts else "pending"
+        return self._update_leased(
+            item,
+            worker,
+            "status = %s, lease_owner = NULL, last_error = %s",
+            status,
+            error,
+        )
+
+    def _update_leased(
+        self, item: WorkItem, worker: str, assignments: str, *values
+    ) -> bool:
+        with self._transaction() as cursor:
+            self._execute(
+                cursor,
+                f"UPDATE work_items SET {assignments} WHERE run_id = %s"
+                " AND item_key = %s AND status = 'leased' AND lease_owner = %s",
+                (*values, item.run_id, item.item_key, worker),
+            )
+            updated = cursor.rowcount == 1
+        if not updated:
+            logger.warning("Lease on %s was lost to another worker.", item.item_key)
+        return updated
+
+    # Number of items per status
+    def counts(self, run_id: str) -> Dict[str, int]:
+        with self._transaction() as cursor:
+            self._execute(
+                cursor,
+                "SELECT status, COUNT(*) FROM work_items WHERE run_id = %s"
+                " GROUP BY status",
+                (run_id,),
+            )
+            return {status: count for status, count in cursor.fetchall()}
+
+    def items(self, run_id: str) -> List[WorkItem]:
+        with self._transaction() as cursor:
+            self._execute(
+                cursor,
+                f"SELECT {COLUMNS} FROM work_items WHERE run_id = %s ORDER BY item_key",
+                (run_id,),
+            )
+            return [WorkItem.from_row(tuple(row)) for row in cursor.fetchall()]
+
+    # True once no item is pending or leased: everything is done or failed
+    def drained(self, run_id: str) -> bool:
+        counts = self.counts(run_id)
+        return not counts.get("pending") and not counts.get("leased")
+
+
+class SqliteWorkQueue(WorkQueue):
+    placeholder = "?"
+
+    def __init__(self, path: Path, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        super().__init__(max_attempts)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode, so `BEGIN IMMEDIATE` takes the write lock up front
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute(SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+
+    def _claim_key(self, cursor, run_id: str, now: float) -> Optional[str]:
+        self._execute(cursor, CLAIMABLE_SQL, (run_id, now, self.max_attempts))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class PostgresWorkQueue(WorkQueue):
+    def __init__(self, dsn: str = "", max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        super().__init__(max_attempts)
+        # Imported here so SQLite queues never need the driver
+        import psycopg2
+
+        if dsn:
+            self.conn = psycopg2.connect(dsn)
+        else:
+            self.conn = psycopg2.connect(
+                host=os.getenv("DB_HOST"),
+                port=os.getenv("DB_PORT"),
+                dbname=os.getenv("DB_NAME"),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+            )
+        with self._transaction() as cursor:
+            cursor.execute(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self.conn:
+            with self.conn.cursor() as cursor:
+                yield cursor
+
+    # Skip rows other workers are claiming instead of waiting for them
+    def _claim_key(self, cursor, run_id: str, now: float) -> Optional[str]:
+        cursor.execute(
+            CLAIMABLE_SQL + " FOR UPDATE SKIP LOCKED", (run_id, now, self.max_attempts)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+# Open the queue a URL names: "postgres" or "postgresql://..." for PostgreSQL,
+# "sqlite://<path>" or a plain path for SQLite
+def open_work_queue(url: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> WorkQueue:
+    if url == "postgres":
+        return PostgresWorkQueue("", max_attempts)
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresWorkQueue(url, max_attempts)
+    return SqliteWorkQueue(Path(url.removeprefix("sqlite://")), max_attempts)
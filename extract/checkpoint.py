@@ -0,0 +1,89 @@
+"""
+Crawl checkpoints for resuming interrupted extractions.
+
+After every page has been flushed to the JSON Lines output, a small
+`<output>.checkpoint.json` file records which pages are complete, the URL of
+the next page and how many records the output holds. A restarted run (e.g.
+a Kubernetes Job retry) loads it, truncates the output back to that record
+count and continues from the next page instead of page 1. The checkpoint is
+removed once a crawl completes.
+"""
+
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CrawlCheckpoint:
+    search_url: str
+    mode: str
+    started_on: str = field(
+        default_factory=lambda: datetime.today().strftime("%Y-%m-%d")
+    )
+    completed_pages: List[int] = field(default_factory=list)
+    next_url: Optional[str] = None
+    records: int = 0
+
+    @property
+    def last_page(self) -> int:
+        return max(self.completed_pages, default=0)
+
+    # Same crawl started today; anything else starts over from page 1
+    def matches(self, search_url: str, mode: str) -> bool:
+        today = datetime.today().strftime("%Y-%m-%d")
+        return (
+            self.search_url == search_url
+            and self.mode == mode
+            and self.started_on == today
+        )
+
+    def complete_page(
+        self, page_num: int, next_url: Optional[str], records: int
+    ) -> None:
+        self.completed_pages.append(page_num)
+        self.next_url = next_url
+        self.records = records
+
+
+# Path of the checkpoint kept next to a crawl's output file
+def checkpoint_path(output_path: Path) -> Path:
+    return output_path.with_suffix(".checkpoint.json")
+
+
+def load_checkpoint(
+    path: Path, search_url: str, mode: str
+) -> Optional[CrawlCheckpoint]:
+    if not path.is_file():
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            checkpoint = CrawlCheckpoint(**json.load(f))
+    except (OSError, TypeError, ValueError) as exc:
+        logger.warning("Ignoring unreadable checkpoint %s: %s", path, exc)
+        return None
+    if not checkpoint.matches(search_url, mode):
+        logger.info("Checkpoint %s is for another crawl; starting over.", path.name)
+        return None
+    return checkpoint
+
+
+# Write to a temporary file first so a crash never leaves a torn checkpoint
+def save_checkpoint(path: Path, checkpoint: CrawlCheckpoint) -> None:
+    tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(asdict(checkpoint), f, indent=3)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(path: Path) -> None:
+    if path.is_file():
+        path.unlink()
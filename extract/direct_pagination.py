@@ -0,0 +1,319 @@
+"""
+Direct-URL pagination mode.
+
+Instead of clicking "Next" page by page, page URLs are built directly from
+the search URL (`&page=N`) and a page range is fetched concurrently, one page
+per browser context at a time, over a single shared Firefox browser. Pages
+are handed to the `on_page` callback in page order as soon as every earlier
+page has finished, deduplicated by `product_detail_url`.
+
+With `fetcher="http"` each page is first requested over plain HTTP and the
+browser (launched lazily) is only used for pages whose response lacks the
+result container.
+
+Pages listed in `skip_pages` (completed by an earlier, interrupted run) are
+not fetched again; pages that fail are reported once the range is done.
+`on_page` may return False (e.g. once a record limit is reached) to stop the
+range: pages not yet fetched are skipped and later pages are not emitted.
+
+When a `ResponseCache` is given, cached result sections are used instead of
+fetching, and freshly fetched ones are stored.
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Collection, List, Optional, Set, Union
+from urllib import parse
+
+from common.fetcher import FetchStats, HttpFetcher, fetch_section
+from common.metrics import METRICS
+from common.request_filter import RequestCounts, RequestFilter, load_request_filter
+from common.response_cache import ResponseCache
+from extract.listing_parser import parse_listing_section
+from extract.timing import PageTiming, RunSummary, WaitSettings
+
+logger = logging.getLogger(__name__)
+
+# Called with each page's new products in page order; returning False stops the
+# range. A coroutine function is awaited on the event loop.
+PageCallback = Callable[
+    [int, List[dict]], Union[Optional[bool], Awaitable[Optional[bool]]]
+]
+
+
+@dataclass
+class PaginationSettings:
+    mode: str = "click"
+    min_page: int = 1
+    max_page: int = 1
+    contexts: int = 3
+    fetcher: str = "browser"
+
+
+# Browser contexts that only launch Firefox once the first one is requested
+class LazyContextPool:
+    def __init__(self, size: int):
+        self.size = size
+        self._playwright = None
+        self._browser = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self):
+        async with self._lock:
+            if self._queue is None:
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.firefox.launch(headless=True)
+                self._queue = asyncio.Queue()
+                for _ in range(self.size):
+                    self._queue.put_nowait(await self._browser.new_context())
+        return await self._queue.get()
+
+    def put(self, context) -> None:
+        self._queue.put_nowait(context)
+
+    async def close(self) -> None:
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+
+# Build the URL of a given results page from the search URL
+def build_page_url(search_url: str, page_num: int) -> str:
+    parts = parse.urlsplit(search_url)
+    query = [(k, v) for k, v in parse.parse_qsl(parts.query) if k != "page"]
+    if page_num > 1:
+        query.append(("page", str(page_num)))
+    return parse.urlunsplit(parts._replace(query=parse.urlencode(query)))
+
+
+# Cache key recording the last results page seen for a search URL
+def last_page_key(search_url: str) -> str:
+    parts = parse.urlsplit(build_page_url(search_url, 1))
+    query = parse.parse_qsl(parts.query) + [("_meta", "last_page")]
+    return parse.urlunsplit(parts._replace(query=parse.urlencode(query)))
+
+
+# Load one results page in the given context and return its result section HTML
+async def fetch_listing_page(
+    context,
+    timing: PageTiming,
+    wait_settings: WaitSettings,
+    summary: RunSummary,
+    request_filter: RequestFilter,
+) -> Optional[str]:
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+    page_url, page_num = timing.url, timing.page_num
+    page = await context.new_page()
+    requests = RequestCounts()
+    await page.route("**/*", request_filter.async_handler(requests))
+    try:
+        with summary.timed(timing, "load_s"):
+            await page.goto(page_url, wait_until="domcontentloaded", timeout=100_000)
+        start = time.perf_counter()
+        try:
+            with summary.timed(timing, "wait_s"):
+                await page.wait_for_selector(
+                    wait_settings.results_selector,
+                    state="attached",
+                    timeout=wait_settings.max_timeout * 1000,
+                )
+        finally:
+            summary.record_wait("results", page_num, time.perf_counter() - start)
+        return await page.inner_html(wait_settings.results_selector)
+    except PlaywrightTimeoutError:
+        logger.warning("Timed out loading page %d: %s", page_num, page_url)
+    except Exception as error:
+        logger.error("Error loading page %d: %s", page_num, error)
+    finally:
+        await page.close()
+        timing.record_requests(requests)
+    return None
+
+
+async def scrape_page_range_async(
+    marketplace: str,
+    parent_url: str,
+    search_url: str,
+    category: str,
+    subcategory: str,
+    settings: PaginationSettings,
+    wait_settings: WaitSettings,
+    summary: RunSummary,
+    on_page: PageCallback,
+    fetch_stats: Optional[FetchStats] = None,
+    cache: Optional[ResponseCache] = None,
+    skip_pages: Collection[int] = (),
+    seen_urls: Optional[Set[str]] = None,
+) -> int:
+    fetch_stats = fetch_stats if fetch_stats is not None else FetchStats()
+    today = datetime.today().strftime("%Y-%m-%d")
+    page_numbers = [
+        page_num
+        for page_num in range(max(1, settings.min_page), settings.max_page + 1)
+        if page_num not in skip_pages
+    ]
+    if not page_numbers:
+        logger.info("Every page in the range was already completed.")
+        return 0
+
+    slots = asyncio.Semaphore(max(1, min(settings.contexts, len(page_numbers))))
+    contexts = LazyContextPool(max(1, min(settings.contexts, len(page_numbers))))
+    request_filter = load_request_filter("extract")
+    http = (
+        HttpFetcher(pool_size=settings.contexts) if settings.fetcher == "http" else None
+    )
+
+    # Try plain HTTP first (if enabled), then a borrowed browser context
+    async def fetch_page_html(timing: PageTiming) -> Optional[str]:
+        async with slots:
+            if stopped:
+                return None
+            html = None
+            if http is not None:
+                with summary.timed(timing, "load_s"):
+                    html = await asyncio.to_thread(
+                        fetch_section,
+                        http,
+                        timing.url,
+                        wait_settings.results_selector,
+                        fetch_stats,
+                    )
+            if html is None:
+                context = await contexts.get()
+                try:
+                    html = await fetch_listing_page(
+                        context, timing, wait_settings, summary, request_filter
+                    )
+                finally:
+                    contexts.put(context)
+                counter = "hits" if html is not None else "errors"
+                fetch_stats.increment("playwright", counter)
+            if wait_settings.politeness_delay > 0:
+                await asyncio.sleep(wait_settings.politeness_delay)
+        return html
+
+    seen = seen_urls if seen_urls is not None else set()
+    finished = {}
+    failed = []
+    next_index = 0
+    emitted = 0
+    stopped = False
+    drain_lock = asyncio.Lock()
+
+    # Emit every finished page that has no unfinished page before it; pages
+    # that could not be fetched are skipped so a resumed run fetches them again.
+    # A coroutine `on_page` is awaited, so a callback that may block can hand
+    # its work to a thread without stalling the fetches still in flight; the
+    # lock keeps pages in order meanwhile.
+    async def drain() -> None:
+        nonlocal next_index, emitted, stopped
+        async with drain_lock:
+            while (
+                not stopped
+                and next_index < len(page_numbers)
+                and page_numbers[next_index] in finished
+            ):
+                page_num = page_numbers[next_index]
+                next_index += 1
+                products = finished.pop(page_num)
+                if products is None:
+                    failed.append(page_num)
+                    METRICS.increment("extract", "errors")
+                    continue
+                unique = []
+                for product in products:
+                    if product["product_detail_url"] in seen:
+                        continue
+                    seen.add(product["product_detail_url"])
+                    unique.append(product)
+                emitted += len(unique)
+                result = on_page(page_num, unique)
+                if inspect.isawaitable(result):
+                    result = await result
+                if result is False:
+                    stopped = True
+                    logger.info("Stopping the page range after page %d.", page_num)
+
+    async def parse_page(page_num: int) -> Optional[List[dict]]:
+        timing = summary.page(page_num, build_page_url(search_url, page_num))
+        html = cache.get(timing.url) if cache is not None else None
+        timing.cached = html is not None
+        if html is None and not (cache is not None and cache.offline):
+            html = await fetch_page_html(timing)
+            if html is not None and cache is not None:
+                cache.put(timing.url, html)
+        if html is None:
+            return [] if cache is not None and cache.offline else None
+        timing.bytes = len(html.encode("utf-8"))
+        with summary.timed(timing, "parse_s"):
+            products = parse_listing_section(
+                html,
+                marketplace,
+                parent_url,
+                search_url,
+                category,
+                subcategory,
+                today,
+            )
+        timing.products = len(products)
+        logger.info("Page %d: %d product(s).", page_num, len(products))
+        return products
+
+    async def scrape_page(page_num: int) -> None:
+        finished[page_num] = await parse_page(page_num)
+        await drain()
+
+    try:
+        await asyncio.gather(*(scrape_page(n) for n in page_numbers))
+    finally:
+        await contexts.close()
+        if http is not None:
+            http.close()
+        fetch_stats.log_summary()
+
+    logger.info("Total pages requested: %d", len(page_numbers))
+    logger.info("Total unique products collected: %d", emitted)
+    if failed:
+        raise RuntimeError(f"{len(failed)} page(s) could not be fetched: {failed}")
+    return emitted
+
+
+def scrape_page_range(
+    marketplace: str,
+    parent_url: str,
+    search_url: str,
+    category: str,
+    subcategory: str,
+    settings: PaginationSettings,
+    on_page: PageCallback,
+    wait_settings: Optional[WaitSettings] = None,
+    summary: Optional[RunSummary] = None,
+    cache: Optional[ResponseCache] = None,
+    skip_pages: Collection[int] = (),
+    seen_urls: Optional[Set[str]] = None,
+) -> int:
+    return asyncio.run(
+        scrape_page_range_async(
+            marketplace,
+            parent_url,
+            search_url,
+            category,
+            subcategory,
+            settings,
+            wait_settings or WaitSettings(),
+            summary if summary is not None else RunSummary(),
+            on_page,
+            cache=cache,
+            skip_pages=skip_pages,
+            seen_urls=seen_urls,
+        )
+    )
@@ -25,22 +25,66 @@ Recommended Directory Structure for Saving Output (optional):
         <marketplace_name>/
             <category>/
                 <subcategory>/
-                    <timestamp>.json
+                    <marketplace>_<category>_<subcategory>.jsonl
 
 """
 
 import json
 import logging
 import re
+import sys
 import time
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
+from typing import Generator, Iterator, List, Optional, Tuple
 from urllib import parse
 
-from bs4 import BeautifulSoup
-from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
-from playwright.sync_api import sync_playwright
+# Make project packages importable when run as `python extract/extraction.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.import_profile import add_profile_argument, profile_imports  # noqa: E402
+from common.jsonl import (  # noqa: E402
+    JSONL_SUFFIX,
+    JsonLinesWriter,
+    iter_records,
+    truncate_records,
+)
+from common.manifest import register_artifact  # noqa: E402
+from common.metrics import (  # noqa: E402
+    METRICS,
+    add_metrics_arguments,
+    category_label,
+    metrics_session,
+)
+from common.request_filter import RequestCounts, load_request_filter  # noqa: E402
+from common.response_cache import (  # noqa: E402
+    CacheSettings,
+    ResponseCache,
+    add_cache_arguments,
+    cache_settings_from_args,
+)
+from extract.checkpoint import (  # noqa: E402
+    CrawlCheckpoint,
+    checkpoint_path,
+    clear_checkpoint,
+    load_checkpoint,
+    save_checkpoint,
+)
+from extract.direct_pagination import (  # noqa: E402
+    PaginationSettings,
+    build_page_url,
+    last_page_key,
+    scrape_page_range,
+)
+from extract.listing_parser import parse_listing_section  # noqa: E402
+from extract.timing import (  # noqa: E402
+    RunSummary,
+    WaitSettings,
+    polite_pause,
+    wait_for_results,
+)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -120,149 +164,236 @@ def build_search_query(marketplace_key: str) -> dict:
     return search_queries
 
 
-# Extract product-level details such as name, price, currency, and image URL from HTML
-def page_level_product_extraction(html_soup):
-    img_tag = html_soup.select_one(
-        'span[data-component-type="s-product-image"] img.s-image'
-    )
-    product_img_url = img_tag["src"] if img_tag else None
+# Yield (page number, products) for consecutive cached result pages; the
+# generator returns (next page to fetch, whether the crawl was finished)
+def replay_cached_pages(
+    cache: ResponseCache,
+    marketplace: str,
+    parent_url: str,
+    url: str,
+    category: str,
+    subcategory: str,
+    today: str,
+    summary: RunSummary,
+    first_page: int = 1,
+) -> Generator[Tuple[int, List[dict]], None, Tuple[int, bool]]:
+    page_num = first_page
+    while True:
+        page_url = build_page_url(url, page_num)
+        section_html = cache.get(page_url)
+        if section_html is None:
+            return page_num, False
+
+        timing = summary.page(page_num, page_url)
+        timing.cached = True
+        timing.bytes = len(section_html.encode("utf-8"))
+        with summary.timed(timing, "parse_s"):
+            products = parse_listing_section(
+                section_html, marketplace, parent_url, url, category, subcategory, today
+            )
+        timing.products = len(products)
+        logger.info(
+            "Replayed page %d from cache: %d product(s).", page_num, len(products)
+        )
+        yield page_num, products
 
-    try:
-        name = html_soup.find("h2").find("span").get_text(strip=True)
-    except Exception:
-        name = None
+        if cache.get(last_page_key(url)) == str(page_num):
+            return page_num + 1, True
+        page_num += 1
 
-    try:
-        price_tag = html_soup.select_one(".a-price .a-offscreen")
-        if price_tag:
-            price_text = price_tag.get_text(strip=True)
-            parts = price_text.split()
-            currency, price = parts if len(parts) == 2 else ("", parts[0])
-            currency = str(currency)
-            price = float(price)
-        else:
-            currency, price = None, None
-    except Exception:
-        currency, price = None, None
 
-    return {
-        "name": name.lower(),
-        "price": price,
-        "currency": currency,
-        "image_url": product_img_url,
-    }
+# Scrape all paginated product pages starting from the given search URL (or
+# from `start_page` when resuming), yielding (page number, products) as soon
+# as each page is parsed
+def click_through_all_pages(
+    marketplace: str,
+    parent_url: str,
+    url: str,
+    category: str,
+    subcategory: str,
+    wait_settings: Optional[WaitSettings] = None,
+    summary: Optional[RunSummary] = None,
+    cache: Optional[ResponseCache] = None,
+    start_page: int = 1,
+) -> Iterator[Tuple[int, List[dict]]]:
+    wait_settings = wait_settings or WaitSettings()
+    summary = summary if summary is not None else RunSummary()
+    today = datetime.today().strftime("%Y-%m-%d")
+    page_num = start_page
+
+    # Replay pages already cached, then continue live from the first miss
+    if cache is not None:
+        page_num, finished = yield from replay_cached_pages(
+            cache,
+            marketplace,
+            parent_url,
+            url,
+            category,
+            subcategory,
+            today,
+            summary,
+            first_page=page_num,
+        )
+        if finished or cache.offline:
+            return
 
+    # Imported here so replays and argument errors never pay for Playwright
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+    from playwright.sync_api import sync_playwright
 
-# Scrape all paginated product pages starting from the given search URL
-def click_through_all_pages(
-    marketplace: str, parent_url: str, url: str, category: str, subcategory: str
-):
     with sync_playwright() as p:
         browser = p.firefox.launch(headless=True)
         context = browser.new_context()
         page = context.new_page()
 
-        def block_requests(route, request):
-            blocked_resources = ["media", "audio"]
-            blocked_extensions = (".mp4", ".m3u8", ".webm", ".mov", ".avi", ".flv")
-            ad_domains = [
-                "doubleclick.net",
-                "google-analytics.com",
-                "googletagmanager.com",
-                "adsystem.com",
-                "amazon-adsystem.com",
-                "facebook.net",
-            ]
-
-            if (
-                request.resource_type in blocked_resources
-                or request.url.endswith(blocked_extensions)
-                or any(domain in request.url for domain in ad_domains)
-            ):
-                route.abort()
-            else:
-                route.continue_()
-
-        page.route("**/*", block_requests)
+        # Requests are counted per page, between one page's parse and the next
+        requests = RequestCounts()
+        page.route("**/*", load_request_filter("extract").handler(requests))
 
         try:
-            page.goto(url, wait_until="domcontentloaded", timeout=100_000)
-            page.wait_for_timeout(60_000)
-            page_num = 1
-            product_data = []
-            today = datetime.today().strftime("%Y-%m-%d")
+            start_url = build_page_url(url, page_num)
+            timing = summary.page(page_num, start_url)
+            with summary.timed(timing, "load_s"):
+                page.goto(start_url, wait_until="domcontentloaded", timeout=100_000)
+            with summary.timed(timing, "wait_s"):
+                wait_for_results(page, wait_settings, summary, page_num)
 
             while True:
                 logger.info("Scraping page %d", page_num)
 
-                html_soup = BeautifulSoup(
-                    page.query_selector(
-                        "span.rush-component.s-latency-cf-section"
-                    ).inner_html(),
-                    "html.parser",
-                )
-
-                for idx, html in enumerate(
-                    html_soup.find_all("div", class_="a-section a-spacing-base"), 1
-                ):
-                    try:
-                        link = html.find("a", class_="a-link-normal")
-                        href = link.get("href") if link else None
-                        if href:
-                            product_details = page_level_product_extraction(html)
-                            product_details.update(
-                                {
-                                    "product_detail_url": parse.urljoin(
-                                        parent_url, href
-                                    ),
-                                    "page_url": url,
-                                    "marketplace": marketplace.lower(),
-                                    "category": category.lower(),
-                                    "subcategory": subcategory.lower(),
-                                    "date_collected": today,
-                                    "url": parent_url,
-                                }
-                            )
-                            product_data.append(product_details)
-                    except Exception as error:
-                        logger.warning(
-                            "Skipping product #%s due to error: %s", idx, error
-                        )
+                section_html = page.query_selector(
+                    wait_settings.results_selector
+                ).inner_html()
+                timing.bytes = len(section_html.encode("utf-8"))
+                timing.record_requests(requests.take())
+                if cache is not None:
+                    cache.put(build_page_url(url, page_num), section_html)
+
+                with summary.timed(timing, "parse_s"):
+                    products = parse_listing_section(
+                        section_html,
+                        marketplace,
+                        parent_url,
+                        url,
+                        category,
+                        subcategory,
+                        today,
+                    )
+                timing.products = len(products)
+                yield page_num, products
 
                 try:
                     pagination = page.locator("a.s-pagination-item", has_text="Next")
+                    start = time.perf_counter()
                     pagination.wait_for(state="visible", timeout=15_000)
+                    summary.record_wait(
+                        "next_button", page_num, time.perf_counter() - start
+                    )
 
                     if pagination.is_enabled():
-                        time.sleep(3)
-                        with page.expect_navigation(
-                            wait_until="networkidle", timeout=100_000
-                        ):
-                            pagination.click()
+                        polite_pause(wait_settings, summary, page_num)
                         page_num += 1
+                        timing = summary.page(page_num, url)
+                        with summary.timed(timing, "load_s"):
+                            with page.expect_navigation(
+                                wait_until="domcontentloaded", timeout=100_000
+                            ):
+                                pagination.click()
+                        timing.url = page.url
+                        with summary.timed(timing, "wait_s"):
+                            wait_for_results(page, wait_settings, summary, page_num)
                     else:
                         logger.info("Next button found but not enabled.")
+                        if cache is not None:
+                            cache.put(last_page_key(url), str(page_num))
                         break
 
                 except PlaywrightTimeoutError:
                     logger.info("Next button not found or not visible within timeout.")
+                    if cache is not None:
+                        cache.put(last_page_key(url), str(page_num))
                     break
                 except Exception as error:
                     logger.error("Unexpected pagination error: %s", error)
+                    METRICS.increment("extract", "errors")
                     break
 
             logger.info("Total pages visited: %d", page_num)
-            logger.info("Total products collected: %d", len(product_data))
-            print(json.dumps(product_data[:3], indent=3))
-
-            return product_data
 
-        except Exception as error:
-            logger.error("Error occurred: %s", error)
         finally:
             browser.close()
 
 
+# Crawl flags shared by every entry point that runs `scrape_subcategory`
+def add_crawl_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--politeness_delay",
+        type=float,
+        default=1.0,
+        help="Seconds to pause before clicking through to the next page.",
+    )
+    parser.add_argument(
+        "--wait_timeout",
+        type=float,
+        default=60.0,
+        help="Maximum seconds to wait for search results to render per page.",
+    )
+    parser.add_argument(
+        "--pagination",
+        choices=["click", "direct"],
+        default="click",
+        help="Click through 'Next' (click) or fetch page URLs concurrently (direct).",
+    )
+    parser.add_argument(
+        "--min",
+        type=int,
+        default=1,
+        help="First results page to fetch in direct pagination mode.",
+    )
+    parser.add_argument(
+        "--max",
+        type=int,
+        default=1,
+        help="Last results page to fetch in direct pagination mode.",
+    )
+    parser.add_argument(
+        "--contexts",
+        type=int,
+        default=3,
+        help="Browser contexts fetching pages concurrently in direct mode.",
+    )
+    parser.add_argument(
+        "--fetcher",
+        choices=["browser", "http"],
+        default="browser",
+        help="Render pages in a browser, or try plain HTTP first (direct mode).",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Ignore any checkpoint of an interrupted crawl and start from page 1.",
+    )
+    add_cache_arguments(parser)
+
+
+# Build wait, pagination and cache settings from `add_crawl_arguments` flags
+def crawl_settings_from_args(
+    args,
+) -> Tuple[WaitSettings, PaginationSettings, CacheSettings]:
+    wait_settings = WaitSettings(
+        max_timeout=args.wait_timeout,
+        politeness_delay=args.politeness_delay,
+    )
+    pagination = PaginationSettings(
+        mode=args.pagination,
+        min_page=args.min,
+        max_page=args.max,
+        contexts=args.contexts,
+        fetcher=args.fetcher,
+    )
+    return wait_settings, pagination, cache_settings_from_args(args)
+
+
 # Parse command-line arguments for marketplace, category, and subcategory
 def cli_arguments() -> ArgumentParser:
     parser = ArgumentParser()
@@ -284,21 +415,262 @@ def cli_arguments() -> ArgumentParser:
         help="Subcategory name for search query construction.",
         default="wet food",
     )
+    parser.add_argument(
+        "--all_categories",
+        action="store_true",
+        help="Scrape every category/subcategory defined for the marketplace.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=2,
+        help="Number of worker processes used with --all_categories.",
+    )
+    add_crawl_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_argument(parser)
     return parser.parse_args()
 
 
-def main() -> None:
-    # Parse CLI arguments
-    call_args = cli_arguments()
+# Build the output file path for a marketplace/category/subcategory combination
+def build_output_path(marketplace: str, category: str, subcategory: str) -> Path:
+    # Generate filename using marketplace, category, and subcategory
+    filename_base = f"{marketplace} {category} {subcategory}"
+    file_name = normalize_strings(filename_base) + JSONL_SUFFIX
+
+    # Clean directory names (replace non-alphanumerics with underscores)
+    safe_category = re.sub(r"\W+", "_", category).strip().replace(" ", "_")
+    safe_subcategory = re.sub(r"\W+", "_", subcategory).strip().replace(" ", "_")
+
+    # Define output directory path
+    output_dir = Path.cwd() / "output" / marketplace / safe_category / safe_subcategory
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return output_dir / file_name
+
+
+# Load the checkpoint of an interrupted crawl and cut its output back to the
+# checkpointed records; returns None when the crawl should start over
+def resume_checkpoint(
+    checkpoint_file: Path, output_path: Path, url: str, mode: str, resume: bool
+) -> Optional[CrawlCheckpoint]:
+    if not resume:
+        clear_checkpoint(checkpoint_file)
+        return None
+    checkpoint = load_checkpoint(checkpoint_file, url, mode)
+    if checkpoint is None or not output_path.is_file():
+        return None
+    kept = truncate_records(output_path, checkpoint.records)
+    if kept < checkpoint.records:
+        logger.warning(
+            "Output holds %d of %d checkpointed record(s); starting over.",
+            kept,
+            checkpoint.records,
+        )
+        return None
+    logger.info(
+        "Resuming after page %d with %d record(s) already saved.",
+        checkpoint.last_page,
+        checkpoint.records,
+    )
+    return checkpoint
+
+
+# Scrape a single subcategory, streaming its products to its own JSON Lines file
+def scrape_subcategory(
+    marketplace: str,
+    web_url: str,
+    url: str,
+    category: str,
+    subcategory: str,
+    wait_settings: Optional[WaitSettings] = None,
+    pagination: Optional[PaginationSettings] = None,
+    cache_settings: Optional[CacheSettings] = None,
+    resume: bool = True,
+) -> Path:
+    output_path = build_output_path(marketplace, category, subcategory)
+    summary = RunSummary()
+    METRICS.category = category_label(category, subcategory)
+    started = time.perf_counter()
+    mode = pagination.mode if pagination is not None else "click"
+    checkpoint_file = checkpoint_path(output_path)
+    checkpoint = resume_checkpoint(checkpoint_file, output_path, url, mode, resume)
+    resumed = checkpoint is not None
+    checkpoint = checkpoint or CrawlCheckpoint(url, mode)
+    cache = cache_settings.open() if cache_settings is not None else None
+    preview = []
+
+    # Append each parsed page to disk, then checkpoint it, before moving on
+    def save_page(page_num: int, products: List[dict]) -> None:
+        writer.write_many(products)
+        writer.flush()
+        checkpoint.complete_page(
+            page_num, build_page_url(url, page_num + 1), writer.count
+        )
+        save_checkpoint(checkpoint_file, checkpoint)
+        preview.extend(products[: 3 - len(preview)])
+        logger.info(
+            "Page %d saved: %d product(s), %d in total.",
+            page_num,
+            len(products),
+            writer.count,
+        )
+
+    seen_urls = (
+        {record["product_detail_url"] for record in iter_records(output_path)}
+        if resumed and mode == "direct"
+        else None
+    )
+    writer = JsonLinesWriter(
+        output_path, mode="a" if resumed else "w", count=checkpoint.records
+    )
+    try:
+        if mode == "direct":
+            scrape_page_range(
+                marketplace,
+                web_url,
+                url,
+                category,
+                subcategory,
+                pagination,
+                save_page,
+                wait_settings,
+                summary,
+                cache,
+                skip_pages=checkpoint.completed_pages,
+                seen_urls=seen_urls,
+            )
+        else:
+            for page_num, products in click_through_all_pages(
+                marketplace,
+                web_url,
+                url,
+                category,
+                subcategory,
+                wait_settings,
+                summary,
+                cache,
+                start_page=checkpoint.last_page + 1,
+            ):
+                save_page(page_num, products)
+    except Exception as error:
+        logger.error(
+            "Scraping stopped: %s. %d product(s) already saved to: %s; "
+            "the next run resumes from the checkpoint.",
+            error,
+            writer.count,
+            output_path,
+        )
+        METRICS.increment("extract", "errors")
+        raise
+    finally:
+        writer.close()
+        if cache is not None:
+            cache.close()
+        summary.write(output_path.with_suffix(".summary.json"))
+        summary.record_metrics(METRICS)
+        METRICS.observe("extract", "run", time.perf_counter() - started)
+
+    clear_checkpoint(checkpoint_file)
+    register_artifact("extract", output_path, writer.count)
+    print(json.dumps(preview, indent=3))
+    logger.info("Total products collected: %d", writer.count)
+    logger.info("Scraping completed. Data saved to: %s", output_path)
+    return output_path
+
+
+# Scrape one subcategory in a worker process and return the metrics it
+# recorded, with the error message if it failed
+def scrape_in_worker(*args) -> Tuple[dict, Optional[str]]:
+    METRICS.reset()
+    try:
+        scrape_subcategory(*args)
+        error = None
+    except Exception as exc:
+        error = str(exc)
+    return METRICS.snapshot(), error
+
+
+# Fan every (category, subcategory) query out across a pool of worker processes
+def scrape_all_categories(
+    marketplace: str,
+    web_url: str,
+    search_queries: dict,
+    workers: int,
+    wait_settings: Optional[WaitSettings] = None,
+    pagination: Optional[PaginationSettings] = None,
+    cache_settings: Optional[CacheSettings] = None,
+    resume: bool = True,
+) -> None:
+    logger.info(
+        "Scraping %d subcategories with %d worker(s).", len(search_queries), workers
+    )
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                scrape_in_worker,
+                marketplace,
+                web_url,
+                url,
+                category,
+                subcategory,
+                wait_settings,
+                pagination,
+                cache_settings,
+                resume,
+            ): (category, subcategory)
+            for (category, subcategory), url in search_queries.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                snapshot, error = future.result()
+                METRICS.merge(snapshot)
+            except Exception as exc:
+                METRICS.increment("extract", "errors", category=category_label(*key))
+                error = str(exc)
+            if error is not None:
+                logger.error("Scrape failed for %s: %s", key, error)
+                failed.append(key)
+
+    if failed:
+        logger.error("%d subcategory scrape(s) failed: %s", len(failed), failed)
+        exit(1)
+
+
+# Scrape the category (or every category) selected on the command line
+def scrape_from_args(call_args) -> None:
     marketplace = call_args.marketplace
     category = call_args.category
     subcategory = call_args.subcategory
 
     # Build search queries and retrieve URL based on provided category & subcategory
     search_queries = build_search_query(marketplace)
+    web_url = "https://www.amazon.ae"
+    wait_settings, pagination, cache_settings = crawl_settings_from_args(call_args)
+    if cache_settings.replay and not cache_settings.cache_dir:
+        logger.error("--replay requires --cache_dir.")
+        exit(1)
+
+    if call_args.all_categories:
+        if not search_queries:
+            logger.error("No search queries defined for marketplace: %s", marketplace)
+            exit(1)
+        scrape_all_categories(
+            marketplace,
+            web_url,
+            search_queries,
+            call_args.workers,
+            wait_settings,
+            pagination,
+            cache_settings,
+            not call_args.fresh,
+        )
+        return
+
     key = (category, subcategory)
     url = search_queries.get(key)
-    web_url = "https://www.amazon.ae"
     if not url:
         logger.error(
             "Search query for the provided category and subcategory was not found."
@@ -308,28 +680,34 @@ def main() -> None:
     logger.info("Starting scrape for: %s", url)
     print(call_args)
 
-    # Generate filename using marketplace, category, and subcategory
-    filename_base = f"{marketplace} {category} {subcategory}"
-    file_name = normalize_strings(filename_base) + ".json"
-    print(file_name)
-
-    # Clean directory names (replace non-alphanumerics with underscores)
-    safe_category = re.sub(r"\W+", "_", category).strip().replace(" ", "_")
-    safe_subcategory = re.sub(r"\W+", "_", subcategory).strip().replace(" ", "_")
-
-    # Define output directory path
-    output_dir = Path.cwd() / "output" / marketplace / safe_category / safe_subcategory
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    # Scrape products and save to JSON file in the output directory
-    output_path = output_dir / file_name
-    print(output_path)
-    products = click_through_all_pages(marketplace, web_url, url, category, subcategory)
+    try:
+        scrape_subcategory(
+            marketplace,
+            web_url,
+            url,
+            category,
+            subcategory,
+            wait_settings,
+            pagination,
+            cache_settings,
+            not call_args.fresh,
+        )
+    except Exception:
+        exit(1)
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(products, f, indent=3)
 
-    logger.info("Scraping completed. Data saved to: %s", output_path)
+def main() -> None:
+    # Parse CLI arguments
+    call_args = cli_arguments()
+    if call_args.profile_imports:
+        # The crawl imports Playwright (and requests for --fetcher http) lazily
+        direct = call_args.pagination == "direct"
+        modules = ["playwright.async_api" if direct else "playwright.sync_api"]
+        if direct and call_args.fetcher == "http":
+            modules.append("requests")
+        exit(profile_imports(modules))
+    with metrics_session("extract", call_args):
+        scrape_from_args(call_args)
 
 
 if __name__ == "__main__":
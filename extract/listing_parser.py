@@ -0,0 +1,94 @@
+"""
+Search result (listing) page parsing shared by the click-through and
+direct-URL pagination modes.
+
+Product cards are located and read with the declarative selector specs
+below, using the fastest installed parsing engine (see common/html_engine.py).
+"""
+
+import logging
+from typing import Optional
+from urllib import parse
+
+from common.html_engine import Field, SelectorSpec, get_engine
+
+logger = logging.getLogger(__name__)
+
+# Exact class match, like find_all("div", class_="a-section a-spacing-base")
+CARD_SELECTOR = 'div[class="a-section a-spacing-base"]'
+
+LISTING_CARD_SPEC = SelectorSpec(
+    {
+        "href": Field("a.a-link-normal", attr="href"),
+        "image_url": Field(
+            'span[data-component-type="s-product-image"] img.s-image', attr="src"
+        ),
+        "name": Field("h2 span"),
+        "price_text": Field(".a-price .a-offscreen"),
+    }
+)
+
+
+# Turn raw card fields into name, price, currency, and image URL
+def page_level_product_extraction(card_fields: dict) -> dict:
+    name = card_fields.get("name")
+    if not name:
+        raise ValueError("product name not found")
+
+    try:
+        price_text = card_fields.get("price_text")
+        if price_text:
+            parts = price_text.split()
+            currency, price = parts if len(parts) == 2 else ("", parts[0])
+            currency = str(currency)
+            price = float(price)
+        else:
+            currency, price = None, None
+    except Exception:
+        currency, price = None, None
+
+    return {
+        "name": name.lower(),
+        "price": price,
+        "currency": currency,
+        "image_url": card_fields.get("image_url"),
+    }
+
+
+# Parse every product card in a search results section into product records
+def parse_listing_section(
+    section_html: str,
+    marketplace: str,
+    parent_url: str,
+    page_url: str,
+    category: str,
+    subcategory: str,
+    today: str,
+    engine: Optional[object] = None,
+) -> list:
+    engine = engine or get_engine()
+    root = engine.parse(section_html)
+    products = []
+
+    for idx, card in enumerate(engine.select(root, engine.compile(CARD_SELECTOR)), 1):
+        try:
+            card_fields = LISTING_CARD_SPEC.extract(card, engine)
+            href = card_fields["href"]
+            if href:
+                product_details = page_level_product_extraction(card_fields)
+                product_details.update(
+                    {
+                        "product_detail_url": parse.urljoin(parent_url, href),
+                        "page_url": page_url,
+                        "marketplace": marketplace.lower(),
+                        "category": category.lower(),
+                        "subcategory": subcategory.lower(),
+                        "date_collected": today,
+                        "url": parent_url,
+                    }
+                )
+                products.append(product_details)
+        except Exception as error:
+            logger.warning("Skipping product #%s due to error: %s", idx, error)
+
+    return products
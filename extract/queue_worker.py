@@ -0,0 +1,460 @@
+"""
+Extraction worker for a shared work queue (see `common/work_queue.py`).
+
+N identical pods (e.g. a Kubernetes Indexed Job with `parallelism: N`) run
+this script against one queue and run id:
+
+    seed      enqueue one work item per subcategory (click pagination), or per
+              `--pages_per_item` pages of `--min`..`--max` (direct
+              pagination); every pod may seed, items already queued are kept
+    work      claim items until the queue is drained, writing each item's
+              products to its own shard, `<shard_dir>/<run_id>/<item>.jsonl`
+    finalize  merge the shards of each subcategory, in page order and
+              deduplicated by `product_detail_url`, into the usual
+              `output/<marketplace>/<category>/<subcategory>/` file
+
+`--role all` (the default) seeds and works; the pod with completion index 0
+(`JOB_COMPLETION_INDEX`, or the only pod outside an Indexed Job) then waits
+until every item is done or failed and finalizes. A shard is written to a
+temporary file and renamed when its item completes, so an item retried after
+a pod died never leaves partial or duplicate records. Scaling extraction
+means raising the number of pods.
+
+Usage:
+    python extract/queue_worker.py --queue data/work_queue.sqlite --all_categories
+    python extract/queue_worker.py --queue postgres --run_group pet-food \\
+        --run_name pet-dry-food --pagination direct --max 20 --pages_per_item 5
+"""
+
+import logging
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+# Make project packages importable when run as `python extract/queue_worker.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.jsonl import JSONL_SUFFIX, JsonLinesWriter, iter_records  # noqa: E402
+from common.manifest import register_artifact  # noqa: E402
+from common.metrics import (  # noqa: E402
+    METRICS,
+    add_metrics_arguments,
+    category_label,
+    metrics_session,
+)
+from common.response_cache import CacheSettings  # noqa: E402
+from common.work_queue import (  # noqa: E402
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_ATTEMPTS,
+    LeaseLost,
+    WorkItem,
+    WorkQueue,
+    open_work_queue,
+    worker_id,
+)
+from extract.direct_pagination import (  # noqa: E402
+    PaginationSettings,
+    scrape_page_range,
+)
+from extract.extraction import (  # noqa: E402
+    add_crawl_arguments,
+    build_output_path,
+    build_search_query,
+    click_through_all_pages,
+    crawl_settings_from_args,
+    normalize_strings,
+    search_query_list,
+)
+from extract.timing import RunSummary, WaitSettings  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_DIR = Path("output") / "shards"
+
+
+# Work items as (key, payload) for the selected searches; keys sort in page
+# order within a subcategory
+def build_work_items(
+    searches: List[Tuple[str, str, str, str, str]],
+    pagination: PaginationSettings,
+    pages_per_item: int = 0,
+) -> List[Tuple[str, dict]]:
+    items = []
+    for marketplace, web_url, category, subcategory, url in searches:
+        base_key = f"{marketplace}/{category}/{subcategory}"
+        payload = {
+            "marketplace": marketplace,
+            "web_url": web_url,
+            "url": url,
+            "category": category,
+            "subcategory": subcategory,
+            "min_page": None,
+            "max_page": None,
+        }
+        if pages_per_item <= 0:
+            items.append((base_key, payload))
+            continue
+        for first in range(
+            pagination.min_page, pagination.max_page + 1, pages_per_item
+        ):
+            last = min(first + pages_per_item - 1, pagination.max_page)
+            items.append(
+                (
+                    f"{base_key}/pages-{first:04d}-{last:04d}",
+                    {**payload, "min_page": first, "max_page": last},
+                )
+            )
+    return items
+
+
+# (marketplace, base URL, category, subcategory, search URL) of the searches
+# selected on the command line
+def selected_searches(call_args) -> List[Tuple[str, str, str, str, str]]:
+    marketplace = call_args.marketplace
+    if marketplace not in search_query_list["marketplace"]:
+        raise ValueError(f"Unknown marketplace: {marketplace}")
+    web_url = search_query_list["marketplace"][marketplace]["url"]
+    search_queries = build_search_query(marketplace)
+    if call_args.all_categories:
+        keys = list(search_queries)
+    elif call_args.run_group and call_args.run_name:
+        # Imported here: only Helm-style run names need the pipeline module
+        from pipeline_runner import resolve_category
+
+        keys = [resolve_category(marketplace, call_args.run_group, call_args.run_name)]
+    else:
+        keys = [(call_args.category, call_args.subcategory)]
+    missing = [key for key in keys if key not in search_queries]
+    if missing:
+        raise ValueError(f"No search query defined for: {missing}")
+    return [(marketplace, web_url, *key, search_queries[key]) for key in keys]
+
+
+def shard_path(shard_dir: Path, item: WorkItem) -> Path:
+    name = normalize_strings(item.item_key.replace("/", " ").replace("-", " "))
+    return Path(shard_dir) / item.run_id / (name + JSONL_SUFFIX)
+
+
+# Scrape one work item into its shard; `heartbeat` is called after every page
+# and before the shard is renamed into place, and raises `LeaseLost` to stop
+def scrape_item(
+    item: WorkItem,
+    shard_file: Path,
+    wait_settings: WaitSettings,
+    pagination: PaginationSettings,
+    cache_settings: CacheSettings,
+    heartbeat: Callable[[], None],
+) -> int:
+    p = item.payload
+    label = category_label(p["category"], p["subcategory"])
+    METRICS.category = label
+    summary = RunSummary()
+    started = time.perf_counter()
+    shard_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = shard_file.with_name(f"{shard_file.name}.tmp{os.getpid()}")
+    cache = cache_settings.open()
+
+    def save_page(page_num: int, products: List[dict]) -> None:
+        writer.write_many(products)
+        writer.flush()
+        heartbeat()
+        logger.info(
+            "%s: page %d saved, %d product(s).", item.item_key, page_num, len(products)
+        )
+
+    writer = JsonLinesWriter(tmp_path)
+    completed = False
+    try:
+        if p["min_page"] is None:
+            for page_num, products in click_through_all_pages(
+                p["marketplace"],
+                p["web_url"],
+                p["url"],
+                p["category"],
+                p["subcategory"],
+                wait_settings,
+                summary,
+                cache,
+            ):
+                save_page(page_num, products)
+        else:
+            scrape_page_range(
+                p["marketplace"],
+                p["web_url"],
+                p["url"],
+                p["category"],
+                p["subcategory"],
+                replace(
+                    pagination,
+                    mode="direct",
+                    min_page=p["min_page"],
+                    max_page=p["max_page"],
+                ),
+                save_page,
+                wait_settings,
+                summary,
+                cache,
+            )
+        # Only the current lease holder may replace the shard
+        heartbeat()
+        completed = True
+    except LeaseLost:
+        raise
+    except Exception:
+        METRICS.increment("extract", "errors")
+        raise
+    finally:
+        writer.close()
+        if not completed:
+            tmp_path.unlink(missing_ok=True)
+        if cache is not None:
+            cache.close()
+        summary.record_metrics(METRICS)
+        METRICS.observe("extract", "run", time.perf_counter() - started)
+
+    os.replace(tmp_path, shard_file)
+    return writer.count
+
+
+# Claim and scrape items until none is pending or leased; items leased by
+# other workers are waited for, and taken over if their lease runs out
+def work(
+    queue: WorkQueue,
+    run_id: str,
+    shard_dir: Path,
+    wait_settings: WaitSettings,
+    pagination: PaginationSettings,
+    cache_settings: CacheSettings,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_seconds: float = 10.0,
+) -> int:
+    worker = worker_id()
+    processed = 0
+
+    def heartbeat(item: WorkItem) -> None:
+        if not queue.renew(item, worker, lease_seconds):
+            raise LeaseLost(item.item_key)
+
+    while True:
+        item = queue.claim(run_id, worker, lease_seconds)
+        if item is None:
+            if queue.drained(run_id):
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        logger.info("Claimed %s (attempt %d).", item.item_key, item.attempts)
+        shard_file = shard_path(shard_dir, item)
+        try:
+            records = scrape_item(
+                item,
+                shard_file,
+                wait_settings,
+                pagination,
+                cache_settings,
+                lambda: heartbeat(item),
+            )
+        except LeaseLost:
+            logger.warning("Stopped %s: another worker owns it now.", item.item_key)
+            continue
+        except Exception as exc:
+            logger.error("Work item %s failed: %s", item.item_key, exc)
+            queue.fail(item, worker, str(exc))
+            continue
+        result = {"shard": str(shard_file), "records": records}
+        if queue.complete(item, worker, result):
+            processed += 1
+
+    logger.info("Queue drained; this worker completed %d item(s).", processed)
+    return processed
+
+
+# Merge the shards of every fully done subcategory into its output file;
+# returns the subcategories with failed items
+def finalize(queue: WorkQueue, run_id: str) -> List[str]:
+    groups = defaultdict(list)
+    for item in queue.items(run_id):
+        p = item.payload
+        groups[p["marketplace"], p["category"], p["subcategory"]].append(item)
+
+    failed = []
+    for (marketplace, category, subcategory), items in sorted(groups.items()):
+        label = category_label(category, subcategory)
+        broken = [item.item_key for item in items if item.status != "done"]
+        if broken:
+            for item in items:
+                if item.status != "done":
+                    logger.error(
+                        "%s %s: %s", item.item_key, item.status, item.last_error
+                    )
+            failed.append(f"{marketplace}:{label}")
+            continue
+
+        output_path = build_output_path(marketplace, category, subcategory)
+        tmp_path = output_path.with_name(f"{output_path.name}.tmp{os.getpid()}")
+        seen_urls = set()
+        with JsonLinesWriter(tmp_path) as writer:
+            for item in items:
+                for record in iter_records(Path(item.result["shard"])):
+                    url = record.get("product_detail_url")
+                    if url is not None:
+                        if url in seen_urls:
+                            continue
+                        seen_urls.add(url)
+                    writer.write(record)
+        os.replace(tmp_path, output_path)
+        register_artifact("extract", output_path, writer.count)
+        METRICS.increment("extract", "merged_records", writer.count, category=label)
+        logger.info(
+            "Merged %d shard(s) into %d record(s): %s",
+            len(items),
+            writer.count,
+            output_path,
+        )
+    return failed
+
+
+# Completion index of this pod in an Indexed Job; 0 outside of one
+def completion_index() -> int:
+    return int(os.getenv("JOB_COMPLETION_INDEX", "0"))
+
+
+def cli_arguments():
+    parser = ArgumentParser(
+        description="Extract categories or page ranges pulled from a shared work queue."
+    )
+    parser.add_argument(
+        "--queue",
+        required=True,
+        help="Work queue: a SQLite file path (sqlite://<path>), 'postgres' (DB_* variables) or a postgresql:// URL.",
+    )
+    parser.add_argument(
+        "--run_id",
+        default=datetime.today().strftime("%Y-%m-%d"),
+        help="Run the work items belong to; reuse it to resume a run (default: today).",
+    )
+    parser.add_argument(
+        "--role",
+        choices=["all", "seed", "work", "finalize"],
+        default="all",
+        help="Seed, work and (completion index 0 only) finalize, or one of them.",
+    )
+    parser.add_argument(
+        "-m", "--marketplace", default="amazonae", help="Marketplace to seed."
+    )
+    parser.add_argument(
+        "-c", "--category", default="pet food", help="Category to seed."
+    )
+    parser.add_argument(
+        "-s", "--subcategory", default="wet food", help="Subcategory to seed."
+    )
+    parser.add_argument(
+        "--run_group",
+        default=None,
+        help="Seed the category of a Helm run group (e.g. pet-food) with --run_name.",
+    )
+    parser.add_argument(
+        "--run_name",
+        default=None,
+        help="Seed the subcategory of a Helm run name (e.g. pet-dry-food).",
+    )
+    parser.add_argument(
+        "--all_categories",
+        action="store_true",
+        help="Seed every category/subcategory defined for the marketplace.",
+    )
+    parser.add_argument(
+        "--pages_per_item",
+        type=int,
+        default=0,
+        help="Split --min..--max into direct-pagination items of this many pages (0: one item per subcategory).",
+    )
+    parser.add_argument(
+        "--shard_dir",
+        default=str(DEFAULT_SHARD_DIR),
+        help="Directory on the shared volume for per-item shard files.",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        help="Seconds a claimed item stays leased without progress before another worker takes it over.",
+    )
+    parser.add_argument(
+        "--max_attempts",
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help="Claims per item before it is marked failed.",
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=10.0,
+        help="Seconds between checks while other workers still hold leases.",
+    )
+    add_crawl_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+
+def run_from_args(call_args) -> Optional[List[str]]:
+    wait_settings, pagination, cache_settings = crawl_settings_from_args(call_args)
+    if cache_settings.replay and not cache_settings.cache_dir:
+        logger.error("--replay requires --cache_dir.")
+        exit(1)
+    try:
+        searches = selected_searches(call_args)
+    except ValueError as exc:
+        logger.error("Cannot seed the work queue: %s", exc)
+        exit(1)
+
+    queue = open_work_queue(call_args.queue, call_args.max_attempts)
+    try:
+        if call_args.role in ("all", "seed"):
+            items = build_work_items(searches, pagination, call_args.pages_per_item)
+            added = queue.enqueue(call_args.run_id, items)
+            logger.info(
+                "Run %s: %d of %d work item(s) newly queued.",
+                call_args.run_id,
+                added,
+                len(items),
+            )
+        if call_args.role in ("all", "work"):
+            work(
+                queue,
+                call_args.run_id,
+                Path(call_args.shard_dir),
+                wait_settings,
+                pagination,
+                cache_settings,
+                call_args.lease,
+                call_args.poll,
+            )
+        if call_args.role == "finalize" or (
+            call_args.role == "all" and completion_index() == 0
+        ):
+            return finalize(queue, call_args.run_id)
+    finally:
+        queue.close()
+    return None
+
+
+def main() -> None:
+    call_args = cli_arguments()
+    with metrics_session("extract", call_args):
+        failed = run_from_args(call_args)
+    if failed:
+        logger.error(
+            "%d subcategory(ies) have failed work items: %s", len(failed), failed
+        )
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
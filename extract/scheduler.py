@@ -0,0 +1,577 @@
+"""
+Crawl scheduler for every marketplace in `search_query_list`.
+
+Each (marketplace, category, subcategory) search is a task in a persistent
+SQLite queue (`output/crawl_queue.sqlite` by default) that remembers when it
+was last crawled, across runs. A task is due once its last crawl is older
+than `refresh_hours`, and due tasks start in priority order:
+
+    priority = hours since the last crawl x importance
+
+so the stalest and most important catalogues are refreshed first, and a
+subcategory that was never crawled ranks above all of them. Importance comes
+from `scheduler.toml` (per category or subcategory, times a per-marketplace
+multiplier).
+
+Worker processes run `scrape_subcategory` for each task, while the scheduler
+keeps every host within its limits:
+
+    [hosts."www.amazon.ae"]
+    crawls_per_minute = 2.0   # token bucket: crawl starts per minute ...
+    burst = 2                 # ... and how many may start at once
+    concurrency = 2           # crawls running against the host at a time
+
+so each host is crawled as fast as it allows while the others proceed in
+parallel. Pages within a crawl are still paced by `--politeness_delay`. A
+failed crawl is retried after `retry_minutes`, doubled per failed attempt.
+The run ends once no task is due (or after `--max_tasks`), so a CronJob that
+runs it every hour keeps each catalogue at most `refresh_hours` old.
+
+Usage:
+    python extract/scheduler.py --workers 4
+    python extract/scheduler.py --dry_run    # print the queue in priority order
+"""
+
+import logging
+import sqlite3
+import sys
+import time
+import tomllib
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Make project packages importable when run as `python extract/scheduler.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.metrics import (  # noqa: E402
+    METRICS,
+    add_metrics_arguments,
+    category_label,
+    metrics_session,
+)
+from extract.extraction import (  # noqa: E402
+    add_crawl_arguments,
+    build_search_query,
+    crawl_settings_from_args,
+    scrape_in_worker,
+    search_query_list,
+)
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = "scheduler.toml"
+DEFAULT_QUEUE = Path("output") / "crawl_queue.sqlite"
+
+# SQLite's julianday() reads this format; it also sorts chronologically
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+NEVER = "1970-01-01 00:00:00"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_tasks (
+    marketplace TEXT NOT NULL,
+    category TEXT NOT NULL,
+    subcategory TEXT NOT NULL,
+    web_url TEXT NOT NULL,
+    url TEXT NOT NULL,
+    host TEXT NOT NULL,
+    importance REAL NOT NULL,
+    refresh_hours REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_crawled_at TEXT,
+    started_at TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    retry_after TEXT,
+    last_error TEXT,
+    PRIMARY KEY (marketplace, category, subcategory)
+)
+"""
+
+# Hours since the last crawl (since 1970 if never) times importance
+PRIORITY = (
+    "(julianday(:now) - julianday(COALESCE(last_crawled_at, :never))) * 24"
+    " * importance"
+)
+
+
+@dataclass
+class HostLimits:
+    crawls_per_minute: float = 2.0
+    burst: int = 2
+    concurrency: int = 2
+
+
+@dataclass
+class SchedulerConfig:
+    refresh_hours: float = 24.0
+    importance: float = 1.0
+    retry_minutes: float = 15.0
+    max_retry_minutes: float = 720.0
+    host_defaults: HostLimits = field(default_factory=HostLimits)
+    hosts: Dict[str, HostLimits] = field(default_factory=dict)
+    # Importance by "<category>" or "<category>/<subcategory>"
+    weights: Dict[str, float] = field(default_factory=dict)
+    marketplace_weights: Dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "SchedulerConfig":
+        defaults = config.get("defaults", {})
+        host_defaults = HostLimits(**config.get("host_defaults", {}))
+        hosts = {
+            host.lower(): HostLimits(**limits)
+            for host, limits in config.get("hosts", {}).items()
+        }
+        for host, limits in [("host_defaults", host_defaults), *hosts.items()]:
+            if limits.crawls_per_minute <= 0 or limits.burst < 1:
+                raise ValueError(f"{host}: rate and burst must be positive.")
+            if limits.concurrency < 1:
+                raise ValueError(f"{host}: concurrency must be at least 1.")
+        return cls(
+            refresh_hours=defaults.get("refresh_hours", cls.refresh_hours),
+            importance=defaults.get("importance", cls.importance),
+            retry_minutes=defaults.get("retry_minutes", cls.retry_minutes),
+            max_retry_minutes=defaults.get("max_retry_minutes", cls.max_retry_minutes),
+            host_defaults=host_defaults,
+            hosts=hosts,
+            weights=dict(config.get("importance", {})),
+            marketplace_weights=dict(config.get("marketplaces", {})),
+        )
+
+    def limits(self, host: str) -> HostLimits:
+        return self.hosts.get(host, self.host_defaults)
+
+    def importance_of(self, marketplace: str, category: str, subcategory: str) -> float:
+        weight = self.weights.get(
+            category_label(category, subcategory),
+            self.weights.get(category, self.importance),
+        )
+        return weight * self.marketplace_weights.get(marketplace, 1.0)
+
+    # Minutes to wait after the given number of failed attempts
+    def retry_delay(self, attempts: int) -> float:
+        return min(
+            self.retry_minutes * 2 ** max(attempts - 1, 0), self.max_retry_minutes
+        )
+
+
+# Scheduler settings from `scheduler.toml` in the working directory, falling
+# back to the copy shipped next to this module
+def load_scheduler_config(path: Optional[Path] = None) -> SchedulerConfig:
+    config_path = Path(path or CONFIG_FILE)
+    if path is None and not config_path.is_file():
+        config_path = Path(__file__).resolve().parent / CONFIG_FILE
+    with open(config_path, "rb") as f:
+        config = SchedulerConfig.from_config(tomllib.load(f))
+    logger.debug("Scheduler settings loaded from %s.", config_path)
+    return config
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate_per_s: float,
+        capacity: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate_per_s
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    # Seconds until the next token is available
+    def wait_time(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+@dataclass
+class CrawlTask:
+    marketplace: str
+    category: str
+    subcategory: str
+    web_url: str
+    url: str
+    host: str
+    importance: float
+    status: str = "pending"
+    last_crawled_at: Optional[str] = None
+    attempts: int = 0
+    priority: float = 0.0
+
+    @property
+    def label(self) -> str:
+        return f"{self.marketplace}:{category_label(self.category, self.subcategory)}"
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def format_time(moment: datetime) -> str:
+    return moment.strftime(TIME_FORMAT)
+
+
+# (marketplace, base URL, category, subcategory, search URL) for every search
+# of the given (or every) marketplace in `search_query_list`
+def all_search_queries(
+    marketplaces: Optional[Iterable[str]] = None,
+) -> List[Tuple[str, str, str, str, str]]:
+    known = search_query_list["marketplace"]
+    queries = []
+    for marketplace in marketplaces or known:
+        if marketplace not in known:
+            raise ValueError(f"Unknown marketplace: {marketplace}")
+        web_url = known[marketplace]["url"]
+        for (category, subcategory), url in build_search_query(marketplace).items():
+            queries.append((marketplace, web_url, category, subcategory, url))
+    return queries
+
+
+class CrawlQueue:
+    def __init__(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # Add new searches, refresh the URL and importance of known ones, drop
+    # searches no longer defined for the synced marketplaces, and release
+    # tasks left running by a scheduler that died
+    def sync(self, queries: Iterable[tuple], config: SchedulerConfig) -> int:
+        queries = list(queries)
+        with self.conn:
+            self.conn.execute(
+                "UPDATE crawl_tasks SET status = 'pending' WHERE status = 'running'"
+            )
+            for marketplace, web_url, category, subcategory, url in queries:
+                self.conn.execute(
+                    "INSERT INTO crawl_tasks (marketplace, category, subcategory,"
+                    " web_url, url, host, importance, refresh_hours)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (marketplace, category, subcategory) DO UPDATE SET"
+                    " web_url = excluded.web_url, url = excluded.url,"
+                    " host = excluded.host, importance = excluded.importance,"
+                    " refresh_hours = excluded.refresh_hours",
+                    (
+                        marketplace,
+                        category,
+                        subcategory,
+                        web_url,
+                        url,
+                        (urlsplit(url).hostname or "").lower(),
+                        config.importance_of(marketplace, category, subcategory),
+                        config.refresh_hours,
+                    ),
+                )
+            synced = {q[0] for q in queries}
+            wanted = {(q[0], q[2], q[3]) for q in queries}
+            for row in self.conn.execute(
+                "SELECT marketplace, category, subcategory FROM crawl_tasks"
+            ).fetchall():
+                key = tuple(row)
+                if key[0] in synced and key not in wanted:
+                    self.conn.execute(
+                        "DELETE FROM crawl_tasks WHERE marketplace = ?"
+                        " AND category = ? AND subcategory = ?",
+                        key,
+                    )
+        return len(queries)
+
+    def _select(self, where: str, now: datetime) -> List[CrawlTask]:
+        rows = self.conn.execute(
+            "SELECT marketplace, category, subcategory, web_url, url, host,"
+            f" importance, status, last_crawled_at, attempts, {PRIORITY} AS priority"
+            f" FROM crawl_tasks {where}"
+            " ORDER BY priority DESC, marketplace, category, subcategory",
+            {"now": format_time(now), "never": NEVER},
+        ).fetchall()
+        return [CrawlTask(**dict(row)) for row in rows]
+
+    # Tasks not running, past their refresh interval and retry delay, highest
+    # priority first
+    def due(self, now: datetime) -> List[CrawlTask]:
+        return self._select(
+            "WHERE status != 'running'"
+            " AND (last_crawled_at IS NULL OR"
+            " julianday(:now) - julianday(last_crawled_at) >= refresh_hours / 24.0)"
+            " AND (retry_after IS NULL OR retry_after <= :now)",
+            now,
+        )
+
+    def tasks(self, now: datetime) -> List[CrawlTask]:
+        return self._select("", now)
+
+    def _update(self, task: CrawlTask, assignments: str, *values) -> None:
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE crawl_tasks SET {assignments} WHERE marketplace = ?"
+                " AND category = ? AND subcategory = ?",
+                (*values, task.marketplace, task.category, task.subcategory),
+            )
+
+    def mark_started(self, task: CrawlTask, now: datetime) -> None:
+        self._update(task, "status = 'running', started_at = ?", format_time(now))
+
+    def mark_done(self, task: CrawlTask, now: datetime) -> None:
+        self._update(
+            task,
+            "status = 'done', last_crawled_at = ?, attempts = 0,"
+            " retry_after = NULL, last_error = NULL",
+            format_time(now),
+        )
+
+    def mark_failed(
+        self, task: CrawlTask, now: datetime, error: str, config: SchedulerConfig
+    ) -> None:
+        attempts = task.attempts + 1
+        retry_after = now + timedelta(minutes=config.retry_delay(attempts))
+        self._update(
+            task,
+            "status = 'failed', attempts = ?, retry_after = ?, last_error = ?",
+            attempts,
+            format_time(retry_after),
+            error,
+        )
+
+
+class CrawlScheduler:
+    def __init__(
+        self,
+        queue: CrawlQueue,
+        config: SchedulerConfig,
+        workers: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.queue = queue
+        self.config = config
+        self.workers = workers
+        self.clock = clock
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.running: Counter = Counter()
+
+    def bucket(self, host: str) -> TokenBucket:
+        if host not in self.buckets:
+            limits = self.config.limits(host)
+            self.buckets[host] = TokenBucket(
+                limits.crawls_per_minute / 60, limits.burst, self.clock
+            )
+        return self.buckets[host]
+
+    # The most urgent due task whose host has a free slot and a token; when
+    # only tokens are missing, also the seconds until the first one refills
+    def next_task(self) -> Tuple[Optional[CrawlTask], Optional[float]]:
+        token_wait = None
+        for task in self.queue.due(utc_now()):
+            if self.running[task.host] >= self.config.limits(task.host).concurrency:
+                continue
+            bucket = self.bucket(task.host)
+            if bucket.try_take():
+                return task, None
+            host_wait = bucket.wait_time()
+            token_wait = host_wait if token_wait is None else min(token_wait, host_wait)
+        return None, token_wait
+
+    def _finish(self, task: CrawlTask, future: Future) -> Optional[str]:
+        self.running[task.host] -= 1
+        try:
+            snapshot, error = future.result()
+            METRICS.merge(snapshot)
+        except Exception as exc:
+            METRICS.increment(
+                "extract",
+                "errors",
+                category=category_label(task.category, task.subcategory),
+            )
+            error = str(exc)
+        if error is None:
+            self.queue.mark_done(task, utc_now())
+            logger.info("Crawl of %s finished.", task.label)
+        else:
+            self.queue.mark_failed(task, utc_now(), error, self.config)
+            logger.error("Crawl of %s failed: %s", task.label, error)
+        return error
+
+    # Start due tasks as workers, host slots and tokens allow until none is
+    # due or `max_tasks` have started; `submit` runs one task and returns its
+    # future of (metrics snapshot, error). Returns the tasks that failed.
+    def run(
+        self,
+        submit: Callable[[CrawlTask], Future],
+        max_tasks: Optional[int] = None,
+    ) -> List[CrawlTask]:
+        futures: Dict[Future, CrawlTask] = {}
+        failed = []
+        started = 0
+        while True:
+            token_wait = None
+            while len(futures) < self.workers and (
+                max_tasks is None or started < max_tasks
+            ):
+                task, token_wait = self.next_task()
+                if task is None:
+                    break
+                self.queue.mark_started(task, utc_now())
+                self.running[task.host] += 1
+                futures[submit(task)] = task
+                started += 1
+                logger.info(
+                    "Started %s (priority %.1f, %d running).",
+                    task.label,
+                    task.priority,
+                    len(futures),
+                )
+
+            if not futures:
+                if token_wait is None:
+                    break
+                # Every due task is waiting for its host's rate limit
+                with METRICS.timer("extract", "rate_limit_wait", category="scheduler"):
+                    time.sleep(token_wait)
+                continue
+
+            done, _ = wait(futures, timeout=token_wait, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = futures.pop(future)
+                if self._finish(task, future) is not None:
+                    failed.append(task)
+
+        logger.info(
+            "Scheduler finished: %d crawl(s) started, %d failed.", started, len(failed)
+        )
+        return failed
+
+
+def print_queue(queue: CrawlQueue) -> None:
+    now = utc_now()
+    due = {task.label for task in queue.due(now)}
+    for task in queue.tasks(now):
+        print(
+            f"{'due' if task.label in due else '-':>4}  {task.priority:>12.1f}  "
+            f"{task.status:<8} {task.last_crawled_at or 'never':<20} "
+            f"{task.host:<20} {task.label}"
+        )
+
+
+def cli_arguments():
+    parser = ArgumentParser(
+        description="Crawl the searches of every marketplace, stalest and most important first."
+    )
+    parser.add_argument(
+        "--marketplaces",
+        nargs="+",
+        default=None,
+        help="Marketplaces to schedule (default: every one in search_query_list).",
+    )
+    parser.add_argument(
+        "--queue",
+        default=str(DEFAULT_QUEUE),
+        help="SQLite file holding the crawl queue and when each search was last crawled.",
+    )
+    parser.add_argument(
+        "--config",
+        default=None,
+        help=f"Scheduler settings (default: {CONFIG_FILE} in the working directory, else next to this script).",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="Worker processes crawling at once, across all hosts.",
+    )
+    parser.add_argument(
+        "--max_tasks",
+        type=int,
+        default=None,
+        help="Stop starting crawls after this many in one run.",
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Sync the queue and print it in priority order without crawling.",
+    )
+    add_crawl_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+
+def schedule_from_args(call_args) -> None:
+    try:
+        config = load_scheduler_config(call_args.config)
+        queries = all_search_queries(call_args.marketplaces)
+    except (OSError, ValueError, TypeError) as exc:
+        logger.error("Cannot build the crawl schedule: %s", exc)
+        exit(1)
+    wait_settings, pagination, cache_settings = crawl_settings_from_args(call_args)
+    if cache_settings.replay and not cache_settings.cache_dir:
+        logger.error("--replay requires --cache_dir.")
+        exit(1)
+
+    queue = CrawlQueue(call_args.queue)
+    try:
+        logger.info("%d search(es) in the crawl queue.", queue.sync(queries, config))
+        if call_args.dry_run:
+            print_queue(queue)
+            return
+
+        with ProcessPoolExecutor(max_workers=call_args.workers) as executor:
+
+            def submit(task: CrawlTask) -> Future:
+                return executor.submit(
+                    scrape_in_worker,
+                    task.marketplace,
+                    task.web_url,
+                    task.url,
+                    task.category,
+                    task.subcategory,
+                    wait_settings,
+                    pagination,
+                    cache_settings,
+                    not call_args.fresh,
+                )
+
+            scheduler = CrawlScheduler(queue, config, call_args.workers)
+            failed = scheduler.run(submit, call_args.max_tasks)
+    finally:
+        queue.close()
+
+    if failed:
+        logger.error(
+            "%d crawl(s) failed and will be retried: %s",
+            len(failed),
+            [task.label for task in failed],
+        )
+        exit(1)
+
+
+def main() -> None:
+    call_args = cli_arguments()
+    with metrics_session("extract", call_args):
+        schedule_from_args(call_args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Readiness-driven waits and per-page timing for the listing crawl.
+
+`wait_for_results()` waits for the search result container instead of
+sleeping for a fixed time. If the container does not show up within the
+current timeout the page is reloaded and the timeout grows by `backoff`,
+until `max_timeout` seconds have been spent in total.
+
+Every wait, page load and parse is recorded in a `RunSummary`, which is
+written next to the extracted data so latency can be tuned from real runs,
+and added to the run metrics (see common/metrics.py).
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RESULTS_SELECTOR = "span.rush-component.s-latency-cf-section"
+
+
+@dataclass
+class WaitSettings:
+    results_selector: str = RESULTS_SELECTOR
+    initial_timeout: float = 5.0
+    max_timeout: float = 60.0
+    backoff: float = 2.0
+    politeness_delay: float = 1.0
+
+
+@dataclass
+class PageTiming:
+    page_num: int
+    url: str
+    load_s: float = 0.0
+    wait_s: float = 0.0
+    parse_s: float = 0.0
+    products: int = 0
+    bytes: int = 0
+    cached: bool = False
+    requests: int = 0
+    blocked_requests: int = 0
+
+    # Requests the page made while it loaded (see common/request_filter.py)
+    def record_requests(self, counts) -> None:
+        self.requests += counts.allowed + counts.blocked
+        self.blocked_requests += counts.blocked
+
+
+@dataclass
+class WaitRecord:
+    label: str
+    page_num: int
+    seconds: float
+    attempts: int = 1
+    ready: bool = True
+
+
+@dataclass
+class RunSummary:
+    pages: List[PageTiming] = field(default_factory=list)
+    waits: List[WaitRecord] = field(default_factory=list)
+    started_at: float = field(default_factory=time.time)
+
+    def page(self, page_num: int, url: str) -> PageTiming:
+        timing = PageTiming(page_num=page_num, url=url)
+        self.pages.append(timing)
+        return timing
+
+    def record_wait(
+        self,
+        label: str,
+        page_num: int,
+        seconds: float,
+        attempts: int = 1,
+        ready: bool = True,
+    ) -> None:
+        self.waits.append(WaitRecord(label, page_num, seconds, attempts, ready))
+
+    # Time a block and add the elapsed seconds to `timing.<attr>`
+    @contextmanager
+    def timed(self, timing: PageTiming, attr: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            setattr(timing, attr, getattr(timing, attr) + time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        totals = {
+            key: round(sum(getattr(p, key) for p in self.pages), 3)
+            for key in ("load_s", "wait_s", "parse_s")
+        }
+        waits_by_label = {}
+        for wait in self.waits:
+            waits_by_label[wait.label] = round(
+                waits_by_label.get(wait.label, 0.0) + wait.seconds, 3
+            )
+        return {
+            "pages_visited": len(self.pages),
+            "products": sum(p.products for p in self.pages),
+            "elapsed_s": round(time.time() - self.started_at, 3),
+            "totals": totals,
+            "wait_totals": waits_by_label,
+            "pages": [asdict(p) for p in self.pages],
+            "waits": [asdict(w) for w in self.waits],
+        }
+
+    # Add this crawl's pages, bytes, products and per-page timings to `metrics`;
+    # pages that could not be fetched only add their load and wait times
+    def record_metrics(self, metrics, category: Optional[str] = None) -> None:
+        for timing in self.pages:
+            if not timing.cached:
+                metrics.observe("extract", "load", timing.load_s, category)
+                metrics.observe("extract", "wait", timing.wait_s, category)
+            if not (timing.cached or timing.bytes):
+                continue
+            pages = "cached_pages" if timing.cached else "pages"
+            metrics.increment("extract", pages, category=category)
+            metrics.increment("extract", "bytes", timing.bytes, category)
+            metrics.increment("extract", "records", timing.products, category)
+            metrics.observe("extract", "parse", timing.parse_s, category)
+
+    def write(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=3)
+        logger.info("Run summary saved to: %s", path)
+
+
+# Wait for the result container, reloading with a growing timeout on misses
+def wait_for_results(
+    page,
+    settings: WaitSettings,
+    summary: Optional[RunSummary] = None,
+    page_num: int = 0,
+) -> bool:
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    start = time.perf_counter()
+    timeout = settings.initial_timeout
+    attempts = 0
+    ready = False
+
+    while True:
+        attempts += 1
+        try:
+            page.wait_for_selector(
+                settings.results_selector, state="attached", timeout=timeout * 1000
+            )
+            ready = True
+            break
+        except PlaywrightTimeoutError:
+            remaining = settings.max_timeout - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            timeout = min(timeout * settings.backoff, remaining)
+            logger.info(
+                "Results not ready after attempt %d, reloading (next wait %.1fs).",
+                attempts,
+                timeout,
+            )
+            page.reload(wait_until="domcontentloaded", timeout=100_000)
+
+    elapsed = time.perf_counter() - start
+    if summary is not None:
+        summary.record_wait("results", page_num, elapsed, attempts, ready)
+    if not ready:
+        logger.warning("Result container not found after %.1fs.", elapsed)
+    return ready
+
+
+# Politeness delay between page navigations, recorded like any other wait
+def polite_pause(
+    settings: WaitSettings, summary: Optional[RunSummary] = None, page_num: int = 0
+) -> None:
+    if settings.politeness_delay <= 0:
+        return
+    time.sleep(settings.politeness_delay)
+    if summary is not None:
+        summary.record_wait("politeness", page_num, settings.politeness_delay)
@@ -1,13 +1,110 @@
+import io
+import math
 import os
 import re
+import sys
+import time
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from dataclasses import dataclass, fields, is_dataclass
-from datetime import datetime
+from datetime import date, datetime
+from itertools import islice
 from pathlib import Path
-from typing import Any, List, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
 import pandas as pd
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+# Make project packages importable when run as `python load/run_data_loader.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.manifest import Manifest  # noqa: E402
+from common.metrics import METRICS  # noqa: E402
+
+# Connection errors worth retrying: dropped connections, server restarts,
+# serialization failures and deadlocks
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# Run timestamp at the end of final CSV names written by the file loader
+CSV_TIMESTAMP = re.compile(r"_(\d{8}_\d{6})\.csv$")
+
+
+# Thread-safe pool of PostgreSQL connections shared by every load in a process
+class ConnectionManager:
+    def __init__(
+        self,
+        minconn: int = 1,
+        maxconn: int = 4,
+        retries: int = 3,
+        backoff: float = 1.0,
+        **connect_kwargs,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        # The pool connects right away, possibly while the server is still
+        # starting (e.g. in the same Helm release), so it is retried too
+        self._pool = self._with_retries(
+            lambda: ThreadedConnectionPool(minconn, maxconn, **connect_kwargs)
+        )
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "ConnectionManager":
+        return cls(
+            host=os.getenv("DB_HOST"),
+            port=os.getenv("DB_PORT"),
+            dbname=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            **kwargs,
+        )
+
+    # Borrow a connection; broken connections are closed instead of reused
+    @contextmanager
+    def connection(self):
+        conn = self._pool.getconn()
+        broken = False
+        try:
+            yield conn
+        except TRANSIENT_ERRORS:
+            broken = True
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn, close=broken or bool(conn.closed))
+
+    # Call `attempt()`, retrying after transient errors with exponential backoff
+    def _with_retries(self, attempt: Callable[[], Any]) -> Any:
+        for number in range(self.retries + 1):
+            try:
+                return attempt()
+            except TRANSIENT_ERRORS as error:
+                if number == self.retries:
+                    raise
+                delay = self.backoff * 2**number
+                METRICS.increment("load", "db_retries")
+                print(f"Transient database error ({error}); retrying in {delay}s ...")
+                time.sleep(delay)
+
+    # Run `work(conn, cursor)`, retrying on a fresh connection after transient
+    # errors
+    def run(self, work: Callable[[Any, Any], Any]) -> Any:
+        def attempt() -> Any:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    return work(conn, cursor)
+
+        return self._with_retries(attempt)
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+
+# Date formats accepted for `date_collected`, tried in order
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d")
 
 
 # Dataclass Definitio
@@ -39,7 +136,7 @@ class DataLoader(DataFields):
         if isinstance(val, datetime):
             return val.date()
         if isinstance(val, str):
-            for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d"):
+            for fmt in DATE_FORMATS:
                 try:
                     return datetime.strptime(val, fmt).date()
                 except ValueError:
@@ -55,6 +152,46 @@ class DataLoader(DataFields):
         kwargs["date_collected"] = DataLoader._parse_date(row.get("date_collected"))
         return DataLoader(**kwargs)
 
+    @staticmethod
+    def _parse_date_column(column: pd.Series) -> pd.Series:
+        # Column-wise `_parse_date`: one vectorized pass per format, keeping the
+        # first format that matches each value
+        if pd.api.types.is_datetime64_any_dtype(column):
+            parsed = column
+        else:
+            parsed = pd.Series(pd.NaT, index=column.index, dtype="datetime64[ns]")
+            for fmt in DATE_FORMATS:
+                parsed = parsed.fillna(
+                    pd.to_datetime(column, format=fmt, errors="coerce")
+                )
+        return parsed.dt.date.astype(object).where(parsed.notna(), None)
+
+    @classmethod
+    def frame_to_rows(cls, df: pd.DataFrame) -> Iterator[Tuple]:
+        # Convert a whole DataFrame column by column, with the dataclass fields
+        # deciding each column's type, and yield plain tuples in field order.
+        # Same values as `to_tuple(from_series(row))` without per-row objects.
+        columns = {}
+        for f in fields(cls):
+            if f.type is datetime:
+                columns[f.name] = (
+                    cls._parse_date_column(df[f.name])
+                    if f.name in df
+                    else pd.Series(None, index=df.index, dtype=object)
+                )
+            elif f.name not in df:
+                columns[f.name] = pd.Series(
+                    "" if f.type == str else 0.0, index=df.index, dtype=object
+                )
+            elif f.type is float:
+                columns[f.name] = pd.to_numeric(df[f.name], errors="coerce").astype(
+                    "float64"
+                )
+            else:
+                values = df[f.name].astype(object)
+                columns[f.name] = values.where(values.isna(), values.astype(str))
+        return pd.DataFrame(columns, index=df.index).itertuples(index=False, name=None)
+
     @classmethod
     def get_field_names(cls) -> List[str]:
         return [f.name for f in fields(cls)]
@@ -86,7 +223,12 @@ class DataLoader(DataFields):
 
     @classmethod
     def create_table_and_insert(
-        cls, table_name: str, conn, cur, data: Union["DataLoader", List["DataLoader"]]
+        cls,
+        table_name: str,
+        conn,
+        cur,
+        data: Union["DataLoader", List["DataLoader"]],
+        batch_size: int = 50_000,
     ):
         cur.execute(
             f"CREATE TABLE IF NOT EXISTS {table_name} (\n    {cls.get_sql_schema()}\n);"
@@ -106,48 +248,323 @@ class DataLoader(DataFields):
             VALUES ({placeholders})
             ON CONFLICT (product_detail_url) DO NOTHING;
         """
-        cur.executemany(insert_query, data)
-        conn.commit()
+        for start in range(0, len(data), batch_size):
+            end = start + batch_size
+            cur.executemany(insert_query, data[start:end])
+            conn.commit()
         print(f"Inserted {len(data)} record(s) into '{table_name}' table.")
 
+    @staticmethod
+    def _copy_value(value) -> str:
+        # COPY text format: \N for NULL, backslash-escape separators. Other
+        # values are rendered as psycopg2 would adapt them, so both load
+        # methods store the same data: float NaN and infinities are spelled
+        # 'NaN' and '[-]Infinity', not Python's 'nan' and 'inf'.
+        if value is None:
+            return r"\N"
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, float) and not math.isfinite(value):
+            if math.isnan(value):
+                return "NaN"
+            return "Infinity" if value > 0 else "-Infinity"
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
 
-def run_loader_db(args_parser: ArgumentParser) -> None:
-    # Load runtime args/parameters
-    DB_HOST = os.getenv("DB_HOST")
-    DB_NAME = os.getenv("DB_NAME")
-    DB_USER = os.getenv("DB_USER")
-    DB_PASSWORD = os.getenv("DB_PASSWORD")
-    DB_PORT = os.getenv("DB_PORT")
-
-    connector = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-    )
+    @classmethod
+    def _copy_buffer(cls, rows: List[Tuple]) -> io.StringIO:
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(cls._copy_value(v) for v in row) + "\n")
+        buffer.seek(0)
+        return buffer
 
-    # Load CSV & Insert Data
-    # Extract and sort timestamps from CSV filenames
-    path = Path(args_parser.path)
-    timestamps = sorted(
-        [
-            "_".join(re.findall(r"\d+", f.name))
-            for f in path.glob("*.csv")
-            if re.search(r"\d+", f.name)
-        ],
-        reverse=True,
-    )
-    # Get latest file based on timestamp
-    latest_file = next(f for f in path.glob("*.csv") if timestamps[0] in f.name)
-    # print(latest_file)
-    df = pd.read_csv(latest_file)
+    @classmethod
+    def _copy_through_staging(
+        cls,
+        table_name: str,
+        conn,
+        cur,
+        data: Iterable[Union["DataLoader", Tuple]],
+        batch_size: int,
+        merge: Callable[[str], None],
+    ) -> int:
+        # Stream rows with COPY into an unconstrained staging table, calling
+        # `merge(staging)` after every batch to move it into the target and
+        # committing each batch on its own
+        columns = ", ".join(cls.get_field_names())
+        staging = f"{table_name}_staging"
+        cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS AS "
+            f"SELECT {columns} FROM {table_name} WITH NO DATA;"
+        )
 
-    processed_data = [DataLoader.from_series(row) for _, row in df.iterrows()]
+        rows = (cls.to_tuple(d) if isinstance(d, cls) else d for d in data)
+        loaded = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            cur.copy_expert(
+                f"COPY {staging} ({columns}) FROM STDIN", cls._copy_buffer(batch)
+            )
+            merge(staging)
+            conn.commit()
+            loaded += len(batch)
+        conn.commit()
+        return loaded
+
+    @classmethod
+    def create_table_and_copy(
+        cls,
+        table_name: str,
+        conn,
+        cur,
+        data: Iterable[Union["DataLoader", Tuple]],
+        batch_size: int = 50_000,
+    ) -> int:
+        # Merge each copied batch with one INSERT ... SELECT
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} (\n    {cls.get_sql_schema()}\n);"
+        )
+        columns = ", ".join(cls.get_field_names())
+        inserted = 0
+
+        def merge(staging: str) -> None:
+            nonlocal inserted
+            cur.execute(f"""
+                INSERT INTO {table_name} ({columns})
+                SELECT {columns} FROM {staging}
+                ON CONFLICT (product_detail_url) DO NOTHING;
+                """)
+            inserted += cur.rowcount
+
+        loaded = cls._copy_through_staging(
+            table_name, conn, cur, data, batch_size, merge
+        )
+        print(
+            f"Copied {loaded} record(s) into '{table_name}' table "
+            f"({inserted} new, {loaded - inserted} already present)."
+        )
+        return inserted
+
+    @classmethod
+    def get_history_schema(cls) -> str:
+        return """
+            product_detail_url TEXT NOT NULL,
+            date_collected TIMESTAMP NOT NULL,
+            price NUMERIC(10, 2),
+            currency TEXT,
+            review_score NUMERIC(10, 2),
+            total_reviews NUMERIC(10, 2),
+            content_hash TEXT NOT NULL,
+            PRIMARY KEY (product_detail_url, date_collected)
+        """
+
+    @classmethod
+    def create_table_and_upsert(
+        cls,
+        table_name: str,
+        conn,
+        cur,
+        data: Iterable[Union["DataLoader", Tuple]],
+        batch_size: int = 50_000,
+    ) -> Dict[str, int]:
+        # Insert new products and update only those whose content hash changed,
+        # appending their price/review values to `<table>_history` first. Rows
+        # without a product_detail_url would never conflict, and be inserted
+        # again on every run, so they are skipped and counted. A missing CSV
+        # value reaches the staging table as NULL, '' or the text 'NaN'.
+        history_table = f"{table_name}_history"
+        has_url = "COALESCE(product_detail_url, '') NOT IN ('', 'NaN')"
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} (\n    {cls.get_sql_schema()}\n);"
+        )
+        cur.execute(
+            f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS content_hash TEXT;"
+        )
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {history_table} ({cls.get_history_schema()});"
+        )
+
+        names = cls.get_field_names()
+        columns = ", ".join(names)
+        # The collection date changes every run without the product changing
+        hashed = ", ".join(n for n in names if n != "date_collected")
+        updates = ", ".join(f"{n} = EXCLUDED.{n}" for n in names + ["content_hash"])
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+
+        def merge(staging: str) -> None:
+            cur.execute(f"""
+                WITH src AS (
+                    SELECT DISTINCT ON (product_detail_url)
+                        {columns}, md5(ROW({hashed})::text) AS content_hash
+                    FROM {staging}
+                    WHERE {has_url}
+                    ORDER BY product_detail_url, date_collected DESC NULLS LAST
+                ),
+                changed AS (
+                    SELECT src.*
+                    FROM src
+                    LEFT JOIN {table_name} AS t USING (product_detail_url)
+                    WHERE t.content_hash IS DISTINCT FROM src.content_hash
+                ),
+                history AS (
+                    INSERT INTO {history_table} (
+                        product_detail_url, date_collected, price, currency,
+                        review_score, total_reviews, content_hash
+                    )
+                    SELECT
+                        product_detail_url, date_collected, price, currency,
+                        review_score, total_reviews, content_hash
+                    FROM changed
+                    WHERE date_collected IS NOT NULL
+                    ON CONFLICT (product_detail_url, date_collected) DO UPDATE SET
+                        price = EXCLUDED.price,
+                        currency = EXCLUDED.currency,
+                        review_score = EXCLUDED.review_score,
+                        total_reviews = EXCLUDED.total_reviews,
+                        content_hash = EXCLUDED.content_hash
+                )
+                INSERT INTO {table_name} ({columns}, content_hash)
+                SELECT {columns}, content_hash FROM changed
+                ON CONFLICT (product_detail_url) DO UPDATE SET {updates}
+                RETURNING (xmax = 0) AS inserted;
+                """)
+            results = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                f"SELECT count(DISTINCT product_detail_url) FILTER (WHERE {has_url}),"
+                f" count(*) FILTER (WHERE NOT {has_url}) FROM {staging};"
+            )
+            distinct, skipped = cur.fetchone()
+            counts["inserted"] += sum(results)
+            counts["updated"] += len(results) - sum(results)
+            counts["unchanged"] += distinct - len(results)
+            counts["skipped"] += skipped
+
+        loaded = cls._copy_through_staging(
+            table_name, conn, cur, data, batch_size, merge
+        )
+        print(
+            f"Upserted {loaded} record(s) into '{table_name}' table: "
+            f"{counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, "
+            f"{counts['skipped']} skipped without a product_detail_url."
+        )
+        if counts["skipped"]:
+            METRICS.increment("load", "skipped_rows", counts["skipped"], table_name)
+        return counts
+
+
+# Pick the most recent final CSV in a category output directory
+def latest_csv(path: Path) -> Path:
+    # The file loader registers every CSV it writes in the directory manifest
+    registered = Manifest.load(path).latest("load")
+    if registered is not None:
+        return registered
+
+    # Directories written before manifests existed: newest
+    # final_<base>_<ddmmYYYY_HHMMSS>.csv, ignoring any other CSV
+    stamped = {}
+    for f in path.glob("final_*.csv"):
+        match = CSV_TIMESTAMP.search(f.name)
+        if match:
+            stamped[f] = datetime.strptime(match.group(1), "%d%m%Y_%H%M%S")
+    if not stamped:
+        raise FileNotFoundError(f"No final CSV file found in '{path}'.")
+    return max(stamped, key=stamped.get)
+
+
+# Load a DataFrame into `schema_table` through a pooled connection; rows and
+# time are recorded in the run metrics under the table name
+def load_frame(
+    manager: ConnectionManager,
+    schema_table: str,
+    df: pd.DataFrame,
+    load_method: str = "copy",
+    batch_size: int = 50_000,
+) -> None:
+    def load(conn, cursor) -> None:
+        # Rows are rebuilt on every attempt; all methods are idempotent
+        processed_data = DataLoader.frame_to_rows(df)
+        if load_method == "insert":
+            DataLoader.create_table_and_insert(
+                schema_table, conn, cursor, list(processed_data), batch_size
+            )
+        elif load_method == "upsert":
+            DataLoader.create_table_and_upsert(
+                schema_table, conn, cursor, processed_data, batch_size
+            )
+        else:
+            DataLoader.create_table_and_copy(
+                schema_table, conn, cursor, processed_data, batch_size
+            )
+
+    with METRICS.timer("load", "db_load", schema_table):
+        manager.run(load)
+    METRICS.increment("load", "rows", len(df), schema_table)
+
+
+# Load the latest CSV of one category directory through a pooled connection
+def load_category(
+    manager: ConnectionManager, path: Path, load_method: str, batch_size: int
+) -> None:
     extract_run_name = path.as_posix().rsplit("/", maxsplit=1)[-1]
     schema_table = "_".join(extract_run_name.split("-"))
+    try:
+        with METRICS.timer("load", "run", schema_table):
+            df = pd.read_csv(latest_csv(path))
+            load_frame(manager, schema_table, df, load_method, batch_size)
+    except Exception:
+        METRICS.increment("load", "errors", category=schema_table)
+        raise
+
+
+# Load every given category directory, sharing one connection pool
+def load_many_categories(
+    manager: ConnectionManager,
+    paths: List[Path],
+    load_method: str = "copy",
+    batch_size: int = 50_000,
+    workers: int = 1,
+) -> List[Path]:
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(load_category, manager, path, load_method, batch_size): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as error:
+                print(f"Load failed for '{futures[future]}': {error}")
+                failed.append(futures[future])
+    return failed
 
-    with connector.cursor() as cursor:
-        DataLoader.create_table_and_insert(
-            schema_table, connector, cursor, processed_data
+
+def run_loader_db(args_parser: ArgumentParser) -> None:
+    paths = [Path(path) for path in args_parser.path]
+    manager = ConnectionManager.from_env(
+        maxconn=max(1, args_parser.db_workers),
+        retries=args_parser.db_retries,
+    )
+    try:
+        failed = load_many_categories(
+            manager,
+            paths,
+            args_parser.load_method,
+            args_parser.batch_size,
+            args_parser.db_workers,
         )
+    finally:
+        manager.close()
+
+    if failed:
+        print(f"{len(failed)} of {len(paths)} load(s) failed.")
+        sys.exit(1)
@@ -1,9 +1,11 @@
 """
-ETL Data Export Script (Transform Output → CSV & Excel)
---------------------------------------------------------
+ETL Data Export Script (Transform Output → Parquet, CSV & Excel)
+-----------------------------------------------------------------
 
-This script performs the final step of the ETL process by reading the transformed
-JSON file, cleaning the data, and exporting it to both CSV and Excel formats.
+This script performs the final step of the ETL process by streaming the transformed
+JSON Lines file in chunks, cleaning the data, and exporting it chunk by chunk to a
+partitioned Parquet dataset and a CSV file. An Excel copy is generated on request,
+after the run, from the Parquet dataset.
 
 Usage:
     python transform/transform.py -m <marketplace> -c <category> -s <subcategory>
@@ -12,28 +14,42 @@ Arguments:
     -m, --marketplace   Name of the marketplace (e.g., 'amazonae')
     -c, --category      Product category (wrap in quotes if it contains spaces)
     -s, --subcategory   Product subcategory (wrap in quotes if it contains spaces)
+    --excel             Also export the run's rows to an Excel (.xlsx) file
 
 Outputs:
-    - Excel (.xlsx) file saved in the marketplace/category/subcategory directory
-    - CSV (.csv) file saved in the same directory
-    - A log file (logs/summary.log) with details of the current run
+    - Parquet files under output/dataset/marketplace=.../category=.../
+      subcategory=.../date_collected=.../
+    - CSV (.csv) file saved in the marketplace/category/subcategory directory
+    - Excel (.xlsx) file saved in the same directory, with --excel only
+    - A log file (logs/summary.log), appended to on every run
+    - A JSON metrics report under logs/metrics/ (see common/metrics.py)
 
 Notes:
-    - The script expects a JSON file (transform_<marketplace>_<category>_<subcategory>.json)
-      to be present in the appropriate output directory.
+    - The script expects a JSON Lines file (transform_<marketplace>_<category>_<subcategory>.jsonl,
+      or a legacy .json array) to be present in the appropriate output directory.
     - Log messages are printed to both the console and a file for traceability.
 """
 
-import json
 import logging
 import re
+import sys
 from argparse import ArgumentParser
+from collections import Counter
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
+from typing import Iterable, Iterator, List
 
 import pandas as pd
 import toml
 
+# Make project packages importable when run as `python load/run_data_loader.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.jsonl import find_records_file, iter_batches, iter_records  # noqa: E402
+from common.manifest import RetentionPolicy, register_artifact  # noqa: E402
+from common.metrics import METRICS, category_label  # noqa: E402
+
 # ───────────────────────────── Logging setup ──────────────────────────────
 log_dir = Path("logs")
 log_dir.mkdir(exist_ok=True)
@@ -45,28 +61,69 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler(log_file, mode="w", encoding="utf-8"),
+        logging.FileHandler(log_file, mode="a", encoding="utf-8"),
     ],
 )
 logger = logging.getLogger(__name__)
 
+# Records read, cleaned and written per chunk
+CHUNK_SIZE = 5000
+
+# Root of the partitioned Parquet dataset shared by all categories
+DATASET_DIR = Path("output") / "dataset"
+
 
 # ──────────────────────────────  Functions  ───────────────────────────────
 
 
-# Export the DataFrame to an Excel file
-def write_details_to_excel(df: pd.DataFrame, file_path: Path) -> None:
+# Open an Excel writer that streams rows to disk instead of keeping the sheet in memory
+def open_excel_writer(file_path: Path) -> pd.ExcelWriter:
     logger.info("Saving data to Excel file: %s", file_path.name)
-    with pd.ExcelWriter(file_path, engine="xlsxwriter") as writer:
-        df.to_excel(writer, index=False, sheet_name="Products")
-    logger.info("Excel file saved.")
+    return pd.ExcelWriter(
+        file_path,
+        engine="xlsxwriter",
+        engine_kwargs={"options": {"constant_memory": True}},
+    )
 
 
-# Export the DataFrame to a CSV file
-def write_details_to_csv(df: pd.DataFrame, file_path: Path) -> None:
-    logger.info("Saving data to CSV file: %s", file_path.name)
-    df.to_csv(file_path, index=False, encoding="utf-8")
-    logger.info("CSV file saved.")
+# Append a chunk to the open Excel sheet, after `start_row` rows already written
+def write_details_to_excel(
+    df: pd.DataFrame, writer: pd.ExcelWriter, start_row: int
+) -> None:
+    df.to_excel(
+        writer,
+        index=False,
+        sheet_name="Products",
+        startrow=start_row + 1 if start_row else 0,
+        header=not start_row,
+    )
+
+
+# Export the rows this run wrote to the Parquet dataset as an Excel sheet
+def export_excel_from_dataset(
+    dataset_dir: Path, file_path: Path, columns: list, filters: list
+) -> int:
+    from common.dataset import read_products
+
+    written = 0
+    with open_excel_writer(file_path) as writer:
+        df = read_products(dataset_dir, columns=columns, filters=filters)
+        for start in range(0, len(df), CHUNK_SIZE):
+            end = start + CHUNK_SIZE
+            write_details_to_excel(df.iloc[start:end], writer, written)
+            written += len(df.iloc[start:end])
+    return written
+
+
+# Append a chunk to the CSV file, writing the header with the first chunk
+def write_details_to_csv(df: pd.DataFrame, file_path: Path, start_row: int) -> None:
+    df.to_csv(
+        file_path,
+        index=False,
+        encoding="utf-8",
+        mode="a" if start_row else "w",
+        header=not start_row,
+    )
 
 
 # Make a string lowercase, remove special chars, and replace spaces with underscores
@@ -90,7 +147,98 @@ def validate_dataframe(df: pd.DataFrame, fields: list) -> pd.DataFrame:
     return df
 
 
-# Orchestrate loading JSON, cleaning data, and exporting to Excel/CSV
+# Drop rows whose `fields` values were already seen in an earlier chunk
+def drop_seen_duplicates(df: pd.DataFrame, fields: list, seen: set) -> pd.DataFrame:
+    hashes = pd.util.hash_pandas_object(df[fields], index=False)
+    keep = ~hashes.isin(seen)
+    seen.update(hashes[keep])
+    return df[keep.to_numpy()].reset_index(drop=True)
+
+
+# Priority fields from `load_config.toml` in the working directory, falling
+# back to the copy shipped next to this module
+def load_priority_fields() -> list:
+    config_path = Path("load_config.toml")
+    if not config_path.is_file():
+        config_path = Path(__file__).resolve().parent / "load_config.toml"
+    with open(config_path) as f:
+        return toml.load(f)["fields"]["priority"]
+
+
+# Turn record batches into validated DataFrames, deduplicated across chunks;
+# missing values per column (before cleaning) are added to `missing`
+def clean_chunks(
+    batches: Iterable[List[dict]], columns: list, priority: list, missing: Counter
+) -> Iterator[pd.DataFrame]:
+    seen = set()
+    for batch in batches:
+        # Columns no record of the chunk has (e.g. all detail fetches failed)
+        # come back empty and the rows are dropped by validation
+        df = pd.DataFrame(batch).reindex(columns=columns)
+        missing.update(df.isna().sum().to_dict())
+        df = validate_dataframe(df, priority)
+        df = drop_seen_duplicates(df, priority, seen)
+        METRICS.increment("load", "records", len(batch))
+        METRICS.increment("load", "rejected_rows", len(batch) - len(df))
+        yield df
+
+
+# Write cleaned chunks to the Parquet dataset and the final CSV, register the
+# CSV (and the optional Excel export) in the manifest, and yield the number of
+# rows written after each chunk
+def export_chunks(
+    chunks: Iterable[pd.DataFrame],
+    output_dir: Path,
+    base: str,
+    columns: list,
+    policy: RetentionPolicy,
+    excel: bool = False,
+) -> Iterator[int]:
+    # pyarrow is only needed once a dataset is written
+    from common.dataset import ParquetDatasetWriter
+
+    excel_file = f"final_{base}_{current_date}.xlsx"
+    csv_file = f"final_{base}_{current_date}.csv"
+    dataset_dir = Path.cwd() / DATASET_DIR
+    written = 0
+
+    logger.info("Saving cleaned data...")
+    with ParquetDatasetWriter(dataset_dir, columns, current_date) as parquet_writer:
+        for df in chunks:
+            with METRICS.timer("load", "write"):
+                parquet_writer.write(df)
+                write_details_to_csv(df, output_dir / csv_file, written)
+            METRICS.increment("load", "rows", len(df))
+            written += len(df)
+            yield written
+        partitions = len(parquet_writer.partitions)
+        filters = parquet_writer.filters
+    logger.info("Parquet dataset (%d partitions) and CSV file saved.", partitions)
+
+    # Older final files beyond the retention policy are deleted here
+    register_artifact("load", output_dir / csv_file, written, policy)
+
+    if excel and filters:
+        exported = export_excel_from_dataset(
+            dataset_dir, output_dir / excel_file, columns, filters
+        )
+        logger.info("Excel file saved with %d rows.", exported)
+        register_artifact("excel", output_dir / excel_file, exported, policy)
+
+
+def log_missing_summary(missing: Counter) -> None:
+    logger.info(
+        "Missing Value Summary:\n%s",
+        (
+            pd.Series(missing, dtype="int64")
+            .reset_index(name="Missing Count")
+            .rename(columns={"index": "Column"})
+            .to_string(index=False)
+        ),
+    )
+
+
+# Orchestrate streaming JSON Lines, cleaning data, and exporting to Parquet/CSV/Excel
 def run_loader(args: ArgumentParser) -> None:
     marketplace, category, subcategory = (
         args.marketplace,
@@ -99,9 +247,7 @@ def run_loader(args: ArgumentParser) -> None:
     )
 
     base = normalize_strings(f"{marketplace} {category} {subcategory}")
-    json_file = f"transform_{base}.json"
-    excel_file = f"final_{base}_{current_date}.xlsx"
-    csv_file = f"final_{base}_{current_date}.csv"
+    input_stem = f"transform_{base}"
 
     safe_cat = re.sub(r"\W+", "_", category).replace(" ", "_")
     safe_sub = re.sub(r"\W+", "_", subcategory).replace(" ", "_")
@@ -111,39 +257,38 @@ def run_loader(args: ArgumentParser) -> None:
         logger.error("Directory [%s] does not exist.", output_dir)
         exit(1)
 
-    input_path = output_dir / json_file
-    if not input_path.is_file():
-        logger.error("Input file [%s] not found.", json_file)
+    input_path = find_records_file(output_dir, input_stem)
+    if input_path is None:
+        logger.error("Input file [%s.jsonl] not found.", input_stem)
         exit(1)
 
-    with input_path.open(encoding="utf-8") as f:
-        data = json.load(f)
-
-    with open("load_config.toml") as f:
-        config = toml.load(f)
-    priority = config["fields"]["priority"]
-
-    df = pd.DataFrame(data)[priority + list(set(data[0]).difference(priority))]
+    records = iter_records(input_path)
+    first = next(records, None)
+    if first is None:
+        logger.error("Input file [%s] is empty.", input_path.name)
+        exit(1)
 
-    logger.info(
-        "Missing Value Summary:\n%s",
-        (
-            df.isna()
-            .sum()
-            .reset_index(name="Missing Count")
-            .rename(columns={"index": "Column"})
-            .to_string(index=False)
-        ),
+    priority = load_priority_fields()
+    columns = priority + list(set(first).difference(priority))
+    policy = RetentionPolicy(
+        keep=getattr(args, "keep_runs", 7),
+        max_age_days=getattr(args, "keep_days", None),
     )
 
-    df = validate_dataframe(df, priority)
-
-    logger.info("Final record count: %s", len(df))
-    logger.info("Saving cleaned data...")
-
-    write_details_to_excel(df, output_dir / excel_file)
-    write_details_to_csv(df, output_dir / csv_file)
-
+    missing = Counter()
+    chunks = clean_chunks(
+        iter_batches(chain([first], records), CHUNK_SIZE), columns, priority, missing
+    )
+    written = 0
+    METRICS.category = category_label(category, subcategory)
+    with METRICS.timer("load", "run"):
+        for written in export_chunks(
+            chunks, output_dir, base, columns, policy, getattr(args, "excel", False)
+        ):
+            pass
+
+    log_missing_summary(missing)
+    logger.info("Final record count: %s", written)
     logger.info("✔️ Export completed. Files saved to: %s", output_dir)
 
 
@@ -1,8 +1,12 @@
 import sys
 from argparse import ArgumentParser
+from pathlib import Path
 
-from db_loader import run_loader_db
-from filesys_loader import run_loader
+# Make project packages importable when run as `python load/run_data_loader.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.import_profile import add_profile_argument, profile_imports  # noqa: E402
+from common.metrics import add_metrics_arguments, metrics_session  # noqa: E402
 
 
 # Parse CLI arguments for marketplace metadata and output destination
@@ -23,6 +27,58 @@ def cli_arguments() -> ArgumentParser:
         required=True,
         help="Target output destination: 'db' or 'dir'.",
     )
+    parser.add_argument(
+        "--excel",
+        action="store_true",
+        help="Also export the run's rows to an Excel file (dir only).",
+    )
+    parser.add_argument(
+        "--keep_runs",
+        type=int,
+        default=7,
+        help="Final CSV/Excel files kept per directory; older ones are deleted (dir only).",
+    )
+    parser.add_argument(
+        "--keep_days",
+        type=float,
+        default=None,
+        help="Also delete final files older than this many days (dir only).",
+    )
+    parser.add_argument(
+        "--path",
+        nargs="+",
+        default=["."],
+        help="One or more directories holding final CSV files to load (db only).",
+    )
+    parser.add_argument(
+        "--load_method",
+        choices=["copy", "upsert", "insert"],
+        default="copy",
+        help=(
+            "Bulk COPY through a staging table (new products only), COPY and "
+            "update changed products with history (upsert), or row-by-row INSERT."
+        ),
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=50_000,
+        help="Rows loaded and committed per transaction.",
+    )
+    parser.add_argument(
+        "--db_workers",
+        type=int,
+        default=1,
+        help="Directories loaded concurrently over the shared connection pool.",
+    )
+    parser.add_argument(
+        "--db_retries",
+        type=int,
+        default=3,
+        help="Retries of a directory's load after a transient database error.",
+    )
+    add_metrics_arguments(parser)
+    add_profile_argument(parser)
     return parser.parse_args()
 
 
@@ -30,11 +86,22 @@ if __name__ == "__main__":
     # Parse CLI arguments
     args = cli_arguments()
 
-    # Route based on specified destination
-    if args.destination == "dir":
-        run_loader(args)
-    elif args.destination == "db":
-        run_loader_db(args)
-    else:
+    if args.profile_imports:
+        # Only the loader of the destination is imported, as in a real run
+        loader = "filesys_loader" if args.destination == "dir" else "db_loader"
+        sys.exit(profile_imports([loader]))
+
+    if args.destination not in ("db", "dir"):
         print("Destination must be either 'db' or 'dir'. Refer to documentation.")
         sys.exit(1)
+
+    # Route based on specified destination, importing only that loader
+    with metrics_session("load", args):
+        if args.destination == "dir":
+            from filesys_loader import run_loader
+
+            run_loader(args)
+        else:
+            from db_loader import run_loader_db
+
+            run_loader_db(args)
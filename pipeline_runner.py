@@ -0,0 +1,771 @@
+"""
+In-Process ETL Pipeline
+-----------------------
+
+Runs extract → enrich → validate → load for one marketplace/category/subcategory
+in a single Python process. Records are handed from stage to stage as
+generators of batches instead of being written to JSON Lines by one script and
+parsed again by the next, and each interpreter start and heavy import is paid
+once instead of three times.
+
+Usage:
+    python pipeline_runner.py -m <marketplace> -c <category> -s <subcategory> -d <destination>
+        [--checkpoint] [--pagination direct --max 5] [--enrich_mode async] [--overlap 2]
+
+Outputs:
+    - The load stage's outputs (Parquet dataset and final CSV for 'dir', the
+      category table for 'db')
+    - With --checkpoint, the extract and transform JSON Lines files the
+      stand-alone stages would have written, registered in the manifest, so a
+      later stage can be re-run on its own
+    - `<marketplace>_<category>_<subcategory>.pipeline.json` with the time
+      spent in each stage, excluding the time of the stages it pulls from
+    - A metrics report under logs/metrics/ with the extract, transform and
+      load counters and timers (see common/metrics.py)
+
+Notes:
+    - Playwright's sync API keeps its event loop registered on the calling
+      thread while a browser is open, so the extract stage finishes its
+      crawl before enrichment opens its own browser. It stops paginating
+      once --limit_records products are collected. Enrichment, validation
+      and loading then stream batch by batch.
+    - With --overlap N the crawl runs in a thread of its own and feeds a
+      bounded queue that N enrichment threads, each with its own browser,
+      consume while it is still paginating. The run then takes about as long
+      as its slowest stage rather than the sum of them; batches reach the
+      load stage in the order they finish enriching.
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import chain, islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from common.import_profile import add_profile_argument, profile_imports
+from common.jsonl import JSONL_SUFFIX, JsonLinesWriter, iter_batches
+from common.manifest import RetentionPolicy, register_artifact
+from common.metrics import (
+    METRICS,
+    add_metrics_arguments,
+    category_label,
+    metrics_session,
+)
+from common.response_cache import (
+    CacheSettings,
+    ResponseCache,
+    add_cache_arguments,
+    cache_settings_from_args,
+)
+from extract.direct_pagination import PaginationSettings, scrape_page_range
+from extract.extraction import (
+    build_output_path,
+    build_search_query,
+    click_through_all_pages,
+    normalize_strings,
+    search_query_list,
+)
+from extract.timing import RunSummary, WaitSettings
+from load.filesys_loader import (
+    clean_chunks,
+    export_chunks,
+    load_priority_fields,
+    log_missing_summary,
+)
+from transform.async_enrichment import AsyncEnricher
+from transform.enrichment_index import EnrichmentIndex
+from transform.transform import enrich_batches, enrich_products, open_detail_fetcher
+
+logger = logging.getLogger(__name__)
+
+# Run metrics stage each pipeline stage's exclusive time is recorded under
+METRIC_STAGES = {
+    "extract": "extract",
+    "extract_checkpoint": "extract",
+    "enrich": "transform",
+    "enrich_checkpoint": "transform",
+    "validate": "load",
+    "load": "load",
+    # Time downstream stages waited on overlapped enrichment, already
+    # counted by the extract and enrich threads themselves
+    "enrich_wait": None,
+}
+
+# End-of-stream marker on the overlap queues
+DONE = object()
+
+# Seconds between checks of the stop event while blocked on an overlap queue
+QUEUE_POLL_SECONDS = 0.5
+
+
+@dataclass
+class PipelineSettings:
+    marketplace: str = "amazonae"
+    category: str = "pet food"
+    subcategory: str = "wet food"
+    destination: str = "dir"
+    pagination: PaginationSettings = field(default_factory=PaginationSettings)
+    wait_settings: WaitSettings = field(default_factory=WaitSettings)
+    enrich_mode: str = "sync"
+    concurrency: int = 4
+    max_age_days: float = 7.0
+    batch_size: int = 100
+    limit_records: Optional[int] = None
+    checkpoint: bool = False
+    excel: bool = False
+    load_method: str = "copy"
+    db_batch_size: int = 50_000
+    table: str = ""
+    cache: CacheSettings = field(default_factory=CacheSettings)
+    # Enrichment threads consuming records while the crawl runs (0: stage
+    # after stage), and how many records may wait between the two
+    overlap_workers: int = 0
+    queue_size: int = 200
+
+
+# Exclusive wall time per stage of a chain of generators: time spent inside a
+# stage's `next()` is charged to it, minus the time of the stages it pulls from
+class StageClock:
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.items: Dict[str, int] = {}
+        self._stack: List[str] = []
+        self._mark = time.perf_counter()
+
+    def _switch(self) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            stage = self._stack[-1]
+            self.seconds[stage] += now - self._mark
+        self._mark = now
+
+    def wrap(
+        self,
+        stage: str,
+        iterable: Iterable,
+        count: Optional[Callable[[object], int]] = len,
+    ) -> Iterator:
+        # Registered here, not on first `next()`, so stages report in order
+        self.seconds.setdefault(stage, 0.0)
+        self.items.setdefault(stage, 0)
+        return self._timed(stage, iter(iterable), count)
+
+    def _timed(
+        self, stage: str, iterator: Iterator, count: Optional[Callable]
+    ) -> Iterator:
+        while True:
+            self._switch()
+            self._stack.append(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._switch()
+                self._stack.pop()
+            if count is not None:
+                self.items[stage] += count(item)
+            yield item
+
+    # Charge time measured elsewhere, e.g. by a stage running in a thread
+    def add(self, stage: str, seconds: float, items: int = 0) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.items[stage] = self.items.get(stage, 0) + items
+
+    def report(self) -> dict:
+        return {
+            stage: {"seconds": round(seconds, 3), "items": self.items[stage]}
+            for stage, seconds in self.seconds.items()
+        }
+
+
+# Search URL and marketplace base URL of the configured category
+def search_urls(settings: PipelineSettings) -> tuple:
+    marketplace = settings.marketplace
+    url = build_search_query(marketplace).get((settings.category, settings.subcategory))
+    if not url:
+        raise ValueError(
+            f"No search query for '{settings.category}' / '{settings.subcategory}'."
+        )
+    return url, search_query_list["marketplace"][marketplace]["url"]
+
+
+# Crawl the search results, yielding each page's products. The crawl runs to
+# the end (or to --limit_records) before the first page is yielded: its browser
+# has to be closed before enrichment opens its own in this thread. --overlap
+# streams pages to enrichment threads instead.
+def extract_pages(
+    settings: PipelineSettings, cache: Optional[ResponseCache]
+) -> Iterator[List[dict]]:
+    marketplace = settings.marketplace
+    url, web_url = search_urls(settings)
+    summary = RunSummary()
+    limit = settings.limit_records
+    pages: List[List[dict]] = []
+    collected = 0
+
+    # Keep one page's products; False once the limit is reached, to stop
+    def keep(products: List[dict]) -> bool:
+        nonlocal collected
+        pages.append(products)
+        collected += len(products)
+        return limit is None or collected < limit
+
+    if settings.pagination.mode == "direct":
+        scrape_page_range(
+            marketplace,
+            web_url,
+            url,
+            settings.category,
+            settings.subcategory,
+            settings.pagination,
+            lambda _, products: keep(products),
+            settings.wait_settings,
+            summary,
+            cache,
+        )
+    else:
+        crawl = click_through_all_pages(
+            marketplace,
+            web_url,
+            url,
+            settings.category,
+            settings.subcategory,
+            settings.wait_settings,
+            summary,
+            cache,
+        )
+        try:
+            for _, products in crawl:
+                if not keep(products):
+                    break
+        finally:
+            crawl.close()
+    summary.record_metrics(METRICS)
+    yield from pages
+
+
+# Enrich each batch with its detail pages, skipping fresh products
+def enrich_stage(
+    batches: Iterable[List[dict]],
+    settings: PipelineSettings,
+    output_dir: Path,
+    cache: Optional[ResponseCache],
+) -> Iterator[List[dict]]:
+    index = EnrichmentIndex.load(output_dir)
+    with ExitStack() as stack:
+        stack.callback(index.save)
+        enrich = open_enricher(settings, stack, cache)
+        yield from enrich_batches(
+            batches, index, enrich, settings.max_age_days, datetime.now()
+        )
+
+
+# Enrichment function for `settings.enrich_mode`; its fetcher or async browser
+# is opened on `stack`, in the calling thread, and closed with it
+def open_enricher(
+    settings: PipelineSettings, stack: ExitStack, cache: Optional[ResponseCache]
+) -> Callable[[List[dict]], None]:
+    if settings.enrich_mode == "async":
+        enricher = stack.enter_context(
+            AsyncEnricher(concurrency=settings.concurrency, cache=cache)
+        )
+        return enricher.enrich
+
+    fetcher = stack.enter_context(open_detail_fetcher(cache=cache))
+
+    def enrich(batch: List[dict]) -> None:
+        enrich_products(batch, fetcher)
+
+    return enrich
+
+
+# Put `item` on `q`, waiting while it is full; False if `stop` was set first
+def put_unless_stopped(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+# Next item of `q`, or DONE once `stop` is set
+def get_unless_stopped(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return DONE
+
+
+# Wait for one record, then take whatever else is already queued, up to
+# `size`; also returns whether the end-of-stream marker was reached
+def take_batch(
+    records: queue.Queue, size: int, stop: threading.Event
+) -> Tuple[List[dict], bool]:
+    first = get_unless_stopped(records, stop)
+    if first is DONE:
+        return [], True
+    batch = [first]
+    while len(batch) < size:
+        try:
+            record = records.get_nowait()
+        except queue.Empty:
+            break
+        if record is DONE:
+            return batch, True
+        batch.append(record)
+    return batch, False
+
+
+# Crawl in one thread and enrich in `overlap_workers` others at the same
+# time, yielding enriched batches as they finish (not in crawl order).
+# Records wait on a queue of `queue_size`, so a crawl that runs ahead blocks
+# instead of holding every page in memory. Each thread opens its own browser,
+# as Playwright's sync API is bound to the thread that started it.
+def overlapped_enrichment(
+    settings: PipelineSettings,
+    output_dir: Path,
+    extract_path: Path,
+    cache: Optional[ResponseCache],
+    clock: StageClock,
+) -> Iterator[List[dict]]:
+    url, web_url = search_urls(settings)
+    workers = max(1, settings.overlap_workers)
+    records: queue.Queue = queue.Queue(maxsize=max(1, settings.queue_size))
+    enriched: queue.Queue = queue.Queue(maxsize=2 * workers)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    index = EnrichmentIndex.load(output_dir)
+    started_at = datetime.now()
+    busy = {"extract": 0.0, "enrich": 0.0}
+    produced = Counter()
+    lock = threading.Lock()
+
+    def fail(error: BaseException) -> None:
+        errors.append(error)
+        stop.set()
+
+    def produce() -> None:
+        started = time.perf_counter()
+        blocked = 0.0
+        summary = RunSummary()
+        limit = settings.limit_records
+
+        # Queue one page's products; False once the limit is reached or the
+        # run was stopped, which also stops a direct page range. Records are
+        # checkpointed before they are queued, as enrichment updates them.
+        def emit(products: List[dict]) -> bool:
+            nonlocal blocked
+            try:
+                for product in products:
+                    if limit is not None and produced["records"] >= limit:
+                        return False
+                    if writer is not None:
+                        writer.write(product)
+                    wait_started = time.perf_counter()
+                    queued = put_unless_stopped(records, product, stop)
+                    blocked += time.perf_counter() - wait_started
+                    if not queued:
+                        return False
+                    produced["records"] += 1
+                return limit is None or produced["records"] < limit
+            finally:
+                if writer is not None:
+                    writer.flush()
+
+        # Direct pages arrive on the crawl's event loop: wait for queue space
+        # in a thread, so the page fetches still in flight keep going
+        async def emit_in_thread(_: int, products: List[dict]) -> bool:
+            return await asyncio.to_thread(emit, products)
+
+        writer = None
+        try:
+            if settings.checkpoint:
+                writer = JsonLinesWriter(extract_path)
+            if settings.pagination.mode == "direct":
+                scrape_page_range(
+                    settings.marketplace,
+                    web_url,
+                    url,
+                    settings.category,
+                    settings.subcategory,
+                    settings.pagination,
+                    emit_in_thread,
+                    settings.wait_settings,
+                    summary,
+                    cache,
+                )
+            else:
+                pages = click_through_all_pages(
+                    settings.marketplace,
+                    web_url,
+                    url,
+                    settings.category,
+                    settings.subcategory,
+                    settings.wait_settings,
+                    summary,
+                    cache,
+                )
+                try:
+                    for _, products in pages:
+                        if not emit(products):
+                            break
+                finally:
+                    # Close the browser in this thread, which started it
+                    pages.close()
+            if writer is not None:
+                writer.close()
+                register_artifact("extract", extract_path, writer.count)
+        except Exception as error:
+            fail(error)
+        finally:
+            if writer is not None:
+                writer.close()
+            summary.record_metrics(METRICS)
+            busy["extract"] = time.perf_counter() - started - blocked
+            for _ in range(workers):
+                put_unless_stopped(records, DONE, stop)
+
+    def consume() -> None:
+        seconds = 0.0
+        try:
+            with ExitStack() as stack:
+                enrich = open_enricher(settings, stack, cache)
+                done = False
+                while not done and not stop.is_set():
+                    batch, done = take_batch(records, settings.batch_size, stop)
+                    if not batch:
+                        continue
+                    started = time.perf_counter()
+                    batch = next(
+                        enrich_batches(
+                            [batch], index, enrich, settings.max_age_days, started_at
+                        )
+                    )
+                    seconds += time.perf_counter() - started
+                    if not put_unless_stopped(enriched, batch, stop):
+                        break
+        except Exception as error:
+            fail(error)
+        finally:
+            with lock:
+                busy["enrich"] += seconds
+            put_unless_stopped(enriched, DONE, stop)
+
+    threads = [threading.Thread(target=produce, name="extract", daemon=True)]
+    threads += [
+        threading.Thread(target=consume, name=f"enrich-{n}", daemon=True)
+        for n in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    logger.info(
+        "Overlapping extraction with %d enrichment thread(s), queue of %d record(s).",
+        workers,
+        records.maxsize,
+    )
+
+    enriched_count = 0
+    try:
+        finished = 0
+        while finished < workers:
+            batch = get_unless_stopped(enriched, stop)
+            if batch is DONE:
+                finished += 1
+                continue
+            enriched_count += len(batch)
+            yield batch
+    finally:
+        # Also stops the threads when a later stage failed or stopped early
+        stop.set()
+        for thread in threads:
+            thread.join()
+        index.save()
+        clock.add("extract", busy["extract"], produced["records"])
+        clock.add("enrich", busy["enrich"], enriched_count)
+    if errors:
+        raise errors[0]
+
+
+# Pass batches through while appending them to a JSON Lines artifact
+def checkpoint_batches(
+    batches: Iterable[List[dict]], path: Path, stage: str
+) -> Iterator[List[dict]]:
+    with JsonLinesWriter(path) as writer:
+        for batch in batches:
+            writer.write_many(batch)
+            writer.flush()
+            yield batch
+    register_artifact(stage, path, writer.count)
+
+
+# Validate batches into DataFrames, with columns fixed by the first record
+def validate_stage(
+    batches: Iterable[List[dict]], missing: Counter
+) -> Iterator[pd.DataFrame]:
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        return
+    priority = load_priority_fields()
+    columns = priority + list(set(first[0]).difference(priority))
+    yield from clean_chunks(chain([first], batches), columns, priority, missing)
+
+
+# Write validated frames to the database, yielding the running row count
+def load_db(
+    frames: Iterable[pd.DataFrame], settings: PipelineSettings, table: str
+) -> Iterator[int]:
+    from load.db_loader import ConnectionManager, load_frame
+
+    manager = ConnectionManager.from_env()
+    written = 0
+    try:
+        for df in frames:
+            load_frame(manager, table, df, settings.load_method, settings.db_batch_size)
+            written += len(df)
+            yield written
+    finally:
+        manager.close()
+
+
+# Write validated frames to the Parquet dataset and CSV, yielding the running
+# row count; columns are taken from the first frame
+def load_dir(
+    frames: Iterable[pd.DataFrame], settings: PipelineSettings, output_dir: Path
+) -> Iterator[int]:
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return
+    base = normalize_strings(
+        f"{settings.marketplace} {settings.category} {settings.subcategory}"
+    )
+    yield from export_chunks(
+        chain([first], frames),
+        output_dir,
+        base,
+        list(first.columns),
+        RetentionPolicy(),
+        settings.excel,
+    )
+
+
+# Map a pipeline run group and name (e.g. "pet-food", "pet-wet-food") to the
+# extraction category and subcategory they stand for
+def resolve_category(marketplace: str, run_group: str, run_name: str) -> tuple:
+    group = normalize_strings(run_group.replace("-", " "))
+    name = normalize_strings(run_name.replace("-", " "))
+    for category, subcategory in build_search_query(marketplace):
+        if normalize_strings(category) == group and name.endswith(
+            normalize_strings(subcategory)
+        ):
+            return category, subcategory
+    raise ValueError(f"No category matches run group '{run_group}/{run_name}'.")
+
+
+# Run every stage in this process and return the per-stage timing report
+def run_pipeline(settings: PipelineSettings) -> dict:
+    extract_path = build_output_path(
+        settings.marketplace, settings.category, settings.subcategory
+    )
+    output_dir = extract_path.parent
+    transform_path = output_dir / f"transform_{extract_path.stem}{JSONL_SUFFIX}"
+    table = settings.table or re.sub(r"\W+", "_", settings.subcategory)
+    clock = StageClock()
+    METRICS.category = category_label(settings.category, settings.subcategory)
+    missing = Counter()
+    started = time.perf_counter()
+    written = 0
+
+    with ExitStack() as stack:
+        cache = settings.cache.open()
+        if cache is not None:
+            stack.callback(cache.close)
+
+        if settings.overlap_workers > 0:
+            # Registered first so the report lists the stages in order
+            clock.add("extract", 0.0)
+            clock.add("enrich", 0.0)
+            overlapped = overlapped_enrichment(
+                settings, output_dir, extract_path, cache, clock
+            )
+            # Stop and join the threads right away if a later stage fails
+            stack.callback(overlapped.close)
+            batches = clock.wrap("enrich_wait", overlapped)
+        else:
+            pages = clock.wrap("extract", extract_pages(settings, cache))
+            products = islice(chain.from_iterable(pages), settings.limit_records)
+            batches = iter_batches(products, settings.batch_size)
+            if settings.checkpoint:
+                batches = clock.wrap(
+                    "extract_checkpoint",
+                    checkpoint_batches(batches, extract_path, "extract"),
+                )
+            batches = clock.wrap(
+                "enrich", enrich_stage(batches, settings, output_dir, cache)
+            )
+        if settings.checkpoint:
+            batches = clock.wrap(
+                "enrich_checkpoint",
+                checkpoint_batches(batches, transform_path, "transform"),
+            )
+
+        frames = clock.wrap("validate", validate_stage(batches, missing))
+        if settings.destination == "db":
+            loaded = load_db(frames, settings, table)
+        else:
+            loaded = load_dir(frames, settings, output_dir)
+        for written in clock.wrap("load", loaded, count=None):
+            pass
+        clock.items["load"] = written
+
+    # Database rows are recorded under the table, so its load time is too
+    load_category = table if settings.destination == "db" else None
+    for stage, seconds in clock.seconds.items():
+        metric_stage = METRIC_STAGES[stage]
+        if metric_stage is None:
+            continue
+        category = load_category if metric_stage == "load" else None
+        METRICS.observe(metric_stage, "run", seconds, category)
+
+    report = {
+        "marketplace": settings.marketplace,
+        "category": settings.category,
+        "subcategory": settings.subcategory,
+        "destination": settings.destination,
+        "records_loaded": written,
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "stages": clock.report(),
+    }
+    log_missing_summary(missing)
+    report_path = extract_path.with_suffix(".pipeline.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=3)
+    for stage, timing in report["stages"].items():
+        logger.info(
+            "Stage %-20s %9.3f s  %7d item(s)",
+            stage,
+            timing["seconds"],
+            timing["items"],
+        )
+    logger.info(
+        "Pipeline finished in %.3f s; %d record(s) loaded. Report: %s",
+        report["total_seconds"],
+        written,
+        report_path,
+    )
+    return report
+
+
+def cli_arguments() -> ArgumentParser:
+    parser = ArgumentParser(description="Run extract, transform and load in-process.")
+    parser.add_argument("-m", "--marketplace", default="amazonae")
+    parser.add_argument("-c", "--category", default="pet food")
+    parser.add_argument("-s", "--subcategory", default="wet food")
+    parser.add_argument("-d", "--destination", choices=["dir", "db"], default="dir")
+    parser.add_argument("--pagination", choices=["click", "direct"], default="click")
+    parser.add_argument("--min", type=int, default=1)
+    parser.add_argument("--max", type=int, default=1)
+    parser.add_argument("--enrich_mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max_age_days", type=float, default=7.0)
+    parser.add_argument("--batch_size", type=int, default=100)
+    parser.add_argument(
+        "--limit_records",
+        type=int,
+        default=None,
+        help="Process at most this many products; the crawl stops once they are found.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Also write the extract and transform JSON Lines files.",
+    )
+    parser.add_argument("--excel", action="store_true")
+    parser.add_argument(
+        "--load_method", choices=["copy", "upsert", "insert"], default="copy"
+    )
+    parser.add_argument("--table", default="", help="Database table (db only).")
+    parser.add_argument(
+        "--overlap",
+        type=int,
+        default=0,
+        help=(
+            "Enrich in this many threads while the crawl is still running. With 0,"
+            " every page is crawled (up to --limit_records) and held in memory"
+            " before the first product is enriched."
+        ),
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=200,
+        help="Records that may wait between the crawl and enrichment with --overlap.",
+    )
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_argument(parser)
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    args = cli_arguments()
+    if args.profile_imports:
+        # Modules the stages of this run import lazily
+        modules = ["playwright.sync_api"]
+        if args.pagination == "direct" or args.enrich_mode == "async":
+            modules.append("playwright.async_api")
+        if args.destination == "db":
+            modules.append("load.db_loader")
+        exit(profile_imports(modules))
+    settings = PipelineSettings(
+        marketplace=args.marketplace,
+        category=args.category,
+        subcategory=args.subcategory,
+        destination=args.destination,
+        pagination=PaginationSettings(
+            mode=args.pagination, min_page=args.min, max_page=args.max
+        ),
+        enrich_mode=args.enrich_mode,
+        concurrency=args.concurrency,
+        max_age_days=args.max_age_days,
+        batch_size=args.batch_size,
+        limit_records=args.limit_records,
+        checkpoint=args.checkpoint,
+        excel=args.excel,
+        load_method=args.load_method,
+        table=args.table,
+        cache=cache_settings_from_args(args),
+        overlap_workers=args.overlap,
+        queue_size=args.queue_size,
+    )
+    try:
+        with metrics_session("pipeline", args):
+            run_pipeline(settings)
+    except Exception as error:
+        logger.error("Pipeline failed: %s", error)
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import subprocess
+import sys
 from argparse import ArgumentParser
-from datetime import datetime
 from pathlib import Path
 
 import yaml
@@ -11,64 +11,55 @@ def load_config(file_path: str) -> dict:
         return yaml.safe_load(f)
 
 
-def format_filename(template: str, category_name: str, timestamp: str = None) -> str:
-    if timestamp:
-        return template.format(category_name=category_name, timestamp=timestamp)
-    return template.format(category_name=category_name)
+# Stage scripts run by --run_mode, relative to this file
+STAGE_SCRIPTS = {
+    "extract": Path("extract") / "extraction.py",
+    "transform": Path("transform") / "transform.py",
+    "load": Path("load") / "run_data_loader.py",
+}
 
 
+# Command line of one stage script, with only the flags that stage defines;
+# every stage finds its input and output files under
+# output/<marketplace>/<category>/<subcategory>/
 def build_args(
     run_mode: str,
-    folder_path: Path,
-    run_script: Path,
-    output_file: str,
-    config: dict,
-    category_name: str,
-    max_number: str,
+    marketplace: str,
+    category: str,
+    subcategory: str,
+    max_number: int,
     destination: str,
     limit_records: str,
+    enrich_mode: str = "sync",
+    concurrency: int = 4,
+    pagination: str = "click",
+    cache_dir: str = "",
 ) -> list:
-    args = ["python3", str(run_script), "--path", str(folder_path)]
+    run_script = Path(__file__).resolve().parent / STAGE_SCRIPTS[run_mode]
+    args = [sys.executable, str(run_script), "-m", marketplace]
+    args += ["-c", category, "-s", subcategory]
     match run_mode:
         case "extract":
-            args += [
-                "--name",
-                str(output_file),
-                "--url",
-                config["url_template"],
-                "--min",
-                str(config["min_page_index"]),
-                "--max",
-                str(max_number),
-            ]
+            args += ["--max", str(max_number), "--pagination", pagination]
         case "transform":
-            extract_file = format_filename(
-                config["extract"]["file-name"], category_name
-            )
             args += [
-                "--name",
-                str(output_file),
-                "--extract",
-                str(folder_path / extract_file),
                 "--limit_records",
                 str(limit_records),
+                "--mode",
+                enrich_mode,
+                "--concurrency",
+                str(concurrency),
             ]
         case "load":
-            transform_file = format_filename(
-                config["transform"]["file-name"], category_name
-            )
-            args += [
-                "--name",
-                str(output_file),
-                "--transform",
-                str(folder_path / transform_file),
-                "--destination",
-                str(destination),
-            ]
-        case "upload":
-            args += []
-        case _:
-            print("Unsupported run_mode: %s", run_mode)
+            args += ["--destination", str(destination)]
+            if destination == "db":
+                # The database loader reads the newest final CSV of the category
+                from extract.extraction import build_output_path
+
+                extract_path = build_output_path(marketplace, category, subcategory)
+                args += ["--path", str(extract_path.parent)]
+    if cache_dir and run_mode in ("extract", "transform"):
+        args += ["--cache_dir", str(cache_dir)]
     return args
 
 
@@ -84,11 +75,50 @@ def parse_arguments():
         help="Directs the destination of the final processed and cleaned data.",
     )
     parser.add_argument("--max", type=int, default=1, help="Maximum page number limit")
+    parser.add_argument(
+        "--pagination",
+        choices=["click", "direct"],
+        default="click",
+        help="Extract by clicking 'Next' or by fetching page URLs concurrently.",
+    )
     parser.add_argument(
         "--limit_records",
         default="",
         help="Limit the maximum record values are required.",
     )
+    parser.add_argument(
+        "--enrich_mode",
+        choices=["sync", "async"],
+        default="sync",
+        help="Transform detail pages one at a time (sync) or concurrently (async).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum concurrent detail pages when --enrich_mode is async.",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        default="",
+        help="Shared response cache directory for the extract and transform stages.",
+    )
+    parser.add_argument(
+        "--in_process",
+        action="store_true",
+        help="Run extract, transform and load in this process (ignores --run_mode).",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Keep the extract and transform files when running --in_process.",
+    )
+    parser.add_argument(
+        "--overlap",
+        type=int,
+        default=0,
+        help="With --in_process, enrich in this many threads while extraction is still crawling.",
+    )
     return parser.parse_args()
 
 
@@ -104,48 +134,73 @@ def get_config_from_args_or_yaml(config, args):
     return run_group, sub_group["run-name"], sub_group["run-type"]
 
 
+# Run every stage through the generator pipeline instead of one script per stage
+def run_in_process(args, run_group: str, run_name: str) -> None:
+    from common.metrics import metrics_session
+    from common.response_cache import CacheSettings
+    from extract.direct_pagination import PaginationSettings
+    from pipeline_runner import PipelineSettings, resolve_category, run_pipeline
+
+    category, subcategory = resolve_category("amazonae", run_group, run_name)
+    settings = PipelineSettings(
+        category=category,
+        subcategory=subcategory,
+        destination=args.destination or "dir",
+        pagination=PaginationSettings(mode=args.pagination, max_page=args.max),
+        enrich_mode=args.enrich_mode,
+        concurrency=args.concurrency,
+        limit_records=int(args.limit_records) if args.limit_records else None,
+        checkpoint=args.checkpoint,
+        table=run_name.replace("-", "_"),
+        cache=CacheSettings(cache_dir=args.cache_dir),
+        overlap_workers=args.overlap,
+    )
+    with metrics_session("pipeline"):
+        run_pipeline(settings)
+
+
 def run_main():
-    config = load_config("configs.yml")
     args = parse_arguments()
+    if args.in_process and args.run_group and args.run_name:
+        run_in_process(args, args.run_group, args.run_name)
+        return
 
-    max_page_num = args.max
+    # configs.yml is only needed for what the command line leaves out
+    from_cli = args.run_group and args.run_name and args.run_mode
+    config = {} if from_cli else load_config("configs.yml")
     run_group, run_name, run_mode = get_config_from_args_or_yaml(config, args)
+    if args.in_process:
+        run_in_process(args, run_group, run_name)
+        return
 
-    sub_group = config[run_group]
-    category_group = sub_group[run_name]
-    run_type_config = category_group[run_mode]
-
-    # Compose category name and paths
-    category_name = f"{run_group.replace('-', '_')}_{run_name.replace('-', '_')}"
-    folder_path = Path("data") / run_group / run_name
-
-    # print(category_group)
-    # print(run_type_config)
-    # Compose output file
+    if run_mode not in STAGE_SCRIPTS:
+        print(f"Unsupported run_mode: {run_mode}")
+        sys.exit(1)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") if run_mode == "load" else None
-    output_file = folder_path / format_filename(
-        run_type_config["file-name"], category_name, timestamp
-    )
+    from pipeline_runner import resolve_category
 
-    output_file = category_name if run_mode == "upload" else output_file
-    print(output_file)
-    # Build and execute script arguments
-    script_path = run_type_config["run-script"]
+    marketplace = "amazonae"
+    category, subcategory = resolve_category(marketplace, run_group, run_name)
     command_args = build_args(
         run_mode,
-        folder_path,
-        script_path,
-        output_file,
-        category_group,
-        category_name,
-        max_page_num,
+        marketplace,
+        category,
+        subcategory,
+        args.max,
         args.destination,
         args.limit_records,
+        args.enrich_mode,
+        args.concurrency,
+        args.pagination,
+        args.cache_dir,
     )
 
     print(f"Running script with args: {command_args}")
-    subprocess.run(command_args)
+    # Propagate the stage's exit status so a failed stage fails the Job (and
+    # a retry resumes from the stage's checkpoint)
+    result = subprocess.run(command_args)
+    if result.returncode != 0:
+        sys.exit(result.returncode)
 
 
 if __name__ == "__main__":
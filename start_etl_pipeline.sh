@@ -5,12 +5,15 @@ Purpose:
 - Run the complete ETL pipeline: extract → transform → load.
 
 Usage:
-- ./run_etl_pipeline.sh <RUN_GROUP> <RUN_NAME> <NAMESPACE>
+- ./run_etl_pipeline.sh <RUN_GROUP> <RUN_NAME> <NAMESPACE> [EXTRACT_WORKERS]
 
 Arguments:
 - RUN_GROUP   : Logical data group (e.g., "pet-food")
 - RUN_NAME    : Specific data name or category (e.g., "pet-dry-food")
 - NAMESPACE   : Kubernetes namespace to run the jobs (e.g., "dev-ns")
+- EXTRACT_WORKERS : Optional number of extraction pods (default 1). Above 1,
+                    extraction runs as an Indexed Job of identical workers that
+                    pull work items from a shared queue and merge their shards.
 
 Example:
 - ./run_etl_pipeline.sh "pet-food" "pet-dry-food" "dev-ns"
@@ -18,6 +21,7 @@ Example:
 Execution:
 - Deploys each ETL stage using Helm.
 - Each stage runs as a separate Helm release.
+- Scaling extraction means raising EXTRACT_WORKERS, not templating more releases.
 
 Data Handling:
 - A PVC inspector pod is created per job release.
@@ -30,6 +34,7 @@ set -o pipefail   # Return the exit status of the last command in the pipe that
 RUN_GROUP="$1"
 RUN_NAME="$2"
 NAMESPACE="$3"
+EXTRACT_WORKERS="${4:-1}"
 
 # Validate input arguments
 if [[ -z "$RUN_GROUP" || -z "$RUN_NAME" || -z "$NAMESPACE" ]]; then
@@ -55,7 +60,12 @@ for job in "${JOBS[@]}"; do
     echo "▶️ Running stage: $job"
 
     # Install Helm chart with the appropriate jobToRun value
-    helm install "$RELEASE_NAME" "$CHART_PATH" --set "jobToRun=$job"
+    HELM_SET="jobToRun=$job"
+    if [[ "$job" == "extract" && "$EXTRACT_WORKERS" -gt 1 ]]; then
+        # Identical pods pulling from the shared work queue
+        HELM_SET+=",workQueue.enabled=true,workQueue.workers=$EXTRACT_WORKERS"
+    fi
+    helm install "$RELEASE_NAME" "$CHART_PATH" --set "$HELM_SET"
 
     # Wait for the job to complete
     echo "⏳ Waiting for job $RELEASE_NAME to complete..."
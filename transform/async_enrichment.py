@@ -0,0 +1,186 @@
+"""
+Asynchronous product detail enrichment.
+
+Fetches up to ``concurrency`` product detail pages at a time over a single
+shared Firefox browser using ``playwright.async_api``. `AsyncEnricher` keeps
+the browser and its event loop open across batches. Requests to the same
+host are spaced at least ``host_interval`` seconds apart. Every page is parsed
+with `parse_product_details()`, so the enriched records carry the same fields
+as the sync path in `transform.py`.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable, List, Optional
+from urllib.parse import urlsplit
+
+from common.metrics import METRICS
+from common.request_filter import RequestFilter, load_request_filter
+from common.response_cache import ResponseCache
+from transform.detail_parser import parse_product_details
+
+logger = logging.getLogger(__name__)
+
+
+# Space out request start times per host by at least `min_interval` seconds
+class HostRateLimiter:
+    def __init__(self, min_interval: float = 0.0):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def wait(self, url: str) -> None:
+        if self.min_interval <= 0:
+            return
+        host = urlsplit(url).hostname or ""
+        async with self._locks[host]:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            delay = self._next_slot.get(host, now) - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_slot[host] = max(now, loop.time()) + self.min_interval
+
+
+# Parse a detail page, counting it and its parse time in the run metrics
+def parse_details(html: str, url: str) -> dict:
+    METRICS.increment("transform", "pages")
+    METRICS.increment("transform", "bytes", len(html.encode("utf-8")))
+    with METRICS.timer("transform", "parse"):
+        return parse_product_details(html, url)
+
+
+# `get_browser` is only awaited on a cache miss, so cached pages never
+# launch a browser
+async def fetch_product_details(
+    get_browser: Callable[[], Awaitable[object]],
+    url: str,
+    semaphore: asyncio.Semaphore,
+    limiter: HostRateLimiter,
+    request_filter: RequestFilter,
+    cache: Optional[ResponseCache] = None,
+) -> Optional[dict]:
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, url)
+        if cached is not None:
+            return parse_details(cached, url)
+        if cache.offline:
+            METRICS.increment("transform", "errors")
+            return None
+
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+    async with semaphore:
+        browser = await get_browser()
+        await limiter.wait(url)
+        context = await browser.new_context()
+        try:
+            page = await context.new_page()
+            await page.route("**/*", request_filter.async_handler())
+            await page.goto(url, wait_until="domcontentloaded", timeout=100_000)
+            await page.wait_for_selector("div#dp-container", timeout=60_000)
+            html = await page.inner_html("div#dp-container")
+        except PlaywrightTimeoutError:
+            logger.error("Timeout while loading %s", url)
+            METRICS.increment("transform", "errors")
+            return None
+        except Exception as exc:
+            logger.exception("Scrape error: %s", exc)
+            METRICS.increment("transform", "errors")
+            return None
+        finally:
+            await context.close()
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put, url, html)
+    return parse_details(html, url)
+
+
+# Enrich batches concurrently over one browser and event loop kept open for
+# the whole run, so the host rate limiter spans batches too. The browser is
+# launched by the first page that is not in the cache.
+class AsyncEnricher:
+    def __init__(
+        self,
+        concurrency: int = 4,
+        host_interval: float = 0.0,
+        headless: bool = True,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.concurrency = concurrency
+        self.host_interval = host_interval
+        self.headless = headless
+        self.cache = cache
+        self.request_filter = load_request_filter("transform")
+
+        self._runner: Optional[asyncio.Runner] = None
+        self._playwright = None
+        self._browser = None
+        self._semaphore = None
+        self._limiter = None
+        self._launch_lock = None
+
+    def __enter__(self) -> "AsyncEnricher":
+        self._runner = asyncio.Runner()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def enrich(self, products: List[dict]) -> List[dict]:
+        if self._runner is None:
+            raise RuntimeError("AsyncEnricher is closed; use it as a context manager.")
+        return self._runner.run(self._enrich(products))
+
+    def close(self) -> None:
+        if self._runner is None:
+            return
+        try:
+            self._runner.run(self._stop())
+        finally:
+            self._runner.close()
+            self._runner = None
+
+    # Launch the browser once, for whichever page needs it first
+    async def _get_browser(self):
+        async with self._launch_lock:
+            if self._browser is None:
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.firefox.launch(
+                    headless=self.headless
+                )
+        return self._browser
+
+    async def _stop(self) -> None:
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _enrich(self, products: List[dict]) -> List[dict]:
+        if self._semaphore is None:
+            # Created on the runner's loop, which every batch reuses
+            self._semaphore = asyncio.Semaphore(max(1, self.concurrency))
+            self._limiter = HostRateLimiter(self.host_interval)
+            self._launch_lock = asyncio.Lock()
+        results = await asyncio.gather(
+            *(
+                fetch_product_details(
+                    self._get_browser,
+                    product["product_detail_url"],
+                    self._semaphore,
+                    self._limiter,
+                    self.request_filter,
+                    self.cache,
+                )
+                for product in products
+            )
+        )
+        for product, details in zip(products, results):
+            product.update(details or {})
+        return products
@@ -0,0 +1,66 @@
+"""
+Product detail page parsing shared by the sync and async enrichment paths.
+
+Fields are read with declarative selector specs on the fastest installed
+parsing engine (see common/html_engine.py).
+"""
+
+import logging
+import re
+from typing import Optional
+
+from common.html_engine import Field, SelectorSpec, get_engine
+
+logger = logging.getLogger(__name__)
+
+CENTER_COLUMN = "div#centerCol"
+
+# Selectors relative to `div#centerCol`
+CENTER_SPEC = SelectorSpec(
+    {
+        "brand": Field("tr.a-spacing-small.po-brand span.a-size-base.po-break-word"),
+        "about": Field("div#feature-bullets li span.a-list-item", many=True),
+        "reviews": Field("div#averageCustomerReviews span#acrCustomerReviewText"),
+        "score": Field("div#averageCustomerReviews span.a-size-base.a-color-base"),
+    }
+)
+
+# Selectors relative to the whole `div#dp-container`
+PAGE_SPEC = SelectorSpec({"description": Field("div#productDescription")})
+
+
+# Parse brand, description and review fields from the `div#dp-container` HTML
+def parse_product_details(
+    html: str, url: str = "", engine: Optional[object] = None
+) -> Optional[dict]:
+    engine = engine or get_engine()
+    root = engine.parse(html)
+    center = engine.select_one(root, engine.compile(CENTER_COLUMN))
+    if center is None:
+        logger.warning("centerCol not found on %s", url)
+        return None
+
+    fields = CENTER_SPEC.extract(center, engine)
+    fields.update(PAGE_SPEC.extract(root, engine))
+
+    about_text = "\n".join(fields["about"])
+    desc_text = fields["description"] or ""
+
+    reviews_num = None
+    if fields["reviews"]:
+        match = re.search(r"([\d,]+)", fields["reviews"])
+        if match:
+            reviews_num = float(match.group(1).replace(",", ""))
+
+    score_num = None
+    if fields["score"]:
+        match = re.search(r"([\d.]+)", fields["score"])
+        if match:
+            score_num = float(match.group(1))
+
+    return {
+        "brand": fields["brand"].lower() if fields["brand"] else None,
+        "description": f"{about_text}\n{desc_text}".lower().strip(),
+        "total_reviews": reviews_num,
+        "review_score": score_num,
+    }
@@ -0,0 +1,133 @@
+"""
+Incremental enrichment index.
+
+Remembers, per `product_detail_url`, when a product was last enriched, a hash
+of the enriched detail fields and the fields themselves. The index is stored
+as `enrichment_index.json` next to the transform output, so a later run only
+visits products that are new or whose enrichment is older than the allowed
+age; every other product has its previous details carried forward.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "enrichment_index.json"
+
+# Fields written by `parse_product_details()`
+DETAIL_FIELDS = ("brand", "description", "total_reviews", "review_score")
+
+
+# Stable hash of the enriched detail fields of a product
+def content_hash(details: dict) -> str:
+    payload = json.dumps(
+        {key: details.get(key) for key in DETAIL_FIELDS}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EnrichmentIndex:
+    def __init__(self, path: Path, entries: Optional[dict] = None):
+        self.path = path
+        self.entries = entries or {}
+        self.changed = 0
+        self.unchanged = 0
+        # Enrichment threads of an overlapped pipeline record concurrently
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, output_dir: Path) -> "EnrichmentIndex":
+        path = output_dir / INDEX_FILE
+        if not path.is_file():
+            return cls(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable enrichment index %s: %s", path, exc)
+            return cls(path)
+        logger.info("Loaded enrichment index with %d product(s).", len(entries))
+        return cls(path, entries)
+
+    # True when `url` was enriched less than `max_age` ago
+    def is_fresh(self, url: str, max_age: timedelta, now: datetime) -> bool:
+        entry = self.entries.get(url)
+        if entry is None:
+            return False
+        enriched_at = datetime.fromisoformat(entry["last_enriched_at"])
+        return now - enriched_at < max_age
+
+    # Copy the previously enriched fields onto `product`
+    def carry_forward(self, product: dict) -> None:
+        entry = self.entries[product["product_detail_url"]]
+        product.update(entry["details"])
+
+    def record(self, product: dict, now: datetime) -> None:
+        details = {key: product.get(key) for key in DETAIL_FIELDS}
+        digest = content_hash(details)
+        with self._lock:
+            previous = self.entries.get(product["product_detail_url"])
+            if previous is not None and previous["content_hash"] == digest:
+                self.unchanged += 1
+            else:
+                self.changed += 1
+            self.entries[product["product_detail_url"]] = {
+                "last_enriched_at": now.isoformat(timespec="seconds"),
+                "content_hash": digest,
+                "details": details,
+            }
+
+    # Write to a temporary file first so a crash never leaves a torn index
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp_path, self.path)
+        logger.info(
+            "Enrichment index saved: %d product(s), %d changed, %d unchanged.",
+            len(self.entries),
+            self.changed,
+            self.unchanged,
+        )
+
+
+# Split products into those to enrich now and those still fresh in the index
+def plan_enrichment(
+    products: List[dict],
+    index: EnrichmentIndex,
+    max_age_days: float,
+    now: datetime,
+) -> Tuple[List[dict], List[dict]]:
+    max_age = timedelta(days=max_age_days)
+    pending, fresh = [], []
+    for product in products:
+        if index.is_fresh(product["product_detail_url"], max_age, now):
+            index.carry_forward(product)
+            fresh.append(product)
+        else:
+            pending.append(product)
+    logger.info(
+        "Incremental enrichment: %d product(s) to fetch, %d carried forward.",
+        len(pending),
+        len(fresh),
+    )
+    return pending, fresh
+
+
+# Record products that came back with details; failed ones keep their old
+# details (if any) and are retried on the next run
+def record_enriched(
+    products: List[dict], index: EnrichmentIndex, now: datetime
+) -> None:
+    for product in products:
+        if any(product.get(key) is not None for key in DETAIL_FIELDS):
+            index.record(product, now)
+        elif product["product_detail_url"] in index.entries:
+            index.carry_forward(product)
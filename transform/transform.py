@@ -14,25 +14,69 @@ Arguments:
     -s, --subcategory   Product subcategory (e.g., "wet food")
 
 Functionality:
-    - Reads a JSON file from the output directory containing product URLs.
-    - For each product (limited to first 5 for demo), scrapes details from its URL.
-    - Enriches the original metadata and saves the updated results as JSON.
+    - Streams the JSON Lines file from the output directory containing product
+      URLs (legacy `.json` arrays are still read), in batches of --batch_size.
+    - For each product (up to --limit_records), scrapes details from its URL.
+      Products enriched within --max_age_days are skipped and keep their
+      previous details (see transform/enrichment_index.py).
+    - Enriches the original metadata and appends each batch to the output.
     - Logs progress and errors for traceability.
 
 Output:
-    - A JSON file named `transform_<marketplace>_<category>_<subcategory>.json`
+    - A JSON Lines file named `transform_<marketplace>_<category>_<subcategory>.jsonl`
       saved in the same output directory structure.
 """
 
 import json
 import logging
 import re
-from argparse import ArgumentParser
+import sys
+from argparse import ArgumentParser, ArgumentTypeError
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from itertools import islice
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, List, Optional
 
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
+# Make project packages importable when run as `python transform/transform.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.browser_pool import BrowserPool  # noqa: E402
+from common.fetcher import (  # noqa: E402
+    FallbackFetcher,
+    FetchStats,
+    HttpFetcher,
+    PlaywrightFetcher,
+)
+from common.import_profile import add_profile_argument, profile_imports  # noqa: E402
+from common.jsonl import (  # noqa: E402
+    JSONL_SUFFIX,
+    JsonLinesWriter,
+    find_records_file,
+    iter_batches,
+    iter_records,
+)
+from common.manifest import register_artifact  # noqa: E402
+from common.metrics import (  # noqa: E402
+    METRICS,
+    add_metrics_arguments,
+    category_label,
+    metrics_session,
+)
+from common.request_filter import load_request_filter  # noqa: E402
+from common.response_cache import (  # noqa: E402
+    CachingFetcher,
+    ResponseCache,
+    add_cache_arguments,
+    cache_settings_from_args,
+)
+from transform.async_enrichment import AsyncEnricher  # noqa: E402
+from transform.detail_parser import parse_product_details  # noqa: E402
+from transform.enrichment_index import (  # noqa: E402
+    EnrichmentIndex,
+    plan_enrichment,
+    record_enriched,
+)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -40,89 +84,96 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def product_level_scraper(url: str) -> Optional[dict]:
-    def block_requests(route, request):
-        blocked_resources = ["media", "audio"]
-        blocked_extensions = (".mp4", ".m3u8", ".webm", ".mov", ".avi", ".flv")
-        ad_domains = [
-            "doubleclick.net",
-            "google-analytics.com",
-            "googletagmanager.com",
-            "adsystem.com",
-            "amazon-adsystem.com",
-            "facebook.net",
-        ]
-        if (
-            request.resource_type in blocked_resources
-            or request.url.endswith(blocked_extensions)
-            or any(domain in request.url for domain in ad_domains)
-        ):
-            route.abort()
-        else:
-            route.continue_()
-
-    with sync_playwright() as p:
-        browser = p.firefox.launch(headless=True)
-        context = browser.new_context()
-        page = context.new_page()
-        page.route("**/*", block_requests)
-
-        try:
-            page.goto(url, wait_until="domcontentloaded", timeout=100_000)
-            page.wait_for_selector("div#dp-container", timeout=60_000)
-
-            soup = BeautifulSoup(page.inner_html("div#dp-container"), "html.parser")
-            center = soup.find("div", id="centerCol")
-            if not center:
-                logger.warning("centerCol not found on %s", url)
-                return
-
-            brand_el = center.select_one(
-                "tr.a-spacing-small.po-brand span.a-size-base.po-break-word"
-            )
-            about_items = center.select("div#feature-bullets li span.a-list-item")
-            about_text = (
-                "\n".join(i.get_text(strip=True) for i in about_items)
-                if about_items
-                else ""
-            )
-
-            desc_el = soup.find("div", id="productDescription")
-            desc_text = desc_el.get_text(strip=True) if desc_el else ""
-
-            reviews_el = center.select_one(
-                "div#averageCustomerReviews span#acrCustomerReviewText"
-            )
-            score_el = center.select_one(
-                "div#averageCustomerReviews span.a-size-base.a-color-base"
-            )
-
-            reviews_num = None
-            if reviews_el:
-                match = re.search(r"([\d,]+)", reviews_el.get_text())
-                if match:
-                    reviews_num = float(match.group(1).replace(",", ""))
-
-            score_num = None
-            if score_el:
-                match = re.search(r"([\d.]+)", score_el.get_text())
-                if match:
-                    score_num = float(match.group(1))
-
-            details = {
-                "brand": brand_el.get_text(strip=True).lower() if brand_el else None,
-                "description": f"{about_text}\n{desc_text}".lower().strip(),
-                "total_reviews": reviews_num,
-                "review_score": score_num,
-            }
-            return details
-
-        except TimeoutError:
+# Scrape a product detail page through the given fetcher or shared browser pool
+def product_level_scraper(
+    url: str, pool: Optional[BrowserPool] = None, fetcher=None
+) -> Optional[dict]:
+    if fetcher is None and pool is None:
+        route_handler = load_request_filter("transform").handler()
+        with BrowserPool(route_handler=route_handler) as own_pool:
+            return product_level_scraper(url, own_pool)
+    fetcher = fetcher or PlaywrightFetcher(pool)
+
+    try:
+        html = fetcher.fetch(url, "div#dp-container")
+    except Exception as exc:
+        # Playwright is only imported once a browser was used, i.e. when it
+        # can have raised the timeout
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        if isinstance(exc, PlaywrightTimeoutError):
             logger.error("Timeout while loading %s", url)
-        except Exception as exc:
+        else:
             logger.exception("Scrape error: %s", exc)
-        finally:
-            browser.close()
+        METRICS.increment("transform", "errors")
+        return None
+
+    if html is None:
+        logger.warning("Product details not found on %s", url)
+        METRICS.increment("transform", "errors")
+        return None
+    METRICS.increment("transform", "pages")
+    METRICS.increment("transform", "bytes", len(html.encode("utf-8")))
+    with METRICS.timer("transform", "parse"):
+        return parse_product_details(html, url)
+
+
+# Build the detail page fetcher shared by every batch, over plain HTTP first
+# when `fetcher_mode` is "http", and close it when the run ends
+@contextmanager
+def open_detail_fetcher(
+    recycle_after: int = 50,
+    fetcher_mode: str = "browser",
+    cache: Optional[ResponseCache] = None,
+) -> Iterator[object]:
+    browser_fetcher = PlaywrightFetcher(
+        recycle_after=recycle_after,
+        route_handler=load_request_filter("transform").handler(),
+    )
+    stats = FetchStats()
+    if fetcher_mode == "http":
+        fetcher = FallbackFetcher(HttpFetcher(), browser_fetcher, stats)
+    else:
+        fetcher = browser_fetcher
+    if cache is not None:
+        fetcher = CachingFetcher(fetcher, cache)
+
+    try:
+        yield fetcher
+    finally:
+        fetcher.close()
+        stats.log_summary()
+
+
+# Enrich products one at a time through `fetcher`
+def enrich_products(products: List[dict], fetcher) -> List[dict]:
+    for index, product in enumerate(products, 1):
+        logger.info("Index [%s] - product name: %s ...", index, product["name"][:50])
+        enriched_product = product_level_scraper(
+            product["product_detail_url"], fetcher=fetcher
+        )
+        product.update(enriched_product or {})
+    return products
+
+
+# Plan each batch against the index, enrich the products that are due and
+# yield the batch once every product carries its details
+def enrich_batches(
+    batches: Iterable[List[dict]],
+    index: EnrichmentIndex,
+    enrich: Callable[[List[dict]], object],
+    max_age_days: float,
+    started_at: datetime,
+) -> Iterator[List[dict]]:
+    for batch in batches:
+        pending, _ = plan_enrichment(batch, index, max_age_days, started_at)
+        if pending:
+            with METRICS.timer("transform", "enrich"):
+                enrich(pending)
+        record_enriched(pending, index, started_at)
+        METRICS.increment("transform", "records", len(batch))
+        METRICS.increment("transform", "enriched", len(pending))
+        yield batch
 
 
 def normalize_strings(text_str: str) -> str:
@@ -130,24 +181,93 @@ def normalize_strings(text_str: str) -> str:
     return "_".join(cleaned.split())
 
 
+# Empty values (as passed by the pipeline when unset) mean "no limit"
+def parse_limit(value: str) -> Optional[int]:
+    if not value.strip():
+        return None
+    limit = int(value)
+    if limit < 0:
+        raise ArgumentTypeError("limit must not be negative")
+    return limit
+
+
 def cli_arguments() -> ArgumentParser:
     parser = ArgumentParser()
     parser.add_argument("-m", "--marketplace", default="amazonae")
     parser.add_argument("-c", "--category", default="pet food")
     parser.add_argument("-s", "--subcategory", default="wet food")
+    parser.add_argument(
+        "--recycle_after",
+        type=int,
+        default=50,
+        help="Recycle a pooled page (and its context) after this many URLs.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["sync", "async"],
+        default="sync",
+        help="Enrich detail pages one at a time (sync) or concurrently (async).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum detail pages fetched at once in async mode.",
+    )
+    parser.add_argument(
+        "--host_interval",
+        type=float,
+        default=0.5,
+        help="Minimum seconds between requests to the same host in async mode.",
+    )
+    parser.add_argument(
+        "--fetcher",
+        choices=["browser", "http"],
+        default="browser",
+        help="Render every page in a browser, or try plain HTTP first (sync mode).",
+    )
+    parser.add_argument(
+        "--limit_records",
+        type=parse_limit,
+        default=None,
+        help="Enrich at most this many records from the input (all if unset).",
+    )
+    parser.add_argument(
+        "--max_age_days",
+        type=float,
+        default=7.0,
+        help="Re-enrich products last enriched more than this many days ago.",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=100,
+        help="Records read, enriched and written per batch.",
+    )
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_argument(parser)
     return parser.parse_args()
 
 
 def main() -> None:
     # Parse CLI arguments
     call_args = cli_arguments()
+    if call_args.profile_imports:
+        # Enrichment imports Playwright (and requests for --fetcher http) lazily
+        if call_args.mode == "async":
+            modules = ["playwright.async_api"]
+        else:
+            modules = ["playwright.sync_api"]
+            if call_args.fetcher == "http":
+                modules.append("requests")
+        exit(profile_imports(modules))
     marketplace = call_args.marketplace
     category = call_args.category
     subcategory = call_args.subcategory
 
     # Construct normalized output file name
-    filename_base = f"{marketplace} {category} {subcategory}"
-    file_name = normalize_strings(filename_base) + ".json"
+    filename_base = normalize_strings(f"{marketplace} {category} {subcategory}")
 
     # Sanitize directory names for safe paths
     safe_category = re.sub(r"\W+", "_", category).replace(" ", "_")
@@ -161,33 +281,80 @@ def main() -> None:
         logger.error("Directory [%s] does not exist.", output_path)
         exit(1)
 
-    input_filepath = output_dir / file_name
-    if not input_filepath.is_file():
-        logger.error("File [%s] does not exist.", file_name)
+    input_filepath = find_records_file(output_dir, filename_base)
+    if input_filepath is None:
+        logger.error("File [%s%s] does not exist.", filename_base, JSONL_SUFFIX)
         exit(1)
 
-    # Load product metadata to enrich
-    with open(input_filepath, encoding="utf-8") as f:
-        data = json.load(f)
+    try:
+        cache = cache_settings_from_args(call_args).open()
+    except ValueError as exc:
+        logger.error("%s", exc)
+        exit(1)
 
-    product_collections = []
-    for index, product in enumerate(data, 1):
-        if index > 5:
-            break
-        logger.info("Index [%s] - product name: %s ...", index, product["name"][:50])
-        enriched_product = product_level_scraper(product["product_detail_url"])
-        product.update(enriched_product or {})
-        product_collections.append(product)
+    # Stream product metadata through enrichment in batches
+    records = islice(iter_records(input_filepath), call_args.limit_records)
+    index = EnrichmentIndex.load(output_dir)
+    started_at = datetime.now()
+    transformed_path = output_dir / f"transform_{filename_base}{JSONL_SUFFIX}"
+    preview = []
+
+    with metrics_session(
+        "transform", call_args, category_label(category, subcategory)
+    ), METRICS.timer("transform", "run"):
+        with ExitStack() as stack:
+            stack.callback(index.save)
+            if cache is not None:
+                stack.callback(cache.close)
+
+            if call_args.mode == "async":
+                enricher = stack.enter_context(
+                    AsyncEnricher(
+                        concurrency=call_args.concurrency,
+                        host_interval=call_args.host_interval,
+                        cache=cache,
+                    )
+                )
+
+                def enrich(batch: List[dict]) -> None:
+                    logger.info(
+                        "Enriching %d product(s) with concurrency %d ...",
+                        len(batch),
+                        call_args.concurrency,
+                    )
+                    enricher.enrich(batch)
+
+            else:
+                fetcher = stack.enter_context(
+                    open_detail_fetcher(
+                        recycle_after=call_args.recycle_after,
+                        fetcher_mode=call_args.fetcher,
+                        cache=cache,
+                    )
+                )
+
+                def enrich(batch: List[dict]) -> None:
+                    enrich_products(batch, fetcher)
+
+            writer = stack.enter_context(JsonLinesWriter(transformed_path))
+            for batch in enrich_batches(
+                iter_batches(records, call_args.batch_size),
+                index,
+                enrich,
+                call_args.max_age_days,
+                started_at,
+            ):
+                writer.write_many(batch)
+                writer.flush()
+                preview.extend(batch[: 3 - len(preview)])
+
+    register_artifact("transform", transformed_path, writer.count)
 
     # Preview enriched results
-    print(json.dumps(product_collections[:3], indent=3))
-
-    # Save enriched product data
-    transformed_path = output_dir / f"transform_{file_name}"
-    with open(transformed_path, "w", encoding="utf-8") as f:
-        json.dump(product_collections, f, indent=3)
-
-    logger.info("Scraping completed. Data saved to: %s", transformed_path)
+    print(json.dumps(preview, indent=3))
+    logger.info(
+        "Scraping completed. %d record(s) saved to: %s", writer.count, transformed_path
+    )
 
 
 if __name__ == "__main__":